@@ -1,8 +1,50 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import math
 import datetime
+import functools
+import uuid
+from pathlib import Path
+import plotly.graph_objects as go
+
+from pss_analysis import (
+    GOAL_SEEK_LEVERS,
+    SCENARIO_PRESETS,
+    SENSITIVITY_PARAMETERS,
+    SWEEP_METRICS,
+    build_breakpoint_table,
+    goal_seek,
+    parameter_sweep,
+    price_scenarios,
+    run_monte_carlo,
+    tornado_sensitivity,
+    triangular_spread,
+)
+from pss_buslist import FILE_FORMATS as BUS_LIST_FORMATS
+from pss_buslist import file_sha256, format_available, read_bus_list
+from pss_cache import QuoteCache
+from pss_calibration import DEFAULT_RIDGE, fit_rate_card, read_history
+from pss_engine import (
+    BUS_METHODS,
+    BUS_TYPE_NAMES,
+    DEFAULT_RATE_CARD,
+    IMPORTED_BUS_METHOD,
+    NON_PRICING_FIELDS,
+    PRICING_STAGES,
+    STUDY_NAMES,
+    TIER_LEVELS,
+    IncrementalPricer,
+    QuoteInputs,
+    normalize_work_allocation,
+    quote_input_hash,
+    quote_topology,
+    rate_card_from_json,
+    rate_card_to_json,
+    rate_card_version,
+)
+from pss_export import EXPORT_FORMATS, export_available, export_bytes, quotes_zip_bytes, summary_table
+from pss_store import QuoteStore
+from pss_timing import RerunTimer, TimingStore
 
 # Page configuration
 st.set_page_config(
@@ -43,101 +85,47 @@ def logout():
     st.session_state.user_role = None
     st.rerun()
 
+
+STATIC_DIR = Path(__file__).parent / "static"
+
+
+def inject_stylesheet(filename):
+    """
+    Apply a theme stylesheet from static/.
+
+    With static serving enabled (.streamlit/config.toml) only a <link> tag is
+    sent per rerun and the browser caches the file; otherwise the CSS is
+    inlined so the app still renders when launched without the config.
+    """
+    if st.get_option("server.enableStaticServing"):
+        st.markdown(f'<link rel="stylesheet" href="app/static/{filename}">', unsafe_allow_html=True)
+    else:
+        st.html(STATIC_DIR / filename)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RERUN TIMING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+@st.cache_resource
+def shared_timing_store():
+    """Section timings from every session on this server."""
+    return TimingStore()
+
+
+if 'timing_session_id' not in st.session_state:
+    st.session_state.timing_session_id = uuid.uuid4().hex[:8]
+
+timing_session = f"{st.session_state.username or 'anonymous'}#{st.session_state.timing_session_id}"
+rerun_timer = RerunTimer(shared_timing_store(), timing_session)
+rerun_timer.section("auth_check")
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # LOGIN PAGE
 # ═══════════════════════════════════════════════════════════════════════════════
 
 if not st.session_state.authenticated:
-    st.markdown("""
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
-        
-        .stApp {
-            background: linear-gradient(135deg, #0f172a 0%, #1e293b 50%, #334155 100%);
-            font-family: 'Inter', sans-serif;
-        }
-        
-        .login-container {
-            max-width: 450px;
-            margin: 8rem auto 2rem auto;
-            padding: 3rem;
-            background: rgba(30, 41, 59, 0.95);
-            border: 1px solid rgba(59, 130, 246, 0.3);
-            border-radius: 20px;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.4);
-            backdrop-filter: blur(10px);
-        }
-        
-        .login-header {
-            text-align: center;
-            margin-bottom: 2rem;
-        }
-        
-        .login-header h1 {
-            color: #3b82f6;
-            font-size: 2rem;
-            font-weight: 800;
-            margin: 0 0 0.5rem 0;
-        }
-        
-        .login-header p {
-            color: #94a3b8;
-            font-size: 1rem;
-            margin: 0;
-        }
-        
-        .stTextInput > div > div > input {
-            background: rgba(15, 23, 42, 0.8) !important;
-            border: 1px solid rgba(59, 130, 246, 0.3) !important;
-            border-radius: 10px !important;
-            color: #f1f5f9 !important;
-            padding: 0.75rem 1rem !important;
-            font-size: 1rem !important;
-        }
-        
-        .stTextInput > div > div > input:focus {
-            border-color: #3b82f6 !important;
-            box-shadow: 0 0 0 3px rgba(59, 130, 246, 0.2) !important;
-        }
-        
-        .stButton > button {
-            background: linear-gradient(135deg, #3b82f6 0%, #06b6d4 100%) !important;
-            color: white !important;
-            border: none !important;
-            border-radius: 10px !important;
-            padding: 0.75rem 2rem !important;
-            font-weight: 600 !important;
-            font-size: 1rem !important;
-            width: 100% !important;
-            margin-top: 1rem !important;
-            transition: all 0.3s ease !important;
-        }
-        
-        .stButton > button:hover {
-            transform: translateY(-2px) !important;
-            box-shadow: 0 6px 20px rgba(59, 130, 246, 0.4) !important;
-        }
-        
-        .user-info-box {
-            background: rgba(59, 130, 246, 0.1);
-            border: 1px solid rgba(59, 130, 246, 0.3);
-            border-radius: 12px;
-            padding: 1rem;
-            margin-top: 2rem;
-            text-align: center;
-        }
-        
-        .user-info-box p {
-            color: #cbd5e1;
-            margin: 0.3rem 0;
-            font-size: 0.9rem;
-        }
-        
-        .user-info-box strong {
-            color: #3b82f6;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    inject_stylesheet("pss_login.css")
     
     st.markdown("""
     <div class="login-container">
@@ -185,492 +173,18 @@ if not st.session_state.authenticated:
 # MAIN APPLICATION (AFTER LOGIN)
 # ═══════════════════════════════════════════════════════════════════════════════
 
-# ═══════════════════════════════════════════════════════════════════════════════
-# ACCURATE BUS COUNT CALCULATION FUNCTION (FROM DC_BUS_QUANTITY_ESTIMATER)
-# ═══════════════════════════════════════════════════════════════════════════════
-
-def calculate_bus_count_accurate(
-    it_capacity,
-    mechanical_load,
-    house_load,
-    tier_level,
-    pue=1.56,
-    mech_fraction=0.70,
-    ups_lineup=1.5,
-    transformer_mva=3.0,
-    lv_bus_mw=3.0,
-    pdu_mva=0.3,
-    mv_base=2,
-    utility_incomers=1,
-    power_factor=0.95,
-    voltage_levels=2,
-    backup_gens=0,
-    expansion_factor=1.0,
-    bus_calibration=1.0
-):
-    """
-    Calculate bus count using component-by-component engineering method.
-    Integrated from DC_Bus_Quantity_Estimater with calibration factor.
-    
-    Returns:
-        int: Estimated bus count (rounded up)
-    """
-    
-    # ─────────────────────────────────────────────────────────────────────
-    # PHASE 1: LOAD DERIVATION (CORRECT METHOD)
-    # ─────────────────────────────────────────────────────────────────────
-    calc_total_mw = pue * it_capacity
-    calc_it_mw = it_capacity
-    non_it_mw = calc_total_mw - calc_it_mw
-    
-    mech_mw = mech_fraction * non_it_mw
-    house_mw = non_it_mw - mech_mw
-    
-    # ─────────────────────────────────────────────────────────────────────
-    # PHASE 2: COMPONENT COUNTING (EQUIPMENT-BASED)
-    # ─────────────────────────────────────────────────────────────────────
-    
-    lv_it_pcc = math.ceil(calc_it_mw / lv_bus_mw)
-    lv_mech_mcc = math.ceil(mech_mw / lv_bus_mw)
-    lv_house_pcc = math.ceil(house_mw / lv_bus_mw)
-    lv_total = lv_it_pcc + lv_mech_mcc + lv_house_pcc
-    
-    ups_lineups = math.ceil(calc_it_mw / ups_lineup)
-    ups_output_buses = ups_lineups
-    
-    pdus_total = math.ceil(calc_it_mw / pdu_mva)
-    
-    tx_count_n = math.ceil(calc_total_mw / (transformer_mva * power_factor))
-    
-    mv_buses = mv_base + (utility_incomers - 1)
-    
-    voltage_additions = 0
-    if voltage_levels > 2:
-        voltage_additions = (voltage_levels - 2) * (tx_count_n + 1)
-    
-    generator_additions = backup_gens * 2 if backup_gens > 0 else 0
-    
-    # ─────────────────────────────────────────────────────────────────────
-    # PHASE 3: REDUNDANCY MODELING (TIER-BASED)
-    # ─────────────────────────────────────────────────────────────────────
-    
-    buses_core_n = (mv_buses + tx_count_n + lv_total + 
-                   ups_output_buses + pdus_total + 
-                   voltage_additions + generator_additions)
-    
-    if tier_level == "Tier I":
-        total_buses = buses_core_n * expansion_factor
-        
-    elif tier_level == "Tier II":
-        tx_count_adj = tx_count_n + 1
-        buses_adj = (mv_buses + tx_count_adj + lv_total + 
-                    ups_output_buses + pdus_total + 
-                    voltage_additions + generator_additions)
-        total_buses = buses_adj * expansion_factor * 1.10
-        
-    elif tier_level == "Tier III":
-        tx_count_adj = tx_count_n + 1
-        buses_adj = (mv_buses + tx_count_adj + lv_total + 
-                    ups_output_buses + pdus_total + 
-                    voltage_additions + generator_additions)
-        total_buses = buses_adj * expansion_factor * 1.15
-        
-    elif tier_level == "Tier IV":
-        mv_2n = mv_buses * 2
-        tx_2n = tx_count_n * 2
-        lv_2n = lv_total * 2
-        ups_2n = ups_output_buses * 2
-        pdus_2n = int(pdus_total * 1.5)
-        extras_2n = (voltage_additions + generator_additions) * 2
-        
-        buses_2n = mv_2n + tx_2n + lv_2n + ups_2n + pdus_2n + extras_2n
-        total_buses = buses_2n * expansion_factor
-    
-    else:
-        tx_count_adj = tx_count_n + 1
-        buses_adj = (mv_buses + tx_count_adj + lv_total + 
-                    ups_output_buses + pdus_total + 
-                    voltage_additions + generator_additions)
-        total_buses = buses_adj * expansion_factor * 1.15
-    
-    # Apply calibration factor
-    total_buses = total_buses * bus_calibration
-    
-    return max(1, math.ceil(total_buses))
-
-
 # ═══════════════════════════════════════════════════════════════════════════════
 # PROFESSIONAL DARK THEME CSS
 # ═══════════════════════════════════════════════════════════════════════════════
 
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
-    
-    .main > div {
-        padding-top: 0.5rem;
-    }
-    
-    .stApp {
-        background: linear-gradient(135deg, #0f172a 0%, #1e293b 50%, #334155 100%);
-        font-family: 'Inter', sans-serif;
-        min-height: 100vh;
-        color: #e2e8f0;
-    }
-    
-    .user-info-bar {
-        background: rgba(30, 41, 59, 0.9);
-        border: 1px solid rgba(59, 130, 246, 0.3);
-        border-radius: 12px;
-        padding: 1rem 2rem;
-        margin-bottom: 1rem;
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        backdrop-filter: blur(10px);
-    }
-    
-    .user-info-bar p {
-        margin: 0;
-        color: #cbd5e1;
-        font-weight: 500;
-    }
-    
-    .user-info-bar strong {
-        color: #3b82f6;
-    }
-    
-    .main-header {
-        background: linear-gradient(135deg, rgba(30, 41, 59, 0.95) 0%, rgba(51, 65, 85, 0.9) 100%);
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(59, 130, 246, 0.2);
-        padding: 2.5rem;
-        border-radius: 16px;
-        color: #f1f5f9;
-        text-align: center;
-        margin-bottom: 2rem;
-        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.3);
-    }
-    
-    .main-header h1 {
-        font-size: 2.5rem;
-        font-weight: 700;
-        margin: 0;
-        background: linear-gradient(135deg, #3b82f6, #06b6d4);
-        background-clip: text;
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        letter-spacing: -1px;
-    }
-    
-    .main-header h2 {
-        font-size: 1.2rem;
-        font-weight: 400;
-        margin: 1rem 0 0 0;
-        color: #94a3b8;
-    }
-    
-    .developer-credit {
-        background: rgba(59, 130, 246, 0.1);
-        border: 1px solid rgba(59, 130, 246, 0.2);
-        padding: 1rem 2rem;
-        border-radius: 12px;
-        color: #f1f5f9;
-        text-align: center;
-        font-weight: 600;
-        margin: 1rem 0 2rem 0;
-        backdrop-filter: blur(10px);
-    }
-    
-    .section-header {
-        background: rgba(30, 41, 59, 0.8);
-        border: 1px solid rgba(59, 130, 246, 0.3);
-        color: #f1f5f9;
-        padding: 1.5rem 2rem;
-        border-radius: 12px;
-        margin: 2rem 0 1.5rem 0;
-        backdrop-filter: blur(10px);
-        box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2);
-    }
-    
-    .section-header h2 {
-        margin: 0;
-        font-size: 1.3rem;
-        font-weight: 700;
-        color: #3b82f6;
-    }
-    
-    .metric-card {
-        background: rgba(30, 41, 59, 0.6);
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(59, 130, 246, 0.2);
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        transition: all 0.3s ease;
-        box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2);
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 15px rgba(59, 130, 246, 0.2);
-        border-color: rgba(59, 130, 246, 0.4);
-    }
-    
-    .metric-card h3 {
-        color: #64748b;
-        font-size: 0.8rem;
-        font-weight: 600;
-        margin: 0 0 0.5rem 0;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .metric-card .value {
-        color: #3b82f6;
-        font-size: 2rem;
-        font-weight: 800;
-        margin: 0;
-        line-height: 1;
-    }
-    
-    .metric-card .subtitle {
-        color: #64748b;
-        font-size: 0.8rem;
-        margin: 0.5rem 0 0 0;
-    }
-    
-    .study-card {
-        background: rgba(30, 41, 59, 0.7);
-        border: 1px solid rgba(71, 85, 105, 0.3);
-        border-radius: 12px;
-        padding: 2rem;
-        margin: 1.5rem 0;
-        transition: all 0.3s ease;
-        backdrop-filter: blur(10px);
-        box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2);
-    }
-    
-    .study-card:hover {
-        border-color: rgba(59, 130, 246, 0.4);
-        box-shadow: 0 4px 15px rgba(59, 130, 246, 0.15);
-    }
-    
-    .study-card h4 {
-        color: #f1f5f9;
-        font-size: 1.2rem;
-        font-weight: 700;
-        margin: 0 0 1rem 0;
-    }
-    
-    .study-details {
-        display: grid;
-        grid-template-columns: 2fr 1fr;
-        gap: 2rem;
-        margin-top: 1rem;
-        align-items: center;
-    }
-    
-    .study-detail-item {
-        color: #cbd5e1;
-        font-size: 0.9rem;
-        line-height: 1.7;
-        font-weight: 500;
-    }
-    
-    .study-detail-item strong {
-        color: #f1f5f9;
-        font-weight: 600;
-    }
-    
-    .cost-highlight {
-        background: linear-gradient(135deg, #3b82f6 0%, #06b6d4 100%);
-        border-radius: 10px;
-        padding: 1.2rem;
-        text-align: center;
-        color: white;
-        box-shadow: 0 4px 12px rgba(59, 130, 246, 0.3);
-    }
-    
-    .cost-highlight .amount {
-        font-size: 1.4rem;
-        font-weight: 800;
-        margin: 0;
-    }
-    
-    .results-container {
-        background: rgba(15, 23, 42, 0.8);
-        border: 1px solid rgba(59, 130, 246, 0.3);
-        border-radius: 16px;
-        padding: 2.5rem;
-        margin: 2rem 0;
-        backdrop-filter: blur(15px);
-        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.3);
-    }
-    
-    .stButton > button {
-        background: linear-gradient(135deg, #3b82f6 0%, #06b6d4 100%);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.6rem 1.5rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 2px 8px rgba(59, 130, 246, 0.3);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-1px);
-        box-shadow: 0 4px 12px rgba(59, 130, 246, 0.4);
-    }
-    
-    .stSelectbox > div > div,
-    .stNumberInput > div > div > input,
-    .stTextInput > div > div > input,
-    .stTextArea > div > div > textarea {
-        background: rgba(30, 41, 59, 0.6) !important;
-        border: 1px solid rgba(59, 130, 246, 0.2) !important;
-        border-radius: 8px !important;
-        color: #f1f5f9 !important;
-        backdrop-filter: blur(10px) !important;
-    }
-    
-    .stSelectbox > div > div:focus-within,
-    .stNumberInput > div > div > input:focus,
-    .stTextInput > div > div > input:focus,
-    .stTextArea > div > div > textarea:focus {
-        border-color: #3b82f6 !important;
-        box-shadow: 0 0 0 2px rgba(59, 130, 246, 0.2) !important;
-    }
-    
-    .stCheckbox > label {
-        color: #e2e8f0 !important;
-        font-weight: 500 !important;
-    }
-    
-    .stSlider > div > div > div {
-        color: #3b82f6 !important;
-    }
-    
-    .disclaimer-box {
-        background: rgba(239, 68, 68, 0.1);
-        border: 1px solid rgba(239, 68, 68, 0.3);
-        border-radius: 12px;
-        padding: 2rem;
-        margin: 2rem 0;
-        backdrop-filter: blur(10px);
-    }
-    
-    .disclaimer-box h4 {
-        color: #f59e0b;
-        margin: 0 0 1rem 0;
-        font-weight: 700;
-    }
-    
-    .disclaimer-box p {
-        color: #fbbf24;
-        margin: 0.8rem 0;
-        line-height: 1.6;
-        font-weight: 500;
-    }
-    
-    .model-section {
-        background: rgba(16, 185, 129, 0.1);
-        border: 1px solid rgba(16, 185, 129, 0.3);
-        border-radius: 12px;
-        padding: 2rem;
-        margin: 2rem 0;
-        backdrop-filter: blur(10px);
-    }
-    
-    .work-allocation-section {
-        background: rgba(139, 92, 246, 0.1);
-        border: 1px solid rgba(139, 92, 246, 0.3);
-        border-radius: 12px;
-        padding: 2rem;
-        margin: 2rem 0;
-        backdrop-filter: blur(10px);
-    }
-    
-    .custom-cost-section {
-        background: rgba(236, 72, 153, 0.1);
-        border: 1px solid rgba(236, 72, 153, 0.3);
-        border-radius: 12px;
-        padding: 2rem;
-        margin: 2rem 0;
-        backdrop-filter: blur(10px);
-    }
-    
-    .scope-section {
-        background: rgba(168, 85, 247, 0.1);
-        border: 1px solid rgba(168, 85, 247, 0.3);
-        border-radius: 12px;
-        padding: 2rem;
-        margin: 2rem 0;
-        backdrop-filter: blur(10px);
-    }
-    
-    .summary-section {
-        background: rgba(15, 23, 42, 0.9);
-        border: 2px solid rgba(59, 130, 246, 0.4);
-        border-radius: 16px;
-        padding: 3rem;
-        margin: 3rem 0;
-        backdrop-filter: blur(20px);
-        box-shadow: 0 8px 30px rgba(0, 0, 0, 0.4);
-    }
-    
-    .final-total-section {
-        background: linear-gradient(135deg, #3b82f6 0%, #06b6d4 100%);
-        border-radius: 16px;
-        padding: 2.5rem;
-        text-align: center;
-        color: white;
-        box-shadow: 0 8px 25px rgba(59, 130, 246, 0.4);
-        margin: 2rem 0;
-    }
-    
-    .cost-category-card {
-        background: rgba(30, 41, 59, 0.6);
-        border: 1px solid rgba(59, 130, 246, 0.2);
-        border-radius: 10px;
-        padding: 1.5rem;
-        text-align: center;
-        backdrop-filter: blur(10px);
-        transition: all 0.3s ease;
-    }
-    
-    .cost-category-card:hover {
-        border-color: rgba(59, 130, 246, 0.4);
-        transform: translateY(-2px);
-    }
-    
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    
-    .block-container {
-        padding-top: 1rem;
-        padding-bottom: 2rem;
-        max-width: 1200px;
-    }
-    
-    .stMarkdown, h1, h2, h3, h4, h5, h6 {
-        color: #e2e8f0 !important;
-    }
-    
-    .stRadio > div > label > div {
-        background: rgba(30, 41, 59, 0.6) !important;
-        border: 1px solid rgba(59, 130, 246, 0.2) !important;
-        border-radius: 8px !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+rerun_timer.section("css_injection")
+inject_stylesheet("pss_theme.css")
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # USER INFO BAR WITH LOGOUT
 # ═══════════════════════════════════════════════════════════════════════════════
 
+rerun_timer.section("page_header")
 col_user1, col_user2 = st.columns([4, 1])
 
 with col_user1:
@@ -684,27 +198,6 @@ with col_user2:
     if st.button("🚪 Logout", key="logout_button"):
         logout()
 
-# ═══════════════════════════════════════════════════════════════════════════════
-# SESSION STATE INITIALIZATION
-# ═══════════════════════════════════════════════════════════════════════════════
-
-if 'studies_selected' not in st.session_state:
-    st.session_state.studies_selected = {
-        'load_flow': True,
-        'short_circuit': True,
-        'pdc': True,
-        'arc_flash': True,
-        'harmonics': False,
-        'transient': False
-    }
-
-if 'work_allocation' not in st.session_state:
-    st.session_state.work_allocation = {
-        'senior': 20,
-        'mid': 30,
-        'junior': 50
-    }
-
 # ═══════════════════════════════════════════════════════════════════════════════
 # HEADER
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -737,138 +230,535 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# MAIN APPLICATION
+# RATE CARD
 # ═══════════════════════════════════════════════════════════════════════════════
 
-with st.container():
-    # Project Information Section
+
+@st.cache_resource
+def shared_quote_store():
+    """SQLite quote history (and published rate cards) shared by every session."""
+    return QuoteStore()
+
+
+def active_rate_card():
+    """Rate card published as active by an administrator, else the built-in default."""
+    return shared_quote_store().active_rate_card() or DEFAULT_RATE_CARD
+
+
+rate_card = active_rate_card()
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BUS LIST IMPORT
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+@st.cache_data(max_entries=8, show_spinner="Parsing bus list...")
+def cached_bus_list(file_hash, _bus_file):
+    """Parsed ETAP/SKM bus list, cached on the file's content hash."""
+    _bus_file.seek(0)
+    return read_bus_list(_bus_file, filename=_bus_file.name)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# QUOTE INPUTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Every input widget is keyed, so its value lives in session state. Each input
+# panel is a fragment: a change re-prices the quote in the widget's callback
+# and reruns only that panel plus the result sections the change affects.
+
+DEFAULT_SCOPE = """This project includes comprehensive power system studies for a data center facility:
+
+• Complete electrical system modeling and analysis
+• Detailed study reports with recommendations
+• Client presentations and technical meetings
+• Equipment coordination and protection settings
+• Arc flash hazard analysis and labeling
+• Compliance with IEEE, NFPA, and NEC standards
+
+All deliverables will be provided in digital format with professional documentation."""
+
+# Industry-standard equipment blocks, used unless custom block sizing is on
+STANDARD_BLOCKS = {'ups_lineup': 1.0, 'transformer_mva': 2.0, 'lv_bus_mw': 2.0, 'pdu_mva': 0.3, 'power_factor': 0.95}
+
+# Widget key -> value shown the first time the widget appears (or reappears
+# after being hidden, e.g. the discount slider for a new customer)
+INPUT_DEFAULTS = {
+    'project_name': "Project-Alpha",
+    'tier_level': "Tier IV",
+    'it_capacity': 10.0,
+    'delivery_type': "Standard",
+    'mechanical_load': 7.0,
+    'report_complexity': "Standard",
+    'house_load': 3.0,
+    'client_meetings': 3,
+    'customer_type': "New Customer",
+    'repeat_discount': 10,
+    'custom_margin': 15,
+    'pue_value': 1.4,
+    'competitive_pricing': False,
+    'mech_redundancy': "N+1",
+    'bus_method': BUS_METHODS[0],
+    'use_custom_blocks': False,
+    'bus_calibration': round(rate_card.bus_calibration * 20) / 20,
+    'utility_incomers': 1,
+    'voltage_levels': 2,
+    'backup_gens': 0,
+    'expansion_factor': 1.0,
+    'ups_lineup': 1.0,
+    'transformer_mva': 3.0,
+    'lv_bus_mw': 3.0,
+    'pdu_mva': 0.3,
+    'power_factor': 0.95,
+    'model_type': "Typical Model",
+    'hour_reduction': 30,
+    'load_flow_cb': True,
+    'short_circuit_cb': True,
+    'pdc_cb': True,
+    'arc_flash_cb': True,
+    'harmonics_cb': False,
+    'transient_cb': False,
+    'senior_allocation': 20,
+    'mid_allocation': 30,
+    'junior_allocation': 50,
+    'senior_rate': 2200,
+    'mid_rate': 1200,
+    'junior_rate': 800,
+    'load_flow_factor': 1.0,
+    'short_circuit_factor': 1.0,
+    'pdc_factor': 1.0,
+    'arc_flash_factor': 1.0,
+    'harmonics_factor': 1.2,
+    'transient_factor': 1.3,
+    'urgency_multiplier': 1.3,
+    'meeting_cost': 8000,
+    'load_flow_report_cost': 8000,
+    'short_circuit_report_cost': 10000,
+    'pdc_report_cost': 15000,
+    'arc_flash_report_cost': 12000,
+    'harmonics_report_cost': 11000,
+    'transient_report_cost': 13000,
+    'site_visit_enabled': True,
+    'site_visits': 2,
+    'site_visit_cost': 12000,
+    'af_labels_enabled': False,
+    'num_labels': 50,
+    'cost_per_label': 150,
+    'stickering_enabled': False,
+    'stickering_cost': 25000,
+    'custom_charges_desc': "Additional Services",
+    'custom_charges_cost': 0,
+    'custom_cost_1_desc': "Custom Engineering Services",
+    'custom_cost_1_amount': 0,
+    'custom_cost_2_desc': "Specialized Testing & Validation",
+    'custom_cost_2_amount': 0,
+    'scope_description': DEFAULT_SCOPE,
+}
+
+# Inputs edited in the rates panel (batch-applied through a form when enabled)
+RATE_INPUTS = (
+    'senior_rate', 'mid_rate', 'junior_rate', 'load_flow_factor', 'short_circuit_factor', 'pdc_factor',
+    'arc_flash_factor', 'harmonics_factor', 'transient_factor', 'urgency_multiplier', 'meeting_cost',
+    'load_flow_report_cost', 'short_circuit_report_cost', 'pdc_report_cost', 'arc_flash_report_cost',
+    'harmonics_report_cost', 'transient_report_cost',
+)
+
+# Result fragments that show non-pricing text (project name, descriptions,
+# scope) or whether this exact quote has been saved
+TEXT_RESULT_FRAGMENTS = (
+    "results_cost_summary", "results_final_quotation", "results_scope_summary", "results_export",
+    "results_quote_history",
+)
+RESULT_FRAGMENTS = (
+    "results_engineering", "results_study_cards", "results_monte_carlo", "results_sensitivity",
+    "results_parameter_sweep", "results_capacity_thresholds", "results_goal_seek", "results_scenarios",
+) + TEXT_RESULT_FRAGMENTS
+
+
+def seed_inputs():
+    """Give input widgets their default before they are created (again, once hidden)."""
+    for key, default in INPUT_DEFAULTS.items():
+        if key not in st.session_state:
+            st.session_state[key] = default
+
+
+def input_value(key):
+    """Current value of an input widget, or its default while it is hidden."""
+    return st.session_state.get(key, INPUT_DEFAULTS[key])
+
+
+def uploaded_bus_list():
+    """Parsed bus list from the uploader, or None before a file is uploaded."""
+    bus_file = st.session_state.get('bus_list_file')
+    if bus_file is None:
+        return None
+    return cached_bus_list(file_sha256(bus_file), bus_file)
+
+
+def current_quote_inputs():
+    """Collect every input widget into one QuoteInputs, zeroing the options that are switched off."""
+    competitive = input_value('competitive_pricing')
+    blocks = {name: input_value(name) for name in STANDARD_BLOCKS} if input_value('use_custom_blocks') else STANDARD_BLOCKS
+    etap_model = input_value('model_type') == "ETAP Model Available"
+    site_visits = input_value('site_visit_enabled')
+    af_labels = input_value('af_labels_enabled')
+
+    bus_method = input_value('bus_method')
+    imported_bus_counts = {}
+    if etap_model:
+        try:
+            bus_list = uploaded_bus_list()
+        except (ValueError, ImportError):
+            bus_list = None
+        if bus_list is not None and len(bus_list) > 0 and st.session_state.get('use_imported_buses', True):
+            bus_method = IMPORTED_BUS_METHOD
+            imported_bus_counts = bus_list.counts()
+
+    return QuoteInputs(
+        project_name=input_value('project_name'),
+        tier_level=input_value('tier_level'),
+        it_capacity=input_value('it_capacity'),
+        mechanical_load=input_value('mechanical_load'),
+        house_load=input_value('house_load'),
+        delivery_type=input_value('delivery_type'),
+        report_complexity=input_value('report_complexity'),
+        client_meetings=input_value('client_meetings'),
+        customer_type=input_value('customer_type'),
+        repeat_discount=input_value('repeat_discount') if input_value('customer_type') == "Repeat Customer" else 0,
+        custom_margin=input_value('custom_margin'),
+        pue_value=input_value('pue_value'),
+        competitive_pricing=competitive,
+        mech_redundancy=input_value('mech_redundancy') if competitive else "N+1",
+        bus_calibration=input_value('bus_calibration'),
+        bus_method=bus_method,
+        utility_incomers=input_value('utility_incomers'),
+        voltage_levels=input_value('voltage_levels'),
+        backup_gens=input_value('backup_gens'),
+        expansion_factor=input_value('expansion_factor'),
+        imported_bus_counts=imported_bus_counts,
+        hour_reduction=input_value('hour_reduction') if etap_model else 0,
+        studies_selected={study_key: input_value(f"{study_key}_cb") for study_key in STUDY_NAMES},
+        work_allocation=normalize_work_allocation({
+            level: input_value(f"{level}_allocation") for level in ('senior', 'mid', 'junior')
+        }),
+        senior_rate=input_value('senior_rate'),
+        mid_rate=input_value('mid_rate'),
+        junior_rate=input_value('junior_rate'),
+        load_flow_factor=input_value('load_flow_factor'),
+        short_circuit_factor=input_value('short_circuit_factor'),
+        pdc_factor=input_value('pdc_factor'),
+        arc_flash_factor=input_value('arc_flash_factor'),
+        harmonics_factor=input_value('harmonics_factor'),
+        transient_factor=input_value('transient_factor'),
+        urgency_multiplier=input_value('urgency_multiplier'),
+        meeting_cost=input_value('meeting_cost'),
+        load_flow_report_cost=input_value('load_flow_report_cost'),
+        short_circuit_report_cost=input_value('short_circuit_report_cost'),
+        pdc_report_cost=input_value('pdc_report_cost'),
+        arc_flash_report_cost=input_value('arc_flash_report_cost'),
+        harmonics_report_cost=input_value('harmonics_report_cost'),
+        transient_report_cost=input_value('transient_report_cost'),
+        site_visit_enabled=site_visits,
+        site_visits=input_value('site_visits') if site_visits else 0,
+        site_visit_cost=input_value('site_visit_cost') if site_visits else 0,
+        af_labels_enabled=af_labels,
+        num_labels=input_value('num_labels') if af_labels else 0,
+        cost_per_label=input_value('cost_per_label') if af_labels else 0,
+        stickering_enabled=input_value('stickering_enabled'),
+        stickering_cost=input_value('stickering_cost') if input_value('stickering_enabled') else 0,
+        custom_charges_desc=input_value('custom_charges_desc'),
+        custom_charges_cost=input_value('custom_charges_cost'),
+        custom_cost_1_desc=input_value('custom_cost_1_desc'),
+        custom_cost_1_amount=input_value('custom_cost_1_amount'),
+        custom_cost_2_desc=input_value('custom_cost_2_desc'),
+        custom_cost_2_amount=input_value('custom_cost_2_amount'),
+        scope_description=input_value('scope_description'),
+        **blocks
+    )
+
+
+def input_widget_values(quote_inputs):
+    """Widget session-state values that reproduce quote_inputs (the inverse of current_quote_inputs)."""
+    custom_blocks = any(getattr(quote_inputs, name) != value for name, value in STANDARD_BLOCKS.items())
+    etap_model = quote_inputs.hour_reduction > 0
+
+    # Inputs whose widget is hidden for this quote go back to their defaults
+    switched_off = set()
+    if quote_inputs.customer_type != "Repeat Customer":
+        switched_off.add('repeat_discount')
+    if not quote_inputs.competitive_pricing:
+        switched_off.add('mech_redundancy')
+    if not custom_blocks:
+        switched_off.update(STANDARD_BLOCKS)
+    if not etap_model:
+        switched_off.add('hour_reduction')
+    if not quote_inputs.site_visit_enabled:
+        switched_off.update(('site_visits', 'site_visit_cost'))
+    if not quote_inputs.af_labels_enabled:
+        switched_off.update(('num_labels', 'cost_per_label'))
+    if not quote_inputs.stickering_enabled:
+        switched_off.add('stickering_cost')
+    if quote_inputs.bus_method == IMPORTED_BUS_METHOD:
+        # The bus list itself is not stored; the estimate method is unknown
+        switched_off.add('bus_method')
+
+    values = {
+        key: default if key in switched_off else type(default)(getattr(quote_inputs, key))
+        for key, default in INPUT_DEFAULTS.items() if hasattr(quote_inputs, key)
+    }
+    values['use_custom_blocks'] = custom_blocks
+    values['model_type'] = "ETAP Model Available" if etap_model else "Typical Model"
+    values.update({f"{study_key}_cb": bool(quote_inputs.studies_selected.get(study_key, False))
+                   for study_key in STUDY_NAMES})
+    values.update({f"{level}_allocation": share
+                   for level, share in allocation_slider_values(quote_inputs.work_allocation).items()})
+    return values
+
+
+def allocation_slider_values(work_allocation):
+    """
+    Whole-percentage slider values that normalize to work_allocation.
+
+    The quote stores normalized shares (40:30:50 is kept as 33.3:25:41.7), so
+    try slider totals nearest 100 first; fall back to the rounded shares.
+    """
+    for total in sorted(range(25, 181), key=lambda total: abs(total - 100)):
+        candidate = {level: int(round(share * total / 100)) for level, share in work_allocation.items()}
+        if normalize_work_allocation(candidate) == work_allocation:
+            return candidate
+    return {level: int(round(share)) for level, share in work_allocation.items()}
+
+
+@st.cache_resource
+def shared_quote_cache():
+    """One LRU of priced quotes for every session on this server."""
+    return QuoteCache(max_entries=4096)
+
+
+# Per-session memo of pricing stages: a cache miss only recomputes the stages
+# downstream of the inputs this session just changed
+if 'incremental_pricer' not in st.session_state:
+    st.session_state.incremental_pricer = IncrementalPricer()
+
+
+def price_current_quote():
+    """Price the current inputs with the headless engine and keep both in session state."""
+    quote_inputs = current_quote_inputs()
+    card = active_rate_card()
+    quote = shared_quote_cache().get_or_price(
+        quote_inputs, card, span=rerun_timer.span, price_fn=st.session_state.incremental_pricer.price
+    )
+    st.session_state.quote_inputs = quote_inputs
+    st.session_state.quote = quote
+    return quote_inputs, quote
+
+
+def priced_quote():
+    """(QuoteInputs, QuoteResult) last priced for this session."""
+    return st.session_state.quote_inputs, st.session_state.quote
+
+
+def reprice_inputs(panel):
+    """
+    Input widget callback: re-price, then rerun only the edited panel and the
+    result fragments whose content changed (none for a display-only toggle).
+    """
+    previous = st.session_state.get('quote_inputs')
+    quote_inputs, _ = price_current_quote()
+    if previous is None or quote_input_hash(previous) != quote_input_hash(quote_inputs):
+        results = RESULT_FRAGMENTS
+    elif previous != quote_inputs:
+        results = TEXT_RESULT_FRAGMENTS
+    else:
+        results = ()
+    st.rerun([panel, *results])
+
+
+def set_all_studies(selected):
+    """Select All / Clear All Studies (button callback)."""
+    for study_key in STUDY_NAMES:
+        st.session_state[f"{study_key}_cb"] = selected
+    reprice_inputs("inputs_studies")
+
+
+def auto_balance_allocation():
+    """Reset the work allocation to 20:30:50 (button callback)."""
+    st.session_state.update(senior_allocation=20, mid_allocation=30, junior_allocation=50)
+    reprice_inputs("inputs_work_allocation")
+
+
+def apply_rate_card():
+    """Apply the batch-edited rates and factors (form submit callback)."""
+    st.session_state.rate_card_applied_at = datetime.datetime.now().strftime("%H:%M:%S")
+    reprice_inputs("inputs_rates")
+
+
+@st.fragment(key="inputs_project")
+def render_project_inputs():
+    """Project information panel."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_project",)}
     st.markdown("""
     <div class="section-header">
         <h2>📋 Project Information</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     col1, col2, col3, col4 = st.columns(4)
-    
+
     with col1:
-        project_name = st.text_input("Project Name", value="Project-Alpha")
-        tier_level = st.selectbox("Tier Level", ["Tier I", "Tier II", "Tier III", "Tier IV"], index=3)
+        st.text_input("Project Name", key="project_name", **reprice)
+        st.selectbox("Tier Level", ["Tier I", "Tier II", "Tier III", "Tier IV"], key="tier_level", **reprice)
     with col2:
-        it_capacity = st.number_input("IT Capacity (MW)", min_value=0.0, max_value=200.0, value=10.0, step=0.1)
-        delivery_type = st.selectbox("Delivery Type", ["Standard", "Urgent"])
+        st.number_input("IT Capacity (MW)", min_value=0.0, max_value=200.0, step=0.1, key="it_capacity", **reprice)
+        st.selectbox("Delivery Type", ["Standard", "Urgent"], key="delivery_type", **reprice)
     with col3:
-        mechanical_load = st.number_input("Mechanical Load (MW)", min_value=0.0, max_value=100.0, value=7.0, step=0.1)
-        report_complexity = st.selectbox("Report Complexity", ["Basic", "Standard", "Premium"], index=1)
+        st.number_input("Mechanical Load (MW)", min_value=0.0, max_value=100.0, step=0.1, key="mechanical_load", **reprice)
+        st.selectbox("Report Complexity", ["Basic", "Standard", "Premium"], key="report_complexity", **reprice)
     with col4:
-        house_load = st.number_input("House/Auxiliary Load (MW)", min_value=0.0, max_value=50.0, value=3.0, step=0.1)
-        client_meetings = st.number_input("Client Meetings", min_value=0, max_value=20, value=3, step=1)
+        st.number_input("House/Auxiliary Load (MW)", min_value=0.0, max_value=50.0, step=0.1, key="house_load", **reprice)
+        st.number_input("Client Meetings", min_value=0, max_value=20, step=1, key="client_meetings", **reprice)
 
-    # Customer Type Section
+
+@st.fragment(key="inputs_customer")
+def render_customer_inputs():
+    """Customer type, discount, margin and PUE panel."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_customer",)}
     st.markdown("""
     <div class="section-header">
         <h2>👤 Customer Information</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     col5, col6, col7, col8 = st.columns(4)
     with col5:
-        customer_type = st.selectbox("Customer Type", ["New Customer", "Repeat Customer"])
+        customer_type = st.selectbox("Customer Type", ["New Customer", "Repeat Customer"], key="customer_type", **reprice)
     with col6:
         if customer_type == "Repeat Customer":
-            repeat_discount = st.slider("Repeat Customer Discount (%)", 0, 25, 10, 1)
-        else:
-            repeat_discount = 0
+            st.slider("Repeat Customer Discount (%)", 0, 25, step=1, key="repeat_discount", **reprice)
     with col7:
-        custom_margin = st.number_input("Project Margins (%)", min_value=0, max_value=50, value=15, step=1)
+        st.number_input("Project Margins (%)", min_value=0, max_value=50, step=1, key="custom_margin", **reprice)
     with col8:
-        pue_value = st.slider("PUE (Power Usage Effectiveness)", 1.1, 2.0, 1.4, 0.01)
+        st.slider("PUE (Power Usage Effectiveness)", 1.1, 2.0, step=0.01, key="pue_value", **reprice)
 
-    # ═══════════════════════════════════════════════════════════════════════════════
-    # NEW: COMPETITIVE PRICING MODE
-    # ═══════════════════════════════════════════════════════════════════════════════
-    
+
+@st.fragment(key="inputs_competitive")
+def render_competitive_inputs():
+    """Competitive pricing mode and mechanical redundancy panel."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_competitive",)}
     st.markdown("""
     <div class="section-header">
         <h2>💡 Competitive Pricing Configuration</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     with st.container():
         st.markdown('<div class="model-section">', unsafe_allow_html=True)
-        
+
         competitive_col1, competitive_col2 = st.columns([2, 2])
-        
+
         with competitive_col1:
             competitive_pricing = st.checkbox(
                 "Enable Competitive Pricing Mode (Category-wise buses & hours)",
-                value=False,
-                help="Segregate buses into IT, Mechanical, and House loads with different base hours per category for competitive pricing."
+                key="competitive_pricing",
+                help="Segregate buses into IT, Mechanical, and House loads with different base hours per category for competitive pricing.",
+                **reprice
             )
-            
+
             if competitive_pricing:
                 st.success("✅ **Competitive Pricing ENABLED** - Category-wise calculation active")
             else:
                 st.info("🔧 **Standard Pricing** - Unified bus count and hours")
-        
+
         with competitive_col2:
             if competitive_pricing:
                 mech_redundancy = st.selectbox(
                     "Mechanical Redundancy Configuration",
                     ["N", "N+1", "N+N", "2N"],
-                    index=1,
-                    help="Used to estimate mechanical buses count based on redundancy."
+                    key="mech_redundancy",
+                    help="Used to estimate mechanical buses count based on redundancy.",
+                    **reprice
                 )
                 st.info(f"⚙️ Mechanical redundancy: **{mech_redundancy}** selected")
-            else:
-                mech_redundancy = "N+1"
-        
+
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # ═══════════════════════════════════════════════════════════════════════════════
-    # BUS COUNT CALCULATION METHOD TOGGLE
-    # ═══════════════════════════════════════════════════════════════════════════════
-    
+
+@st.fragment(key="inputs_bus_count")
+def render_bus_count_inputs():
+    """Bus count method, calibration, single-line parameters and custom equipment blocks."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_bus_count",)}
     st.markdown("""
     <div class="section-header">
         <h2>🔧 Bus Count Calculation Configuration</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     with st.container():
         st.markdown('<div class="model-section">', unsafe_allow_html=True)
-        
+
         bus_method_col1, bus_method_col2 = st.columns([2, 2])
-        
+
         with bus_method_col1:
             st.markdown("**🎯 Bus Count Calculation Method**")
+            bus_method = st.radio(
+                "Bus Count Method",
+                BUS_METHODS,
+                horizontal=True,
+                key="bus_method",
+                help="Component Estimate: tier-factored count from IT capacity and PUE. Topology: enumerate the single-line diagram (MV, transformers, PCC/MCCs, UPS, PDUs, generators) for the tier's redundancy scheme and count buses by type.",
+                **reprice
+            )
             use_custom_blocks = st.checkbox(
                 "Enable Custom Equipment Block Sizing",
-                value=False,
-                help="Toggle ON to enter custom equipment capacities. Toggle OFF to use industry-standard block sizes."
+                key="use_custom_blocks",
+                help="Toggle ON to enter custom equipment capacities. Toggle OFF to use industry-standard block sizes.",
+                **reprice
             )
-            
+
             if use_custom_blocks:
                 st.info("✅ **Custom Block Sizing Enabled** - Enter your specific equipment capacities below")
             else:
                 st.info("🔧 **Standard Block Sizing** - Using industry-standard equipment capacities")
-        
+
         with bus_method_col2:
             st.markdown("**⚙️ Bus Count Calibration Factor**")
             bus_calibration = st.slider(
                 "Calibration Multiplier",
                 min_value=0.5,
                 max_value=2.5,
-                value=1.0,
                 step=0.05,
-                help="Fine-tune bus count estimate. 1.0 = no adjustment. >1.0 increases count, <1.0 decreases count."
+                key="bus_calibration",
+                disabled=bus_method == "Topology",
+                help="Fine-tune bus count estimate. 1.0 = no adjustment. >1.0 increases count, <1.0 decreases count. Not used by the Topology method.",
+                **reprice
             )
-            if bus_calibration != 1.0:
+            if bus_method == "Topology":
+                st.info("🧭 Topology counts every bus explicitly - calibration not applied")
+            elif bus_calibration != 1.0:
                 st.warning(f"⚠️ Calibration factor: **{bus_calibration}x** applied to bus count")
             else:
                 st.success("✓ No calibration adjustment (1.0x)")
-        
+
+        st.markdown("**🧭 Single-Line Parameters**")
+        line_col1, line_col2, line_col3, line_col4 = st.columns(4)
+        with line_col1:
+            st.number_input("Utility Incomers", min_value=1, max_value=6, step=1, key="utility_incomers",
+                            help="Utility feeds; each extra incomer adds an MV switchgear section.", **reprice)
+        with line_col2:
+            st.number_input("Voltage Levels", min_value=2, max_value=5, step=1, key="voltage_levels",
+                            help="Distinct voltage levels (2 = MV + LV). Each extra level adds intermediate switchgear.", **reprice)
+        with line_col3:
+            st.number_input("Backup Generators", min_value=0, max_value=60, step=1, key="backup_gens",
+                            help="Each generator adds a terminal bus and a paralleling section.", **reprice)
+        with line_col4:
+            st.slider("Expansion Factor", 1.0, 2.0, step=0.05, key="expansion_factor",
+                      help="Future growth allowance. Topology sizes line-ups for the expanded load; Component Estimate scales the count.", **reprice)
+
         st.markdown('</div>', unsafe_allow_html=True)
-    
+
     # Equipment Block Sizing (Conditional Display)
     if use_custom_blocks:
         st.markdown("""
@@ -876,48 +766,47 @@ with st.container():
             <h2>🔩 Custom Equipment Block Capacities</h2>
         </div>
         """, unsafe_allow_html=True)
-        
+
         equip_col1, equip_col2, equip_col3, equip_col4, equip_col5 = st.columns(5)
-        
+
         with equip_col1:
-            ups_lineup = st.slider("UPS Lineup (MW)", 0.5, 3.0, 1.0, 0.1)
+            st.slider("UPS Lineup (MW)", 0.5, 3.0, step=0.1, key="ups_lineup", **reprice)
         with equip_col2:
-            transformer_mva = st.slider("Transformer (MVA)", 1.0, 2.0, 3.0, 0.1)
+            st.slider("Transformer (MVA)", 1.0, 3.0, step=0.1, key="transformer_mva", **reprice)
         with equip_col3:
-            lv_bus_mw = st.slider("LV Bus Section (MW)", 1.5, 2.0, 3.0, 0.1)
+            st.slider("LV Bus Section (MW)", 1.5, 3.0, step=0.1, key="lv_bus_mw", **reprice)
         with equip_col4:
-            pdu_mva = st.slider("PDU Capacity (MVA)", 0.2, 0.8, 0.3, 0.05)
+            st.slider("PDU Capacity (MVA)", 0.2, 0.8, step=0.05, key="pdu_mva", **reprice)
         with equip_col5:
-            power_factor = st.slider("Power Factor", 0.90, 1.0, 0.95, 0.01)
-    else:
-        # Use standard values
-        ups_lineup = 1.0
-        transformer_mva = 2.0
-        lv_bus_mw = 2.0
-        pdu_mva = 0.3
-        power_factor = 0.95
-
-    # Model Type & Hour Reduction Section
+            st.slider("Power Factor", 0.90, 1.0, step=0.01, key="power_factor", **reprice)
+
+
+@st.fragment(key="inputs_model_type")
+def render_model_type_inputs():
+    """Model type, hour reduction and the ETAP / SKM bus list import."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_model_type",)}
     st.markdown("""
     <div class="section-header">
         <h2>📐 Model Type & Hour Reduction</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     with st.container():
         st.markdown('<div class="model-section">', unsafe_allow_html=True)
-        
+
         model_col1, model_col2 = st.columns([2, 2])
-        
+
         with model_col1:
             st.markdown("**Select Model Type**")
             model_type = st.radio(
                 "Model Type",
                 ["Typical Model", "ETAP Model Available"],
-                index=0,
-                help="ETAP Model reduces manhours due to existing system models"
+                key="model_type",
+                help="ETAP Model reduces manhours due to existing system models",
+                **reprice
             )
-        
+
         with model_col2:
             st.markdown("**Hour Reduction Factor**")
             if model_type == "ETAP Model Available":
@@ -925,826 +814,1596 @@ with st.container():
                     "Hour Reduction (%)",
                     min_value=10,
                     max_value=90,
-                    value=30,
                     step=5,
-                    help="Percentage reduction in manhours when ETAP model is available"
+                    key="hour_reduction",
+                    help="Percentage reduction in manhours when ETAP model is available",
+                    **reprice
                 )
                 st.info(f"🎯 **{hour_reduction}% reduction** will be applied to total manhours")
             else:
-                hour_reduction = 0
                 st.info("🔧 **No reduction** - Using typical modeling approach")
-        
+
+        if model_type == "ETAP Model Available":
+            st.markdown("**📥 ETAP / SKM Bus Schedule**")
+            bus_list_types = [fmt for fmt in BUS_LIST_FORMATS if format_available(fmt)]
+            st.file_uploader(
+                "Bus Schedule Export",
+                type=bus_list_types,
+                key="bus_list_file",
+                help=f"Bus schedule exported from ETAP or SKM PowerTools ({', '.join(BUS_LIST_FORMATS[fmt][0] for fmt in bus_list_types)}). Buses are classified by voltage and type and their actual counts replace the estimated bus count.",
+                **reprice
+            )
+            try:
+                bus_list = uploaded_bus_list()
+            except (ValueError, ImportError) as exc:
+                st.error(f"❌ Could not read bus list: {exc}")
+            else:
+                if bus_list is not None:
+                    if 'use_imported_buses' not in st.session_state:
+                        st.session_state.use_imported_buses = len(bus_list) > 0
+                    import_col1, import_col2 = st.columns([1, 2])
+                    with import_col1:
+                        use_imported_buses = st.checkbox(
+                            f"Use imported bus counts ({len(bus_list):,} buses)",
+                            disabled=len(bus_list) == 0,
+                            key="use_imported_buses",
+                            **reprice
+                        )
+                        columns_used = ', '.join(f"{role}: '{column}'" for role, column in bus_list.columns.items())
+                        st.caption(f"{bus_list.rows:,} rows read, {bus_list.skipped:,} skipped · columns {columns_used}")
+                    with import_col2:
+                        with st.expander("Buses by voltage and type"):
+                            st.dataframe(bus_list.voltage_table(), use_container_width=True)
+                    if use_imported_buses and len(bus_list) > 0:
+                        st.success(f"✅ Pricing from **{len(bus_list):,} imported buses** instead of the bus count method above")
+
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # Studies Selection Section
+
+@st.fragment(key="inputs_studies")
+def render_study_inputs():
+    """Study selection panel."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_studies",)}
     st.markdown("""
     <div class="section-header">
         <h2>📊 Studies Configuration</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     col_studies1, col_studies2 = st.columns([3, 1])
-    
+
     with col_studies1:
         study_col1, study_col2, study_col3 = st.columns(3)
-        
+
         with study_col1:
-            st.session_state.studies_selected['load_flow'] = st.checkbox(
-                "Load Flow Study",
-                value=st.session_state.studies_selected['load_flow'],
-                key="load_flow_cb"
-            )
-            st.session_state.studies_selected['short_circuit'] = st.checkbox(
-                "Short Circuit Study",
-                value=st.session_state.studies_selected['short_circuit'],
-                key="short_circuit_cb"
-            )
-        
+            st.checkbox("Load Flow Study", key="load_flow_cb", **reprice)
+            st.checkbox("Short Circuit Study", key="short_circuit_cb", **reprice)
+
         with study_col2:
-            st.session_state.studies_selected['pdc'] = st.checkbox(
-                "Protective Device Coordination",
-                value=st.session_state.studies_selected['pdc'],
-                key="pdc_cb"
-            )
-            st.session_state.studies_selected['arc_flash'] = st.checkbox(
-                "Arc Flash Study",
-                value=st.session_state.studies_selected['arc_flash'],
-                key="arc_flash_cb"
-            )
-        
+            st.checkbox("Protective Device Coordination", key="pdc_cb", **reprice)
+            st.checkbox("Arc Flash Study", key="arc_flash_cb", **reprice)
+
         with study_col3:
-            st.session_state.studies_selected['harmonics'] = st.checkbox(
-                "Harmonics Study",
-                value=st.session_state.studies_selected['harmonics'],
-                key="harmonics_cb"
-            )
-            st.session_state.studies_selected['transient'] = st.checkbox(
-                "Transient Analysis",
-                value=st.session_state.studies_selected['transient'],
-                key="transient_cb"
-            )
-    
+            st.checkbox("Harmonics Study", key="harmonics_cb", **reprice)
+            st.checkbox("Transient Analysis", key="transient_cb", **reprice)
+
     with col_studies2:
-        if st.button("Select All Studies", key="select_all_studies"):
-            for key in st.session_state.studies_selected:
-                st.session_state.studies_selected[key] = True
-            st.rerun()
-        
-        if st.button("Clear All Studies", key="clear_all_studies"):
-            for key in st.session_state.studies_selected:
-                st.session_state.studies_selected[key] = False
-            st.rerun()
+        st.button("Select All Studies", key="select_all_studies", on_click=set_all_studies, args=(True,))
+        st.button("Clear All Studies", key="clear_all_studies", on_click=set_all_studies, args=(False,))
+
 
-    # Work Allocation Section
+@st.fragment(key="inputs_work_allocation")
+def render_work_allocation_inputs():
+    """Senior / mid / junior split panel."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_work_allocation",)}
     st.markdown("""
     <div class="section-header">
         <h2>👥 Work Allocation Configuration</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     with st.container():
         st.markdown('<div class="work-allocation-section">', unsafe_allow_html=True)
-        
+
         alloc_col1, alloc_col2, alloc_col3, alloc_col4 = st.columns(4)
-        
+
         with alloc_col1:
-            st.session_state.work_allocation['senior'] = st.slider(
-                "Senior Engineer (%)", 
-                5, 50, st.session_state.work_allocation['senior'], 1
-            )
-        
+            senior = st.slider("Senior Engineer (%)", 5, 50, step=1, key="senior_allocation", **reprice)
+
         with alloc_col2:
-            st.session_state.work_allocation['mid'] = st.slider(
-                "Mid-level Engineer (%)", 
-                10, 60, st.session_state.work_allocation['mid'], 1
-            )
-        
+            mid = st.slider("Mid-level Engineer (%)", 10, 60, step=1, key="mid_allocation", **reprice)
+
         with alloc_col3:
-            st.session_state.work_allocation['junior'] = st.slider(
-                "Junior Engineer (%)", 
-                10, 70, st.session_state.work_allocation['junior'], 1
-            )
-        
+            junior = st.slider("Junior Engineer (%)", 10, 70, step=1, key="junior_allocation", **reprice)
+
         with alloc_col4:
-            if st.button("Auto Balance (20:30:50)", key="auto_balance"):
-                st.session_state.work_allocation = {'senior': 20, 'mid': 30, 'junior': 50}
-                st.rerun()
-        
+            st.button("Auto Balance (20:30:50)", key="auto_balance", on_click=auto_balance_allocation)
+
         # Normalize allocations
-        total_allocation = sum(st.session_state.work_allocation.values())
-        if total_allocation != 100:
-            factor = 100 / total_allocation
-            for key in st.session_state.work_allocation:
-                st.session_state.work_allocation[key] = round(st.session_state.work_allocation[key] * factor, 1)
-        
-        st.success(f"✅ Current Allocation: Senior {st.session_state.work_allocation['senior']:.1f}% | Mid {st.session_state.work_allocation['mid']:.1f}% | Junior {st.session_state.work_allocation['junior']:.1f}%")
-        
+        work_allocation = normalize_work_allocation({'senior': senior, 'mid': mid, 'junior': junior})
+
+        st.success(f"✅ Current Allocation: Senior {work_allocation['senior']:.1f}% | Mid {work_allocation['mid']:.1f}% | Junior {work_allocation['junior']:.1f}%")
+
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # Rate Configuration Section
+
+@st.fragment(key="inputs_rates")
+def render_rate_inputs():
+    """Hourly rates, study factors and report costs, optionally batch-applied through a form."""
+    seed_inputs()
     st.markdown("""
     <div class="section-header">
         <h2>💰 Rate Configuration</h2>
     </div>
     """, unsafe_allow_html=True)
-    
-    rate_col1, rate_col2, rate_col3 = st.columns(3)
-    
-    with rate_col1:
-        st.markdown("**Hourly Rates (₹)**")
-        senior_rate = st.number_input("Senior Engineer Rate", min_value=1000, max_value=8000, value=2200, step=50)
-        mid_rate = st.number_input("Mid-level Engineer Rate", min_value=500, max_value=5000, value=1200, step=25)
-        junior_rate = st.number_input("Junior Engineer Rate", min_value=300, max_value=2000, value=800, step=25)
-    
-    with rate_col2:
-        st.markdown("**Study Complexity Factors**")
-        load_flow_factor = st.slider("Load Flow Factor", 0.3, 3.0, 1.0, 0.1)
-        short_circuit_factor = st.slider("Short Circuit Factor", 0.3, 3.0, 1.0, 0.1)
-        pdc_factor = st.slider("PDC Factor", 0.3, 3.0, 1.0, 0.1)
-        arc_flash_factor = st.slider("Arc Flash Factor", 0.3, 3.0, 1.0, 0.1)
-    
-    with rate_col3:
-        st.markdown("**Additional Study Factors**")
-        harmonics_factor = st.slider("Harmonics Factor", 0.3, 3.0, 1.2, 0.1)
-        transient_factor = st.slider("Transient Factor", 0.3, 3.0, 1.3, 0.1)
-        urgency_multiplier = st.slider("Urgent Delivery Multiplier", 1.0, 3.0, 1.3, 0.1)
-        meeting_cost = st.number_input("Cost per Meeting (₹)", min_value=2000, max_value=25000, value=8000, step=500)
-
-    # Report Costs Section
-    st.markdown("""
-    <div class="section-header">
-        <h2>📄 Report Configuration</h2>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    report_col1, report_col2, report_col3 = st.columns(3)
-    
-    with report_col1:
-        load_flow_report_cost = st.number_input("Load Flow Report Cost (₹)", min_value=0, max_value=150000, value=8000, step=500)
-        short_circuit_report_cost = st.number_input("Short Circuit Report Cost (₹)", min_value=0, max_value=150000, value=10000, step=500)
-    with report_col2:
-        pdc_report_cost = st.number_input("PDC Report Cost (₹)", min_value=0, max_value=150000, value=15000, step=500)
-        arc_flash_report_cost = st.number_input("Arc Flash Report Cost (₹)", min_value=0, max_value=150000, value=12000, step=500)
-    with report_col3:
-        harmonics_report_cost = st.number_input("Harmonics Report Cost (₹)", min_value=0, max_value=150000, value=11000, step=500)
-        transient_report_cost = st.number_input("Transient Report Cost (₹)", min_value=0, max_value=150000, value=13000, step=500)
-
-    # Additional Services Section
+
+    batch_rate_edit = st.checkbox(
+        "Edit Rates & Factors, Then Apply",
+        value=False,
+        key="batch_rate_edit",
+        help="Batch edits to rates, study factors and report costs; the estimate is recalculated once when you press Apply instead of on every change."
+    )
+
+    # Form widgets cannot have callbacks: the Apply button re-prices instead
+    reprice = {} if batch_rate_edit else {'on_change': reprice_inputs, 'args': ("inputs_rates",)}
+    rate_card_panel = st.form("rate_card_form", border=False) if batch_rate_edit else st.container()
+
+    with rate_card_panel:
+        if batch_rate_edit:
+            applied = st.session_state.get('quote_inputs')
+            if applied is not None and any(input_value(key) != getattr(applied, key) for key in RATE_INPUTS):
+                st.warning("⏳ Edits below are not priced until you press **Apply Rates & Factors** - results reflect the last applied values")
+            else:
+                st.caption("Results reflect the rates and factors below; edits are priced when you press **Apply Rates & Factors**.")
+
+        rate_col1, rate_col2, rate_col3 = st.columns(3)
+
+        with rate_col1:
+            st.markdown("**Hourly Rates (₹)**")
+            st.number_input("Senior Engineer Rate", min_value=1000, max_value=8000, step=50, key="senior_rate", **reprice)
+            st.number_input("Mid-level Engineer Rate", min_value=500, max_value=5000, step=25, key="mid_rate", **reprice)
+            st.number_input("Junior Engineer Rate", min_value=300, max_value=2000, step=25, key="junior_rate", **reprice)
+
+        with rate_col2:
+            st.markdown("**Study Complexity Factors**")
+            st.slider("Load Flow Factor", 0.3, 3.0, step=0.1, key="load_flow_factor", **reprice)
+            st.slider("Short Circuit Factor", 0.3, 3.0, step=0.1, key="short_circuit_factor", **reprice)
+            st.slider("PDC Factor", 0.3, 3.0, step=0.1, key="pdc_factor", **reprice)
+            st.slider("Arc Flash Factor", 0.3, 3.0, step=0.1, key="arc_flash_factor", **reprice)
+
+        with rate_col3:
+            st.markdown("**Additional Study Factors**")
+            st.slider("Harmonics Factor", 0.3, 3.0, step=0.1, key="harmonics_factor", **reprice)
+            st.slider("Transient Factor", 0.3, 3.0, step=0.1, key="transient_factor", **reprice)
+            st.slider("Urgent Delivery Multiplier", 1.0, 3.0, step=0.1, key="urgency_multiplier", **reprice)
+            st.number_input("Cost per Meeting (₹)", min_value=2000, max_value=25000, step=500, key="meeting_cost", **reprice)
+
+        # Report Costs Section
+        st.markdown("""
+        <div class="section-header">
+            <h2>📄 Report Configuration</h2>
+        </div>
+        """, unsafe_allow_html=True)
+
+        report_col1, report_col2, report_col3 = st.columns(3)
+
+        with report_col1:
+            st.number_input("Load Flow Report Cost (₹)", min_value=0, max_value=150000, step=500, key="load_flow_report_cost", **reprice)
+            st.number_input("Short Circuit Report Cost (₹)", min_value=0, max_value=150000, step=500, key="short_circuit_report_cost", **reprice)
+        with report_col2:
+            st.number_input("PDC Report Cost (₹)", min_value=0, max_value=150000, step=500, key="pdc_report_cost", **reprice)
+            st.number_input("Arc Flash Report Cost (₹)", min_value=0, max_value=150000, step=500, key="arc_flash_report_cost", **reprice)
+        with report_col3:
+            st.number_input("Harmonics Report Cost (₹)", min_value=0, max_value=150000, step=500, key="harmonics_report_cost", **reprice)
+            st.number_input("Transient Report Cost (₹)", min_value=0, max_value=150000, step=500, key="transient_report_cost", **reprice)
+
+        if batch_rate_edit:
+            st.form_submit_button("✅ Apply Rates & Factors", use_container_width=True, on_click=apply_rate_card)
+
+    if batch_rate_edit and st.session_state.get('rate_card_applied_at'):
+        st.success(f"✅ Rates & factors applied at {st.session_state.rate_card_applied_at}")
+
+
+@st.fragment(key="inputs_additional_services")
+def render_additional_service_inputs():
+    """Site visits, arc flash labels, stickering and custom charges panel."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_additional_services",)}
     st.markdown("""
     <div class="section-header">
         <h2>➕ Additional Services</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     with st.container():
         st.markdown('<div class="custom-cost-section">', unsafe_allow_html=True)
-        
+
         custom_col1, custom_col2, custom_col3, custom_col4 = st.columns(4)
-        
+
         with custom_col1:
-            site_visit_enabled = st.checkbox("Site Visits Required", value=True)
-            if site_visit_enabled:
-                site_visits = st.number_input("Number of Site Visits", min_value=0, max_value=20, value=2, step=1)
-                site_visit_cost = st.number_input("Cost per Site Visit (₹)", min_value=0, max_value=50000, value=12000, step=500)
-            else:
-                site_visits = 0
-                site_visit_cost = 0
-        
+            if st.checkbox("Site Visits Required", key="site_visit_enabled", **reprice):
+                st.number_input("Number of Site Visits", min_value=0, max_value=20, step=1, key="site_visits", **reprice)
+                st.number_input("Cost per Site Visit (₹)", min_value=0, max_value=50000, step=500, key="site_visit_cost", **reprice)
+
         with custom_col2:
-            af_labels_enabled = st.checkbox("Arc Flash Labels Required", value=False)
-            if af_labels_enabled:
-                num_labels = st.number_input("Number of Labels", min_value=0, max_value=500, value=50, step=1)
-                cost_per_label = st.number_input("Cost per Label (₹)", min_value=0, max_value=500, value=150, step=10)
-            else:
-                num_labels = 0
-                cost_per_label = 0
-        
+            if st.checkbox("Arc Flash Labels Required", key="af_labels_enabled", **reprice):
+                st.number_input("Number of Labels", min_value=0, max_value=500, step=1, key="num_labels", **reprice)
+                st.number_input("Cost per Label (₹)", min_value=0, max_value=500, step=10, key="cost_per_label", **reprice)
+
         with custom_col3:
-            stickering_enabled = st.checkbox("Equipment Stickering Required", value=False)
-            if stickering_enabled:
-                stickering_cost = st.number_input("Stickering Cost (₹)", min_value=0, max_value=100000, value=25000, step=1000)
-            else:
-                stickering_cost = 0
-        
+            if st.checkbox("Equipment Stickering Required", key="stickering_enabled", **reprice):
+                st.number_input("Stickering Cost (₹)", min_value=0, max_value=100000, step=1000, key="stickering_cost", **reprice)
+
         with custom_col4:
             st.markdown("**Custom Charges**")
-            custom_charges_desc = st.text_input("Description", value="Additional Services", placeholder="Enter description")
-            custom_charges_cost = st.number_input("Custom Charges (₹)", min_value=0, max_value=500000, value=0, step=1000)
-        
+            st.text_input("Description", placeholder="Enter description", key="custom_charges_desc", **reprice)
+            st.number_input("Custom Charges (₹)", min_value=0, max_value=500000, step=1000, key="custom_charges_cost", **reprice)
+
         st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Custom Cost Sections
+
+
+@st.fragment(key="inputs_custom_costs")
+def render_custom_cost_inputs():
+    """Two free-form custom cost items."""
+    seed_inputs()
+    reprice = {'on_change': reprice_inputs, 'args': ("inputs_custom_costs",)}
     st.markdown("""
     <div class="section-header">
         <h2>💼 Custom Cost Sections</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     with st.container():
         st.markdown('<div class="custom-cost-section">', unsafe_allow_html=True)
-        
+
         custom_cost_col1, custom_cost_col2 = st.columns(2)
-        
+
         with custom_cost_col1:
             st.markdown("**Custom Cost Item 1**")
-            custom_cost_1_desc = st.text_area(
-                "Description/Remark (Editable)",
-                value="Custom Engineering Services",
-                height=80,
-                key="custom_cost_1_desc"
-            )
-            custom_cost_1_amount = st.number_input(
-                "Amount (₹)",
-                min_value=0,
-                max_value=1000000,
-                value=0,
-                step=1000,
-                key="custom_cost_1_amount"
-            )
-        
+            st.text_area("Description/Remark (Editable)", height=80, key="custom_cost_1_desc", **reprice)
+            st.number_input("Amount (₹)", min_value=0, max_value=1000000, step=1000, key="custom_cost_1_amount", **reprice)
+
         with custom_cost_col2:
             st.markdown("**Custom Cost Item 2**")
-            custom_cost_2_desc = st.text_area(
-                "Description/Remark (Editable)",
-                value="Specialized Testing & Validation",
-                height=80,
-                key="custom_cost_2_desc"
-            )
-            custom_cost_2_amount = st.number_input(
-                "Amount (₹)",
-                min_value=0,
-                max_value=1000000,
-                value=0,
-                step=1000,
-                key="custom_cost_2_amount"
-            )
-        
+            st.text_area("Description/Remark (Editable)", height=80, key="custom_cost_2_desc", **reprice)
+            st.number_input("Amount (₹)", min_value=0, max_value=1000000, step=1000, key="custom_cost_2_amount", **reprice)
+
         st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Scope Description Section
+
+
+@st.fragment(key="inputs_scope")
+def render_scope_inputs():
+    """Scope of work text."""
+    seed_inputs()
     st.markdown("""
     <div class="section-header">
         <h2>📝 Project Scope Description</h2>
     </div>
     """, unsafe_allow_html=True)
-    
+
     with st.container():
         st.markdown('<div class="scope-section">', unsafe_allow_html=True)
-        
-        scope_description = st.text_area(
-            "Scope of Work (Editable)",
-            value="""This project includes comprehensive power system studies for a data center facility:
 
-• Complete electrical system modeling and analysis
-• Detailed study reports with recommendations
-• Client presentations and technical meetings
-• Equipment coordination and protection settings
-• Arc flash hazard analysis and labeling
-• Compliance with IEEE, NFPA, and NEC standards
-
-All deliverables will be provided in digital format with professional documentation.""",
+        st.text_area(
+            "Scope of Work (Editable)",
             height=200,
-            help="Enter detailed scope description, exclusions, deliverables, and assumptions"
+            key="scope_description",
+            help="Enter detailed scope description, exclusions, deliverables, and assumptions",
+            on_change=reprice_inputs,
+            args=("inputs_scope",)
         )
-        
+
         st.markdown('</div>', unsafe_allow_html=True)
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# ENGINEERING CALCULATIONS & RESULTS
+# MAIN APPLICATION
 # ═══════════════════════════════════════════════════════════════════════════════
 
-st.markdown("""
-<div class="section-header">
-    <h2>⚙️ Engineering Calculations & Results</h2>
-</div>
-""", unsafe_allow_html=True)
+with st.container():
+    rerun_timer.section("inputs.project_information")
+    render_project_inputs()
+    rerun_timer.section("inputs.customer")
+    render_customer_inputs()
 
-# Calculate bus count using accurate method
-estimated_buses = calculate_bus_count_accurate(
-    it_capacity=it_capacity,
-    mechanical_load=mechanical_load,
-    house_load=house_load,
-    tier_level=tier_level,
-    pue=pue_value,
-    ups_lineup=ups_lineup,
-    transformer_mva=transformer_mva,
-    lv_bus_mw=lv_bus_mw,
-    pdu_mva=pdu_mva,
-    power_factor=power_factor,
-    bus_calibration=bus_calibration
-)
+    # ═══════════════════════════════════════════════════════════════════════════════
+    # NEW: COMPETITIVE PRICING MODE
+    # ═══════════════════════════════════════════════════════════════════════════════
+
+    rerun_timer.section("inputs.competitive_pricing")
+    render_competitive_inputs()
+
+    # ═══════════════════════════════════════════════════════════════════════════════
+    # BUS COUNT CALCULATION METHOD TOGGLE
+    # ═══════════════════════════════════════════════════════════════════════════════
+
+    rerun_timer.section("inputs.bus_count_config")
+    render_bus_count_inputs()
+    rerun_timer.section("inputs.model_type")
+    render_model_type_inputs()
+    rerun_timer.section("inputs.studies")
+    render_study_inputs()
+    rerun_timer.section("inputs.work_allocation")
+    render_work_allocation_inputs()
+    rerun_timer.section("inputs.rates")
+    render_rate_inputs()
+    rerun_timer.section("inputs.additional_services")
+    render_additional_service_inputs()
+    rerun_timer.section("inputs.custom_costs")
+    render_custom_cost_inputs()
+    rerun_timer.section("inputs.scope")
+    render_scope_inputs()
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# COMPETITIVE PRICING: CATEGORY-WISE BUS SPLIT
+# PRICING (HEADLESS ENGINE)
 # ═══════════════════════════════════════════════════════════════════════════════
 
-if competitive_pricing:
-    # Calculate MW values
-    it_mw = it_capacity
-    mech_mw = mechanical_load
-    house_mw = house_load
-    total_mw = it_mw + mech_mw + house_mw
-    
-    if total_mw > 0:
-        # Proportional base split
-        base_it_buses = estimated_buses * (it_mw / total_mw)
-        base_mech_buses = estimated_buses * (mech_mw / total_mw)
-        base_house_buses = estimated_buses * (house_mw / total_mw)
-        
-        # Mechanical redundancy multiplier
-        mech_red_factors = {"N": 1.0, "N+1": 1.25, "N+N": 2.0, "2N": 2.0}
-        mech_factor = mech_red_factors.get(mech_redundancy, 1.25)
-        mech_buses_est = base_mech_buses * mech_factor
-        
-        # House load formula: 50 buses per MW + 35% increase
-        if house_mw > 0:
-            base_house_buses_rule = 50 * house_mw * 1.35
-            house_buses_est = max(base_house_buses, base_house_buses_rule)
-        else:
-            house_buses_est = 0
-        
-        # IT buses
-        it_buses_est = max(1, round(base_it_buses))
-        mech_buses_est = max(0, round(mech_buses_est))
-        house_buses_est = max(0, round(house_buses_est))
-        
-        # Scale to match total
-        category_total = it_buses_est + mech_buses_est + house_buses_est
-        if category_total > 0:
-            scale = estimated_buses / category_total
-            it_buses_est = max(1, round(it_buses_est * scale))
-            mech_buses_est = max(0, round(mech_buses_est * scale))
-            house_buses_est = max(0, round(house_buses_est * scale))
-            
-            # Final correction
-            delta = estimated_buses - (it_buses_est + mech_buses_est + house_buses_est)
-            house_buses_est += delta
-    else:
-        it_buses_est = estimated_buses
-        mech_buses_est = 0
-        house_buses_est = 0
-    
-    # Display category buses
-    cat_col1, cat_col2, cat_col3 = st.columns(3)
-    with cat_col1:
-        st.markdown(f"<div class='metric-card'><h3>IT Buses</h3><p class='value'>{it_buses_est}</p></div>", unsafe_allow_html=True)
-    with cat_col2:
-        st.markdown(f"<div class='metric-card'><h3>Mech Buses ({mech_redundancy})</h3><p class='value'>{mech_buses_est}</p></div>", unsafe_allow_html=True)
-    with cat_col3:
-        st.markdown(f"<div class='metric-card'><h3>House Buses</h3><p class='value'>{house_buses_est}</p></div>", unsafe_allow_html=True)
-else:
-    it_buses_est = estimated_buses
-    mech_buses_est = 0
-    house_buses_est = 0
-
-# Study complexity factors
-tier_complexity_factors = {"Tier I": 1.0, "Tier II": 1.2, "Tier III": 1.5, "Tier IV": 2.0}
-tier_complexity = tier_complexity_factors[tier_level]
-
-# Work allocation percentages
-senior_allocation = st.session_state.work_allocation['senior'] / 100
-mid_allocation = st.session_state.work_allocation['mid'] / 100
-junior_allocation = st.session_state.work_allocation['junior'] / 100
-
-# Category-wise base hours (for competitive pricing)
-category_hours = {
-    'load_flow': {'it': 0.3, 'mech': 0.4, 'house': 0.6},
-    'short_circuit': {'it': 0.3, 'mech': 0.4, 'house': 0.7},
-    'pdc': {'it': 0.5, 'mech': 0.6, 'house': 0.65},
-    'arc_flash': {'it': 0.4, 'mech': 0.5, 'house': 0.5},
-    'harmonics': {'it': 0.5, 'mech': 0.6, 'house': 0.6},
-    'transient': {'it': 0.8, 'mech': 1.3, 'house': 0.7}
-}
+# Full runs price here; input callbacks price before their fragment reruns
+rerun_timer.section("pricing")
+price_current_quote()
 
-# Standard base hours (non-competitive)
-base_hours_per_bus = {
-    'load_flow':2.5,
-    'short_circuit': 3.0,
-    'pdc': 4.0,
-    'arc_flash': 3.5,
-    'harmonics': 4.0,
-    'transient': 5.0
-}
+# ═══════════════════════════════════════════════════════════════════════════════
+# RESULT SECTIONS
+# ═══════════════════════════════════════════════════════════════════════════════
 
-studies_data = {
-    'load_flow': {
-        'name': 'Load Flow Study',
-        'base_hours_per_bus': base_hours_per_bus['load_flow'],
-        'factor': load_flow_factor,
-        'report_cost': load_flow_report_cost
-    },
-    'short_circuit': {
-        'name': 'Short Circuit Study',
-        'base_hours_per_bus': base_hours_per_bus['short_circuit'],
-        'factor': short_circuit_factor,
-        'report_cost': short_circuit_report_cost
-    },
-    'pdc': {
-        'name': 'Protective Device Coordination',
-        'base_hours_per_bus': base_hours_per_bus['pdc'],
-        'factor': pdc_factor,
-        'report_cost': pdc_report_cost
-    },
-    'arc_flash': {
-        'name': 'Arc Flash Study',
-        'base_hours_per_bus': base_hours_per_bus['arc_flash'],
-        'factor': arc_flash_factor,
-        'report_cost': arc_flash_report_cost
-    },
-    'harmonics': {
-        'name': 'Harmonics Analysis',
-        'base_hours_per_bus': base_hours_per_bus['harmonics'],
-        'factor': harmonics_factor,
-        'report_cost': harmonics_report_cost
-    },
-    'transient': {
-        'name': 'Transient Stability Analysis',
-        'base_hours_per_bus': base_hours_per_bus['transient'],
-        'factor': transient_factor,
-        'report_cost': transient_report_cost
-    }
-}
+# Every section is a keyed fragment that renders only from the priced quote in
+# session state, so an input callback can rerun just the sections it affects,
+# and touching a section's own widgets reruns just that section.
 
-study_manhours = {}
-total_manhours = 0
+SWEEP_EXCLUDED_FIELDS = NON_PRICING_FIELDS + ('it_capacity', 'tier_level', 'pue_value')
 
-for study_key, study_data in studies_data.items():
-    if st.session_state.studies_selected.get(study_key, False):
-        
-        if competitive_pricing and study_key in category_hours:
-            # Competitive pricing: category-wise hours
-            it_base = category_hours[study_key]['it']
-            mech_base = category_hours[study_key]['mech']
-            house_base = category_hours[study_key]['house']
-            
-            base_study_hours = (
-                it_buses_est * it_base +
-                mech_buses_est * mech_base +
-                house_buses_est * house_base
-            ) * study_data['factor'] * tier_complexity
-        else:
-            # Standard pricing: unified hours
-            base_study_hours = (
-                estimated_buses *
-                study_data['base_hours_per_bus'] *
-                study_data['factor'] *
-                tier_complexity
-            )
-        
-        study_manhours[study_key] = base_study_hours
-        total_manhours += base_study_hours
-    else:
-        study_manhours[study_key] = 0
 
-if hour_reduction > 0:
-    original_manhours = total_manhours
-    total_manhours = total_manhours * (1 - hour_reduction / 100)
-    hours_reduced = original_manhours - total_manhours
-else:
-    hours_reduced = 0
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_parameter_sweep(sweep_hash, card_version, _sweep_inputs, _rate_card, it_min, it_max, it_points, pue_values):
+    """Sweep grid, cached on the hash of every input the grid depends on."""
+    it_grid = np.round(np.linspace(it_min, it_max, it_points), 1)
+    return parameter_sweep(_sweep_inputs, it_grid, list(pue_values), rate_card=_rate_card)
 
-senior_hours = total_manhours * senior_allocation
-mid_hours = total_manhours * mid_allocation
-junior_hours = total_manhours * junior_allocation
 
-senior_cost = senior_hours * senior_rate
-mid_cost = mid_hours * mid_rate
-junior_cost = junior_hours * junior_rate
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_breakpoint_table(breakpoint_hash, card_version, _breakpoint_inputs, _rate_card):
+    """Breakpoint table, cached on every input except IT capacity."""
+    return build_breakpoint_table(_breakpoint_inputs, rate_card=_rate_card)
 
-total_labor_cost = senior_cost + mid_cost + junior_cost
 
-report_costs = {}
-total_report_cost = 0
+@st.fragment(key="results_engineering")
+def render_engineering_results():
+    """Bus counts, manhours and complexity metric cards."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>⚙️ Engineering Calculations & Results</h2>
+    </div>
+    """, unsafe_allow_html=True)
 
-if st.session_state.studies_selected['load_flow']:
-    report_costs['load_flow'] = load_flow_report_cost
-    total_report_cost += load_flow_report_cost
+    if quote_inputs.competitive_pricing:
+        # Display category buses
+        cat_col1, cat_col2, cat_col3 = st.columns(3)
+        with cat_col1:
+            st.markdown(f"<div class='metric-card'><h3>IT Buses</h3><p class='value'>{quote.it_buses_est}</p></div>", unsafe_allow_html=True)
+        with cat_col2:
+            st.markdown(f"<div class='metric-card'><h3>Mech Buses ({quote_inputs.mech_redundancy})</h3><p class='value'>{quote.mech_buses_est}</p></div>", unsafe_allow_html=True)
+        with cat_col3:
+            st.markdown(f"<div class='metric-card'><h3>House Buses</h3><p class='value'>{quote.house_buses_est}</p></div>", unsafe_allow_html=True)
 
-if st.session_state.studies_selected['short_circuit']:
-    report_costs['short_circuit'] = short_circuit_report_cost
-    total_report_cost += short_circuit_report_cost
+    st.markdown('<div class="results-container">', unsafe_allow_html=True)
 
-if st.session_state.studies_selected['pdc']:
-    report_costs['pdc'] = pdc_report_cost
-    total_report_cost += pdc_report_cost
+    metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
 
-if st.session_state.studies_selected['arc_flash']:
-    report_costs['arc_flash'] = arc_flash_report_cost
-    total_report_cost += arc_flash_report_cost
+    with metric_col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Estimated Buses</h3>
+            <p class="value">{quote.estimated_buses}</p>
+            <p class="subtitle">{'Competitive Mode' if quote_inputs.competitive_pricing else 'Standard Mode'}{f' · {quote_inputs.bus_method}' if quote.bus_type_counts else ''}</p>
+        </div>
+        """, unsafe_allow_html=True)
 
-if st.session_state.studies_selected['harmonics']:
-    report_costs['harmonics'] = harmonics_report_cost
-    total_report_cost += harmonics_report_cost
+    with metric_col2:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Total Manhours</h3>
+            <p class="value">{quote.total_manhours:.1f}</p>
+            <p class="subtitle">{f"Reduced by {quote_inputs.hour_reduction}%" if quote_inputs.hour_reduction > 0 else "Standard Calculation"}</p>
+        </div>
+        """, unsafe_allow_html=True)
 
-if st.session_state.studies_selected['transient']:
-    report_costs['transient'] = transient_report_cost
-    total_report_cost += transient_report_cost
+    with metric_col3:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Studies Selected</h3>
+            <p class="value">{sum(quote_inputs.studies_selected.values())}</p>
+            <p class="subtitle">Active Studies</p>
+        </div>
+        """, unsafe_allow_html=True)
 
-complexity_multipliers = {"Basic": 0.8, "Standard": 1.0, "Premium": 1.3}
-complexity_multiplier = complexity_multipliers[report_complexity]
-total_report_cost = total_report_cost * complexity_multiplier
+    with metric_col4:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Complexity</h3>
+            <p class="value">{quote_inputs.tier_level}</p>
+            <p class="subtitle">{quote.tier_complexity}x Factor</p>
+        </div>
+        """, unsafe_allow_html=True)
 
-total_site_visit_cost = site_visits * site_visit_cost if site_visit_enabled else 0
-total_label_cost = num_labels * cost_per_label if af_labels_enabled else 0
-total_stickering_cost = stickering_cost if stickering_enabled else 0
-total_meeting_cost = client_meetings * meeting_cost
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    if quote.bus_type_counts:
+        render_topology(quote_inputs, quote)
+
+
+def render_topology(quote_inputs, quote):
+    """Bus counts by type, competitive hours per study and bus type, and the generated bus list on request."""
+    imported = quote_inputs.bus_method == IMPORTED_BUS_METHOD
+    st.markdown("### 📥 Imported Bus List" if imported else "### 🧭 Single-Line Topology")
+    counts = pd.DataFrame({
+        'Bus Type': [BUS_TYPE_NAMES[bus_type] for bus_type in quote.bus_type_counts],
+        'Buses': list(quote.bus_type_counts.values()),
+    })
+    type_col, list_col = st.columns([1, 2])
+    with type_col:
+        st.dataframe(counts[counts['Buses'] > 0], hide_index=True, use_container_width=True)
+    with list_col:
+        if not imported and st.toggle("Show bus list", key="show_topology_buses"):
+            st.dataframe(quote_topology(quote_inputs).to_frame(), hide_index=True,
+                         use_container_width=True, height=320)
+
+    if quote.study_type_hours:
+        st.markdown("#### Study Hours by Bus Type")
+        hours = pd.DataFrame(quote.study_type_hours).T
+        hours = hours.loc[:, hours.sum() > 0].rename(index=STUDY_NAMES, columns=BUS_TYPE_NAMES)
+        hours['Total'] = hours.sum(axis=1)
+        st.dataframe(hours.round(1), use_container_width=True)
+        if quote_inputs.hour_reduction > 0:
+            st.caption(f"Before the {quote_inputs.hour_reduction}% hour reduction")
+
+
+@st.fragment(key="results_study_cards")
+def render_study_breakdown():
+    """Per-study manhours, labor and report cost cards."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>📊 Study-wise Cost Breakdown</h2>
+    </div>
+    """, unsafe_allow_html=True)
 
-subtotal_before_adjustments = (total_labor_cost + total_report_cost + 
-                                total_site_visit_cost + total_label_cost + 
-                                total_stickering_cost + custom_charges_cost + 
-                                total_meeting_cost + custom_cost_1_amount + 
-                                custom_cost_2_amount)
+    for study_key, study_display_name in STUDY_NAMES.items():
+        if quote_inputs.studies_selected[study_key]:
+            hours = quote.study_manhours[study_key]
+            study_labor = quote.study_labor_costs[study_key]
+            study_report = quote.study_report_costs[study_key]
+            study_total = study_labor + study_report
 
-if delivery_type == "Urgent":
-    urgency_cost = subtotal_before_adjustments * (urgency_multiplier - 1)
-else:
-    urgency_cost = 0
+            st.markdown(f"""
+            <div class="study-card">
+                <h4>{study_display_name}</h4>
+                <div class="study-details">
+                    <div>
+                        <p class="study-detail-item"><strong>Manhours:</strong> {hours:.1f} hours</p>
+                        <p class="study-detail-item"><strong>Labor Cost:</strong> ₹{study_labor:,.0f}</p>
+                        <p class="study-detail-item"><strong>Report Cost:</strong> ₹{study_report:,.0f}</p>
+                    </div>
+                    <div class="cost-highlight">
+                        <p class="amount">₹{study_total:,.0f}</p>
+                        <p style="margin: 0.5rem 0 0 0; font-size: 0.85rem; opacity: 0.9;">Study Total</p>
+                    </div>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
 
-subtotal_after_urgency = subtotal_before_adjustments + urgency_cost
 
-if customer_type == "Repeat Customer" and repeat_discount > 0:
-    discount_amount = subtotal_after_urgency * (repeat_discount / 100)
-else:
-    discount_amount = 0
+@st.fragment(key="results_cost_summary")
+def render_cost_summary():
+    """Labor breakdown, additional costs and cost categories."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>💰 Comprehensive Cost Summary</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown('<div class="summary-section">', unsafe_allow_html=True)
 
-subtotal_after_discount = subtotal_after_urgency - discount_amount
+    summary_col1, summary_col2 = st.columns([2, 1])
 
-margin_amount = subtotal_after_discount * (custom_margin / 100)
-final_total_cost = subtotal_after_discount + margin_amount
+    with summary_col1:
+        st.markdown("### Labor Cost Breakdown")
+        st.markdown(f"""
+        - **Senior Engineer:** {quote.senior_hours:.1f} hrs @ ₹{quote_inputs.senior_rate}/hr = **₹{quote.senior_cost:,.0f}**
+        - **Mid-level Engineer:** {quote.mid_hours:.1f} hrs @ ₹{quote_inputs.mid_rate}/hr = **₹{quote.mid_cost:,.0f}**
+        - **Junior Engineer:** {quote.junior_hours:.1f} hrs @ ₹{quote_inputs.junior_rate}/hr = **₹{quote.junior_cost:,.0f}**
+        - **Total Labor Cost:** **₹{quote.total_labor_cost:,.0f}**
+        """)
 
-st.markdown('<div class="results-container">', unsafe_allow_html=True)
+        if quote_inputs.hour_reduction > 0:
+            st.info(f"⚡ Hour Reduction Applied: {quote.hours_reduced:.1f} hours saved ({quote_inputs.hour_reduction}%)")
 
-metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
+        if quote_inputs.competitive_pricing:
+            st.success(f"💡 Competitive Pricing Active: IT={quote.it_buses_est} | Mech={quote.mech_buses_est} ({quote_inputs.mech_redundancy}) | House={quote.house_buses_est}")
 
-with metric_col1:
-    st.markdown(f"""
-    <div class="metric-card">
-        <h3>Estimated Buses</h3>
-        <p class="value">{estimated_buses}</p>
-        <p class="subtitle">{'Competitive Mode' if competitive_pricing else 'Standard Mode'}</p>
+        st.markdown("---")
+
+        st.markdown("### Additional Costs")
+        st.markdown(f"""
+        - **Report Costs ({quote_inputs.report_complexity}):** ₹{quote.total_report_cost:,.0f}
+        - **Site Visits ({quote_inputs.site_visits}):** ₹{quote.total_site_visit_cost:,.0f}
+        - **Client Meetings ({quote_inputs.client_meetings}):** ₹{quote.total_meeting_cost:,.0f}
+        - **Arc Flash Labels ({quote_inputs.num_labels}):** ₹{quote.total_label_cost:,.0f}
+        - **Equipment Stickering:** ₹{quote.total_stickering_cost:,.0f}
+        - **{quote_inputs.custom_charges_desc}:** ₹{quote_inputs.custom_charges_cost:,.0f}
+        - **{quote_inputs.custom_cost_1_desc}:** ₹{quote_inputs.custom_cost_1_amount:,.0f}
+        - **{quote_inputs.custom_cost_2_desc}:** ₹{quote_inputs.custom_cost_2_amount:,.0f}
+        """)
+
+    with summary_col2:
+        st.markdown("### Cost Categories")
+
+        categories = [
+            ("Labor", quote.total_labor_cost),
+            ("Reports", quote.total_report_cost),
+            ("Site Visits", quote.total_site_visit_cost),
+            ("Meetings", quote.total_meeting_cost),
+            ("Labels & Stickering", quote.total_label_cost + quote.total_stickering_cost),
+            ("Custom Services", quote.total_custom_cost)
+        ]
+
+        for cat_name, cat_value in categories:
+            if cat_value > 0:
+                percentage = (cat_value / quote.subtotal_before_adjustments) * 100
+                st.markdown(f"""
+                <div class="cost-category-card">
+                    <p style="margin: 0; font-size: 0.8rem; color: #64748b;">{cat_name}</p>
+                    <p style="margin: 0.3rem 0 0 0; font-size: 1.2rem; font-weight: 700; color: #3b82f6;">₹{cat_value:,.0f}</p>
+                    <p style="margin: 0.2rem 0 0 0; font-size: 0.75rem; color: #94a3b8;">{percentage:.1f}%</p>
+                </div>
+                """, unsafe_allow_html=True)
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment(key="results_final_quotation")
+def render_final_quotation():
+    """Subtotal, urgency, discount, margin and final cost."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>📋 Final Quotation</h2>
     </div>
     """, unsafe_allow_html=True)
 
-with metric_col2:
+    st.markdown('<div class="final-total-section">', unsafe_allow_html=True)
+
     st.markdown(f"""
-    <div class="metric-card">
-        <h3>Total Manhours</h3>
-        <p class="value">{total_manhours:.1f}</p>
-        <p class="subtitle">{f"Reduced by {hour_reduction}%" if hour_reduction > 0 else "Standard Calculation"}</p>
-    </div>
+    <h3 style="margin: 0 0 1.5rem 0; font-size: 1.5rem;">Project: {quote_inputs.project_name}</h3>
     """, unsafe_allow_html=True)
 
-with metric_col3:
+    final_col1, final_col2, final_col3 = st.columns(3)
+
+    with final_col1:
+        st.markdown(f"""
+        <div style="text-align: center;">
+            <p style="margin: 0; font-size: 0.9rem; opacity: 0.9;">Subtotal (Before Adjustments)</p>
+            <p style="margin: 0.5rem 0 0 0; font-size: 1.8rem; font-weight: 800;">₹{quote.subtotal_before_adjustments:,.0f}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with final_col2:
+        st.markdown(f"""
+        <div style="text-align: center;">
+            <p style="margin: 0; font-size: 0.9rem; opacity: 0.9;">Urgency Charge</p>
+            <p style="margin: 0.5rem 0 0 0; font-size: 1.8rem; font-weight: 800;">₹{quote.urgency_cost:,.0f}</p>
+            <p style="margin: 0.3rem 0 0 0; font-size: 0.8rem; opacity: 0.85;">{f"({quote_inputs.urgency_multiplier}x)" if quote_inputs.delivery_type == "Urgent" else "Standard"}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with final_col3:
+        st.markdown(f"""
+        <div style="text-align: center;">
+            <p style="margin: 0; font-size: 0.9rem; opacity: 0.9;">Discount Applied</p>
+            <p style="margin: 0.5rem 0 0 0; font-size: 1.8rem; font-weight: 800;">-₹{quote.discount_amount:,.0f}</p>
+            <p style="margin: 0.3rem 0 0 0; font-size: 0.8rem; opacity: 0.85;">{f"({quote_inputs.repeat_discount}%)" if quote_inputs.repeat_discount > 0 else "None"}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    st.markdown("<hr style='margin: 2rem 0; border: none; border-top: 2px solid rgba(255,255,255,0.3);'>", unsafe_allow_html=True)
+
+    margin_col1, margin_col2 = st.columns(2)
+
+    with margin_col1:
+        st.markdown(f"""
+        <div style="text-align: center;">
+            <p style="margin: 0; font-size: 1rem; opacity: 0.9;">Subtotal After Adjustments</p>
+            <p style="margin: 0.5rem 0 0 0; font-size: 2rem; font-weight: 800;">₹{quote.subtotal_after_discount:,.0f}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with margin_col2:
+        st.markdown(f"""
+        <div style="text-align: center;">
+            <p style="margin: 0; font-size: 1rem; opacity: 0.9;">Project Margins ({quote_inputs.custom_margin}%)</p>
+            <p style="margin: 0.5rem 0 0 0; font-size: 2rem; font-weight: 800;">₹{quote.margin_amount:,.0f}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    st.markdown("<hr style='margin: 2rem 0; border: none; border-top: 3px solid rgba(255,255,255,0.4);'>", unsafe_allow_html=True)
+
     st.markdown(f"""
-    <div class="metric-card">
-        <h3>Studies Selected</h3>
-        <p class="value">{sum(st.session_state.studies_selected.values())}</p>
-        <p class="subtitle">Active Studies</p>
+    <div style="text-align: center; margin-top: 2rem;">
+        <p style="margin: 0; font-size: 1.3rem; font-weight: 600; opacity: 0.95;">FINAL PROJECT COST</p>
+        <p style="margin: 1rem 0 0 0; font-size: 3.5rem; font-weight: 900; text-shadow: 0 4px 10px rgba(0,0,0,0.3);">₹{quote.final_total_cost:,.0f}</p>
+        <p style="margin: 0.5rem 0 0 0; font-size: 0.95rem; opacity: 0.9;">Inclusive of all charges, margins, and adjustments</p>
     </div>
     """, unsafe_allow_html=True)
 
-with metric_col4:
-    st.markdown(f"""
-    <div class="metric-card">
-        <h3>Complexity</h3>
-        <p class="value">{tier_level}</p>
-        <p class="subtitle">{tier_complexity}x Factor</p>
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment(key="results_monte_carlo")
+def render_monte_carlo():
+    """P10/P50/P90 bands of manhours and final cost."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>🎲 Price Uncertainty (Monte Carlo)</h2>
     </div>
     """, unsafe_allow_html=True)
 
-st.markdown('</div>', unsafe_allow_html=True)
+    with st.container():
+        st.markdown('<div class="model-section">', unsafe_allow_html=True)
 
-st.markdown("""
-<div class="section-header">
-    <h2>📊 Study-wise Cost Breakdown</h2>
-</div>
-""", unsafe_allow_html=True)
+        monte_carlo_enabled = st.checkbox(
+            "Enable Monte Carlo Uncertainty Bands",
+            value=False,
+            help="Treat PUE, study factors, bus calibration and hour reduction as uncertain and report P10/P50/P90 of manhours and final cost."
+        )
 
-study_names_display = {
-    'load_flow': 'Load Flow Study',
-    'short_circuit': 'Short Circuit Study',
-    'pdc': 'Protective Device Coordination',
-    'arc_flash': 'Arc Flash Study',
-    'harmonics': 'Harmonics Study',
-    'transient': 'Transient Analysis'
-}
+        if monte_carlo_enabled:
+            mc_col1, mc_col2, mc_col3, mc_col4 = st.columns(4)
+
+            with mc_col1:
+                mc_samples = st.number_input("Samples", min_value=1000, max_value=100000, value=20000, step=1000)
+                mc_seed = st.number_input("Random Seed", min_value=0, max_value=999999, value=42, step=1)
+            with mc_col2:
+                pue_spread = st.slider("PUE Spread (±%)", 0, 30, 5, 1)
+                factor_spread = st.slider("Study Factor Spread (±%)", 0, 50, 15, 1)
+            with mc_col3:
+                calibration_spread = st.slider("Bus Calibration Spread (±%)", 0, 50, 10, 1)
+            with mc_col4:
+                if quote_inputs.hour_reduction > 0:
+                    reduction_spread = st.slider("Hour Reduction Spread (±%)", 0, 50, 20, 1)
+                else:
+                    reduction_spread = 0
+                    st.info("🔧 Hour reduction fixed (Typical Model)")
+
+            mc_distributions = {
+                'pue_value': triangular_spread(quote_inputs.pue_value, pue_spread),
+                'bus_calibration': triangular_spread(quote_inputs.bus_calibration, calibration_spread),
+            }
+            for study_key in STUDY_NAMES:
+                factor_name = f"{study_key}_factor"
+                mc_distributions[factor_name] = triangular_spread(getattr(quote_inputs, factor_name), factor_spread)
+            if quote_inputs.hour_reduction > 0:
+                mc_distributions['hour_reduction'] = triangular_spread(quote_inputs.hour_reduction, reduction_spread)
+
+            monte_carlo = run_monte_carlo(quote_inputs, mc_distributions, n_samples=int(mc_samples), seed=int(mc_seed),
+                                          rate_card=active_rate_card())
+
+            band_col1, band_col2 = st.columns(2)
+            for band_col, metric_key, metric_title, fmt in [
+                (band_col1, 'total_manhours', 'Total Manhours', "{:,.1f}"),
+                (band_col2, 'final_total_cost', 'Final Project Cost', "₹{:,.0f}"),
+            ]:
+                bands = monte_carlo['percentiles'][metric_key]
+                with band_col:
+                    st.markdown(f"""
+                    <div class="metric-card">
+                        <h3>{metric_title} (P10 / P50 / P90)</h3>
+                        <p class="value">{fmt.format(bands[50])}</p>
+                        <p class="subtitle">P10 {fmt.format(bands[10])} | P90 {fmt.format(bands[90])}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+            st.caption(f"{int(mc_samples):,} samples (seed {int(mc_seed)}) | Point estimate: ₹{quote.final_total_cost:,.0f}")
 
-for study_key, study_display_name in study_names_display.items():
-    if st.session_state.studies_selected[study_key]:
-        hours = study_manhours[study_key]
-        study_labor = (hours * senior_allocation * senior_rate + 
-                      hours * mid_allocation * mid_rate + 
-                      hours * junior_allocation * junior_rate)
-        study_report = report_costs.get(study_key, 0) * complexity_multiplier
-        study_total = study_labor + study_report
-        
-        st.markdown(f"""
-        <div class="study-card">
-            <h4>{study_display_name}</h4>
-            <div class="study-details">
-                <div>
-                    <p class="study-detail-item"><strong>Manhours:</strong> {hours:.1f} hours</p>
-                    <p class="study-detail-item"><strong>Labor Cost:</strong> ₹{study_labor:,.0f}</p>
-                    <p class="study-detail-item"><strong>Report Cost:</strong> ₹{study_report:,.0f}</p>
-                </div>
-                <div class="cost-highlight">
-                    <p class="amount">₹{study_total:,.0f}</p>
-                    <p style="margin: 0.5rem 0 0 0; font-size: 0.85rem; opacity: 0.9;">Study Total</p>
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment(key="results_sensitivity")
+def render_sensitivity():
+    """Tornado chart of every numeric input."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>🌪️ Sensitivity Analysis</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    with st.container():
+        st.markdown('<div class="model-section">', unsafe_allow_html=True)
+
+        sensitivity_enabled = st.checkbox(
+            "Show Tornado Chart",
+            value=False,
+            help="Perturb every numeric input by ±X% and rank the effect on the final project cost."
+        )
+
+        if sensitivity_enabled:
+            sens_col1, sens_col2 = st.columns(2)
+            with sens_col1:
+                perturb_pct = st.slider("Perturbation (±%)", 1, 50, 10, 1)
+            with sens_col2:
+                tornado_top_n = st.slider("Inputs Shown", 5, len(SENSITIVITY_PARAMETERS), 15, 1)
+
+            tornado_base, tornado_rows = tornado_sensitivity(quote_inputs, perturb_pct, rate_card=active_rate_card())
+            tornado_rows = [row for row in tornado_rows if row['swing'] > 0][:tornado_top_n][::-1]
+
+            tornado_fig = go.Figure()
+            tornado_fig.add_trace(go.Bar(
+                y=[row['label'] for row in tornado_rows],
+                x=[row['low_cost'] - tornado_base for row in tornado_rows],
+                base=tornado_base,
+                orientation='h',
+                name=f"-{perturb_pct}%",
+                marker_color='#06b6d4',
+                customdata=[row['low_cost'] for row in tornado_rows],
+                hovertemplate="%{y}: ₹%{customdata:,.0f}<extra></extra>"
+            ))
+            tornado_fig.add_trace(go.Bar(
+                y=[row['label'] for row in tornado_rows],
+                x=[row['high_cost'] - tornado_base for row in tornado_rows],
+                base=tornado_base,
+                orientation='h',
+                name=f"+{perturb_pct}%",
+                marker_color='#3b82f6',
+                customdata=[row['high_cost'] for row in tornado_rows],
+                hovertemplate="%{y}: ₹%{customdata:,.0f}<extra></extra>"
+            ))
+            tornado_fig.add_vline(x=tornado_base, line_dash="dash", line_color="#94a3b8")
+            tornado_fig.update_layout(
+                barmode='overlay',
+                template='plotly_dark',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                height=max(350, 28 * len(tornado_rows)),
+                margin=dict(l=10, r=10, t=30, b=10),
+                xaxis_title="Final Project Cost (₹)",
+                legend=dict(orientation='h', y=1.05)
+            )
+            st.plotly_chart(tornado_fig, use_container_width=True)
+
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment(key="results_parameter_sweep")
+def render_parameter_sweep():
+    """IT capacity x tier x PUE heatmap and line plots."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>🗺️ Bid Strategy Sweep</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    with st.container():
+        st.markdown('<div class="model-section">', unsafe_allow_html=True)
+
+        sweep_enabled = st.checkbox(
+            "Show IT Capacity × Tier × PUE Sweep",
+            value=False,
+            help="Price a grid of IT capacities, all four tiers and several PUE values using the current rates and factors."
+        )
+
+        if sweep_enabled:
+            sweep_col1, sweep_col2, sweep_col3 = st.columns(3)
+            with sweep_col1:
+                sweep_it_range = st.slider("IT Capacity Range (MW)", 0.1, 200.0, (0.1, 200.0), 0.1)
+                sweep_it_points = st.number_input("IT Capacity Points", min_value=10, max_value=5000, value=1000, step=10)
+            with sweep_col2:
+                sweep_pue_values = st.multiselect(
+                    "PUE Values",
+                    [round(1.1 + 0.1 * i, 1) for i in range(10)],
+                    default=[1.2, 1.4, 1.6, 1.8]
+                )
+            with sweep_col3:
+                sweep_metric = st.selectbox("Metric", list(SWEEP_METRICS), index=2, format_func=SWEEP_METRICS.get)
+
+            if sweep_pue_values:
+                sweep_pue_values = tuple(sorted(sweep_pue_values))
+                sweep_card = active_rate_card()
+                sweep = cached_parameter_sweep(
+                    quote_input_hash(quote_inputs, exclude=SWEEP_EXCLUDED_FIELDS),
+                    rate_card_version(sweep_card),
+                    quote_inputs,
+                    sweep_card,
+                    sweep_it_range[0],
+                    sweep_it_range[1],
+                    int(sweep_it_points),
+                    sweep_pue_values
+                )
+                sweep_pue = st.select_slider("PUE for Heatmap & Lines", options=list(sweep_pue_values))
+                pue_index = list(sweep_pue_values).index(sweep_pue)
+                sweep_values = sweep[sweep_metric][:, :, pue_index]
+
+                heatmap_fig = go.Figure(go.Heatmap(
+                    x=sweep['it_capacity'],
+                    y=sweep['tier_level'],
+                    z=sweep_values.T,
+                    colorscale='Blues',
+                    colorbar=dict(title=SWEEP_METRICS[sweep_metric]),
+                    hovertemplate="%{y} @ %{x} MW: %{z:,.0f}<extra></extra>"
+                ))
+                heatmap_fig.update_layout(
+                    template='plotly_dark',
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    height=320,
+                    margin=dict(l=10, r=10, t=30, b=10),
+                    xaxis_title="IT Capacity (MW)"
+                )
+                st.plotly_chart(heatmap_fig, use_container_width=True)
+
+                lines_fig = go.Figure()
+                for tier_index, tier_name in enumerate(sweep['tier_level']):
+                    lines_fig.add_trace(go.Scatter(
+                        x=sweep['it_capacity'],
+                        y=sweep_values[:, tier_index],
+                        mode='lines',
+                        line_shape='hv' if sweep_metric == 'estimated_buses' else 'linear',
+                        name=tier_name
+                    ))
+                lines_fig.update_layout(
+                    template='plotly_dark',
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    height=380,
+                    margin=dict(l=10, r=10, t=30, b=10),
+                    xaxis_title="IT Capacity (MW)",
+                    yaxis_title=SWEEP_METRICS[sweep_metric],
+                    legend=dict(orientation='h', y=1.08)
+                )
+                st.plotly_chart(lines_fig, use_container_width=True)
+            else:
+                st.warning("⚠️ Select at least one PUE value")
+
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment(key="results_capacity_thresholds")
+def render_capacity_thresholds():
+    """Bus-count price cliffs above the current IT capacity."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>📈 Capacity Thresholds</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    with st.container():
+        st.markdown('<div class="model-section">', unsafe_allow_html=True)
+
+        thresholds_enabled = st.checkbox(
+            "Show Price Cliffs Above Current IT Capacity",
+            value=False,
+            help="List the IT capacities where the bus count (and therefore the quote) steps up for this configuration."
+        )
+
+        if thresholds_enabled:
+            breakpoint_card = active_rate_card()
+            breakpoints = cached_breakpoint_table(
+                quote_input_hash(quote_inputs, exclude=NON_PRICING_FIELDS + ('it_capacity',)),
+                rate_card_version(breakpoint_card),
+                quote_inputs,
+                breakpoint_card
+            )
+            next_cliff = breakpoints.next_cliff(quote_inputs.it_capacity)
+
+            cliff_col1, cliff_col2 = st.columns(2)
+            with cliff_col1:
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h3>Current Segment</h3>
+                    <p class="value">{int(breakpoints.bus_count_at(quote_inputs.it_capacity))} buses</p>
+                    <p class="subtitle">{len(breakpoints.starts)} bus-count steps between 0.1 and 200 MW</p>
                 </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
+            with cliff_col2:
+                if next_cliff:
+                    st.markdown(f"""
+                    <div class="metric-card">
+                        <h3>Next Price Cliff</h3>
+                        <p class="value">{next_cliff['it_capacity']:.3f} MW</p>
+                        <p class="subtitle">Steps to {next_cliff['bus_count']} buses | +₹{next_cliff['price_jump']:,.0f}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                else:
+                    st.info("🔧 No further cliffs up to 200 MW")
+
+            cliff_window = st.slider("Look Ahead (MW)", 0.5, 50.0, 5.0, 0.5)
+            cliff_index = breakpoints.cliffs_between(quote_inputs.it_capacity, quote_inputs.it_capacity + cliff_window)
+            if len(cliff_index):
+                st.dataframe(pd.DataFrame({
+                    'IT Capacity From (MW)': breakpoints.starts[cliff_index].round(4),
+                    'Bus Count': breakpoints.bus_counts[cliff_index],
+                    'Final Cost (₹)': breakpoints.final_costs[cliff_index].round(0),
+                    'Price Jump (₹)': (breakpoints.final_costs[cliff_index] - breakpoints.final_costs[cliff_index - 1]).round(0),
+                }), use_container_width=True, hide_index=True)
+            if quote_inputs.competitive_pricing:
+                st.caption("Competitive pricing: costs shown are at the start of each segment (the category split also moves with the MW mix).")
 
-st.markdown("""
-<div class="section-header">
-    <h2>💰 Comprehensive Cost Summary</h2>
-</div>
-""", unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
 
-st.markdown('<div class="summary-section">', unsafe_allow_html=True)
 
-summary_col1, summary_col2 = st.columns([2, 1])
+@st.fragment(key="results_goal_seek")
+def render_goal_seek():
+    """Lever value needed to reach a target final cost."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>🎯 Goal Seek</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    with st.container():
+        st.markdown('<div class="model-section">', unsafe_allow_html=True)
+
+        goal_seek_enabled = st.checkbox(
+            "Solve for a Target Final Cost",
+            value=False,
+            help="Find the margin, discount, hour reduction or bus calibration that reaches a target quote."
+        )
+
+        if goal_seek_enabled:
+            seek_col1, seek_col2 = st.columns(2)
+            with seek_col1:
+                seek_lever = st.selectbox(
+                    "Lever",
+                    list(GOAL_SEEK_LEVERS),
+                    format_func=lambda lever: GOAL_SEEK_LEVERS[lever][0]
+                )
+            with seek_col2:
+                seek_target = st.number_input(
+                    "Target Final Cost (₹)",
+                    min_value=0,
+                    max_value=1_000_000_000,
+                    value=int(round(quote.final_total_cost, -3)),
+                    step=10000
+                )
+
+            seek = goal_seek(quote_inputs, seek_lever, seek_target, rate_card=active_rate_card())
 
-with summary_col1:
-    st.markdown("### Labor Cost Breakdown")
-    st.markdown(f"""
-    - **Senior Engineer:** {senior_hours:.1f} hrs @ ₹{senior_rate}/hr = **₹{senior_cost:,.0f}**
-    - **Mid-level Engineer:** {mid_hours:.1f} hrs @ ₹{mid_rate}/hr = **₹{mid_cost:,.0f}**
-    - **Junior Engineer:** {junior_hours:.1f} hrs @ ₹{junior_rate}/hr = **₹{junior_cost:,.0f}**
-    - **Total Labor Cost:** **₹{total_labor_cost:,.0f}**
-    """)
-    
-    if hour_reduction > 0:
-        st.info(f"⚡ Hour Reduction Applied: {hours_reduced:.1f} hours saved ({hour_reduction}%)")
-    
-    if competitive_pricing:
-        st.success(f"💡 Competitive Pricing Active: IT={it_buses_est} | Mech={mech_buses_est} ({mech_redundancy}) | House={house_buses_est}")
-    
-    st.markdown("---")
-    
-    st.markdown("### Additional Costs")
-    st.markdown(f"""
-    - **Report Costs ({report_complexity}):** ₹{total_report_cost:,.0f}
-    - **Site Visits ({site_visits}):** ₹{total_site_visit_cost:,.0f}
-    - **Client Meetings ({client_meetings}):** ₹{total_meeting_cost:,.0f}
-    - **Arc Flash Labels ({num_labels}):** ₹{total_label_cost:,.0f}
-    - **Equipment Stickering:** ₹{total_stickering_cost:,.0f}
-    - **{custom_charges_desc}:** ₹{custom_charges_cost:,.0f}
-    - **{custom_cost_1_desc}:** ₹{custom_cost_1_amount:,.0f}
-    - **{custom_cost_2_desc}:** ₹{custom_cost_2_amount:,.0f}
-    """)
-
-with summary_col2:
-    st.markdown("### Cost Categories")
-    
-    categories = [
-        ("Labor", total_labor_cost),
-        ("Reports", total_report_cost),
-        ("Site Visits", total_site_visit_cost),
-        ("Meetings", total_meeting_cost),
-        ("Labels & Stickering", total_label_cost + total_stickering_cost),
-        ("Custom Services", custom_charges_cost + custom_cost_1_amount + custom_cost_2_amount)
-    ]
-    
-    for cat_name, cat_value in categories:
-        if cat_value > 0:
-            percentage = (cat_value / subtotal_before_adjustments) * 100
             st.markdown(f"""
-            <div class="cost-category-card">
-                <p style="margin: 0; font-size: 0.8rem; color: #64748b;">{cat_name}</p>
-                <p style="margin: 0.3rem 0 0 0; font-size: 1.2rem; font-weight: 700; color: #3b82f6;">₹{cat_value:,.0f}</p>
-                <p style="margin: 0.2rem 0 0 0; font-size: 0.75rem; color: #94a3b8;">{percentage:.1f}%</p>
+            <div class="metric-card">
+                <h3>Required {seek['label']}</h3>
+                <p class="value">{seek['value']:.2f}</p>
+                <p class="subtitle">Achieved ₹{seek['achieved_cost']:,.0f} vs target ₹{seek_target:,.0f} ({seek['method']})</p>
             </div>
             """, unsafe_allow_html=True)
 
-st.markdown('</div>', unsafe_allow_html=True)
+            if not seek['feasible']:
+                st.warning(f"⚠️ Target is outside the {seek['label']} range - closest achievable value shown")
+            if seek_lever == 'hour_reduction' and quote_inputs.hour_reduction == 0:
+                st.info("🔧 Hour reduction only applies with an ETAP model available")
+            if seek_lever == 'repeat_discount' and quote_inputs.customer_type != "Repeat Customer":
+                st.info("🔧 Discount assumes the client is priced as a Repeat Customer")
 
-st.markdown("""
-<div class="section-header">
-    <h2>📋 Final Quotation</h2>
-</div>
-""", unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
 
-st.markdown('<div class="final-total-section">', unsafe_allow_html=True)
 
-st.markdown(f"""
-<h3 style="margin: 0 0 1.5rem 0; font-size: 1.5rem;">Project: {project_name}</h3>
-""", unsafe_allow_html=True)
+def add_scenario(name, overrides):
+    """Append a scenario (name + overrides only) with a unique name."""
+    names = {scenario['name'] for scenario in st.session_state.scenarios}
+    unique, n = name, 2
+    while unique in names:
+        unique, n = f"{name} ({n})", n + 1
+    st.session_state.scenarios.append({'name': unique, 'overrides': overrides})
 
-final_col1, final_col2, final_col3 = st.columns(3)
 
-with final_col1:
-    st.markdown(f"""
-    <div style="text-align: center;">
-        <p style="margin: 0; font-size: 0.9rem; opacity: 0.9;">Subtotal (Before Adjustments)</p>
-        <p style="margin: 0.5rem 0 0 0; font-size: 1.8rem; font-weight: 800;">₹{subtotal_before_adjustments:,.0f}</p>
-    </div>
-    """, unsafe_allow_html=True)
+def remove_scenarios():
+    """Drop the scenarios picked in the remove list (button callback)."""
+    to_remove = set(st.session_state.scenario_remove)
+    st.session_state.scenarios = [s for s in st.session_state.scenarios if s['name'] not in to_remove]
+    st.session_state.scenario_remove = []
 
-with final_col2:
-    st.markdown(f"""
-    <div style="text-align: center;">
-        <p style="margin: 0; font-size: 0.9rem; opacity: 0.9;">Urgency Charge</p>
-        <p style="margin: 0.5rem 0 0 0; font-size: 1.8rem; font-weight: 800;">₹{urgency_cost:,.0f}</p>
-        <p style="margin: 0.3rem 0 0 0; font-size: 0.8rem; opacity: 0.85;">{f"({urgency_multiplier}x)" if delivery_type == "Urgent" else "Standard"}</p>
+
+@st.fragment(key="results_scenarios")
+def render_scenarios():
+    """Side-by-side scenarios priced in one batch against the current quote."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>🔀 Scenario Comparison</h2>
     </div>
     """, unsafe_allow_html=True)
 
-with final_col3:
-    st.markdown(f"""
-    <div style="text-align: center;">
-        <p style="margin: 0; font-size: 0.9rem; opacity: 0.9;">Discount Applied</p>
-        <p style="margin: 0.5rem 0 0 0; font-size: 1.8rem; font-weight: 800;">-₹{discount_amount:,.0f}</p>
-        <p style="margin: 0.3rem 0 0 0; font-size: 0.8rem; opacity: 0.85;">{f"({repeat_discount}%)" if repeat_discount > 0 else "None"}</p>
+    # Scenarios are stored as overrides of the current quote, not widget copies
+    if 'scenarios' not in st.session_state:
+        st.session_state.scenarios = []
+
+    with st.container():
+        st.markdown('<div class="model-section">', unsafe_allow_html=True)
+
+        add_col1, add_col2 = st.columns([3, 1])
+        with add_col1:
+            preset = st.selectbox("Preset Scenario", list(SCENARIO_PRESETS), key="scenario_preset")
+        with add_col2:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("➕ Add Preset", key="scenario_add_preset", use_container_width=True):
+                add_scenario(preset, SCENARIO_PRESETS[preset])
+
+        with st.expander("🛠️ Build a Custom Scenario", expanded=False):
+            # Keyed widgets ignore value= after their first render: reseed them
+            # from the current quote whenever its base values change
+            scenario_base = {
+                'scenario_tier': quote_inputs.tier_level,
+                'scenario_it': float(quote_inputs.it_capacity),
+                'scenario_competitive': bool(quote_inputs.competitive_pricing),
+                'scenario_reduction': int(quote_inputs.hour_reduction),
+                'scenario_margin': int(quote_inputs.custom_margin),
+            }
+            if st.session_state.get('scenario_base') != scenario_base:
+                st.session_state.update(scenario_base)
+                st.session_state.scenario_base = scenario_base
+
+            custom_col1, custom_col2, custom_col3 = st.columns(3)
+            with custom_col1:
+                custom_name = st.text_input("Scenario Name", value="Custom Scenario", key="scenario_name")
+                custom_tier = st.selectbox("Tier Level", list(TIER_LEVELS), key="scenario_tier")
+            with custom_col2:
+                custom_it = st.number_input("IT Capacity (MW)", min_value=0.0, max_value=200.0,
+                                            step=0.1, key="scenario_it")
+                custom_competitive = st.checkbox("Competitive Pricing", key="scenario_competitive")
+            with custom_col3:
+                custom_reduction = st.slider("ETAP Hour Reduction (%)", 0, 50, key="scenario_reduction")
+                custom_margin = st.slider("Project Margin (%)", 0, 50, key="scenario_margin")
+
+            if st.button("➕ Add Custom Scenario", key="scenario_add_custom"):
+                candidate = {
+                    'tier_level': custom_tier,
+                    'it_capacity': custom_it,
+                    'competitive_pricing': custom_competitive,
+                    'hour_reduction': custom_reduction,
+                    'custom_margin': custom_margin,
+                }
+                # Keep only what differs from the current quote
+                add_scenario(custom_name.strip() or "Custom Scenario", {
+                    name: value for name, value in candidate.items() if value != getattr(quote_inputs, name)
+                })
+
+        scenarios = st.session_state.scenarios
+        if not scenarios:
+            st.info("Add preset or custom scenarios to compare them with the current quote.")
+            st.markdown('</div>', unsafe_allow_html=True)
+            return
+
+        batch = price_scenarios(quote_inputs, [scenario['overrides'] for scenario in scenarios],
+                                active_rate_card())
+        names = ["Current Quote"] + [scenario['name'] for scenario in scenarios]
+
+        metrics = {
+            'Estimated Buses': batch['estimated_buses'],
+            'IT / Mech / House Buses': [
+                f"{it} / {mech} / {house}" for it, mech, house in
+                zip(batch['it_buses_est'], batch['mech_buses_est'], batch['house_buses_est'])
+            ],
+            'Total Manhours': batch['total_manhours'].round(1),
+        }
+        for study_key, study_name in STUDY_NAMES.items():
+            study_cost = batch['study_labor_costs'][study_key] + batch['study_report_costs'][study_key]
+            if study_cost.any():
+                metrics[f"{study_name} (₹)"] = study_cost.round(0)
+        metrics['Total Labor Cost (₹)'] = batch['total_labor_cost'].round(0)
+        metrics['Total Report Cost (₹)'] = batch['total_report_cost'].round(0)
+        metrics['Final Total Cost (₹)'] = batch['final_total_cost'].round(0)
+
+        comparison = pd.DataFrame(metrics, index=names).T
+        st.dataframe(comparison.astype(str), use_container_width=True)
+
+        final_costs = batch['final_total_cost']
+        deltas = final_costs[1:] - final_costs[0]
+        st.dataframe(pd.DataFrame({
+            'Scenario': names[1:],
+            'Changes': [
+                ', '.join(f"{name}={value}" for name, value in scenario['overrides'].items()) or "None"
+                for scenario in scenarios
+            ],
+            'Δ Buses': batch['estimated_buses'][1:] - batch['estimated_buses'][0],
+            'Δ Manhours': (batch['total_manhours'][1:] - batch['total_manhours'][0]).round(1),
+            'Δ Final Cost (₹)': deltas.round(0),
+            'Δ Final Cost (%)': (deltas / final_costs[0] * 100).round(1) if final_costs[0] else np.nan,
+        }), use_container_width=True, hide_index=True)
+
+        scenario_fig = go.Figure(go.Bar(
+            x=names,
+            y=final_costs,
+            marker_color=['#3b82f6'] + ['#06b6d4'] * len(scenarios),
+            text=[f"₹{cost:,.0f}" for cost in final_costs],
+            textposition='outside'
+        ))
+        scenario_fig.update_layout(
+            template='plotly_dark',
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            yaxis_title='Final Total Cost (₹)',
+            height=380,
+            margin=dict(l=20, r=20, t=30, b=20)
+        )
+        st.plotly_chart(scenario_fig, use_container_width=True)
+
+        remove_col1, remove_col2 = st.columns([3, 1])
+        with remove_col1:
+            to_remove = st.multiselect("Remove Scenarios", [scenario['name'] for scenario in scenarios],
+                                       key="scenario_remove")
+        with remove_col2:
+            st.markdown("<br>", unsafe_allow_html=True)
+            st.button("🗑️ Remove", key="scenario_remove_button", use_container_width=True,
+                      disabled=not to_remove, on_click=remove_scenarios)
+
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
+def build_quotes_zip(quote_ids, prepared_by):
+    """Zip of saved quotes (summaries + comparison sheet), streamed from the store."""
+    quotes = ((f"Q{meta['id']}_{saved_inputs.project_name}", saved_inputs, saved_quote)
+              for saved_inputs, saved_quote, meta in shared_quote_store().iter_quotes(quote_ids))
+    return quotes_zip_bytes(quotes, prepared_by)
+
+
+def saved_quote_key(quote_inputs, card_version):
+    """Identity of a saved quote: rate card plus every input, names and descriptions included."""
+    return f"{card_version}:{quote_input_hash(quote_inputs, exclude=())}"
+
+
+def save_current_quote():
+    """Save the priced quote to the shared history (button callback)."""
+    quote_inputs, quote = priced_quote()
+    card_version = rate_card_version(active_rate_card())
+    st.session_state.last_saved_quote_id = shared_quote_store().save(
+        quote_inputs, quote,
+        username=st.session_state.username,
+        rate_card_version=card_version,
+        input_hash=quote_input_hash(quote_inputs)
+    )
+    st.session_state.last_saved_quote_key = saved_quote_key(quote_inputs, card_version)
+
+
+def reopen_quote():
+    """Load the picked saved quote into the input widgets and re-price it (button callback)."""
+    saved = shared_quote_store().load(st.session_state.history_reopen)
+    if saved is None:
+        return
+    saved_inputs, saved_quote, meta = saved
+    st.session_state.update(input_widget_values(saved_inputs))
+    quote_inputs, quote = price_current_quote()
+
+    card_version = rate_card_version(active_rate_card())
+    if saved_quote_key(quote_inputs, card_version) == saved_quote_key(saved_inputs, meta['rate_card_version']):
+        st.session_state.last_saved_quote_id = meta['id']
+        st.session_state.last_saved_quote_key = saved_quote_key(quote_inputs, card_version)
+    st.session_state.reopened_quote = {
+        'id': meta['id'],
+        'key': saved_quote_key(quote_inputs, card_version),
+        'saved_cost': saved_quote.final_total_cost,
+        'imported_buses': saved_inputs.bus_method == IMPORTED_BUS_METHOD,
+    }
+    # Every input panel and result section changes: rerun the whole page
+    st.rerun()
+
+
+@st.fragment(key="results_quote_history")
+def render_quote_history():
+    """Save the current quote; filter, list and reopen saved quotes."""
+    st.markdown("""
+    <div class="section-header">
+        <h2>📚 Quote History</h2>
     </div>
     """, unsafe_allow_html=True)
 
-st.markdown("<hr style='margin: 2rem 0; border: none; border-top: 2px solid rgba(255,255,255,0.3);'>", unsafe_allow_html=True)
+    quote_inputs, quote = priced_quote()
+    current_key = saved_quote_key(quote_inputs, rate_card_version(active_rate_card()))
+    is_saved = st.session_state.get('last_saved_quote_key') == current_key
+
+    save_col1, save_col2 = st.columns([1, 3])
+    with save_col1:
+        st.button("💾 Save Quote", key="save_quote", disabled=is_saved, use_container_width=True,
+                  on_click=save_current_quote)
+    with save_col2:
+        if is_saved:
+            st.caption(f"This quote is saved as #{st.session_state.last_saved_quote_id}.")
+        else:
+            st.caption("This quote has unsaved changes - press Save Quote to add it to the history.")
 
-margin_col1, margin_col2 = st.columns(2)
+    reopened = st.session_state.get('reopened_quote')
+    if reopened and reopened['key'] == current_key:
+        st.info(f"📂 Quote #{reopened['id']} loaded into the calculator above.")
+        if reopened['imported_buses']:
+            st.warning("⚠️ It was priced from an imported bus list - upload the bus list again to reproduce it.")
+        elif abs(quote.final_total_cost - reopened['saved_cost']) >= 0.5:
+            st.warning(f"⚠️ Re-priced at ₹{quote.final_total_cost:,.0f} (saved at ₹{reopened['saved_cost']:,.0f}).")
 
-with margin_col1:
-    st.markdown(f"""
-    <div style="text-align: center;">
-        <p style="margin: 0; font-size: 1rem; opacity: 0.9;">Subtotal After Adjustments</p>
-        <p style="margin: 0.5rem 0 0 0; font-size: 2rem; font-weight: 800;">₹{subtotal_after_discount:,.0f}</p>
+    if not st.toggle("Show Saved Quotes", key="show_quote_history"):
+        return
+
+    store = shared_quote_store()
+
+    search_text = st.text_input(
+        "🔍 Search Saved Quotes",
+        placeholder="Project name, scope or custom cost description, e.g. harmonics retrofit",
+        key="history_search"
+    )
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        user_filter = st.selectbox("Prepared By", ["All Users"] + store.usernames(), key="history_user")
+        tier_filter = st.selectbox("Tier", ["All Tiers"] + list(TIER_LEVELS), key="history_tier")
+    with col2:
+        date_range = st.date_input("Quoted Between", value=(), key="history_dates")
+    with col3:
+        it_min = st.number_input("Min IT Capacity (MW)", min_value=0.0, max_value=200.0, value=0.0, step=1.0,
+                                 key="history_it_min")
+        it_max = st.number_input("Max IT Capacity (MW, 0 = no limit)", min_value=0.0, max_value=200.0, value=0.0,
+                                 step=1.0, key="history_it_max")
+    with col4:
+        cost_min = st.number_input("Min Final Cost (₹)", min_value=0, value=0, step=100000, key="history_cost_min")
+        cost_max = st.number_input("Max Final Cost (₹, 0 = no limit)", min_value=0, value=0, step=100000,
+                                   key="history_cost_max")
+
+    filters = dict(
+        username=None if user_filter == "All Users" else user_filter,
+        tier=None if tier_filter == "All Tiers" else tier_filter,
+        date_from=date_range[0] if len(date_range) > 0 else None,
+        date_to=date_range[1] if len(date_range) > 1 else None,
+        it_min=it_min or None,
+        it_max=it_max or None,
+        cost_min=cost_min or None,
+        cost_max=cost_max or None,
+    )
+    if search_text.strip():
+        history = store.search(search_text, limit=200, **filters)
+    else:
+        history = store.list_quotes(limit=500, **filters)
+
+    if history.empty:
+        st.info("No saved quotes match these filters.")
+        return
+
+    if search_text.strip():
+        st.caption(f"Showing the {len(history):,} best matches for \"{search_text.strip()}\" "
+                   f"of {store.count():,} saved quotes.")
+    else:
+        st.caption(f"Showing the {len(history):,} most recent matching quotes of {store.count():,} saved.")
+    history_table = pd.DataFrame({
+        'Quote #': history['id'],
+        'Saved': history['created_at'].str.replace('T', ' '),
+        'Prepared By': history['username'],
+        'Project': history['project_name'],
+        'Tier': history['tier_level'],
+        'IT (MW)': history['it_capacity'],
+        'Buses': history['estimated_buses'],
+        'Manhours': history['total_manhours'].round(1),
+        'Final Cost (₹)': history['final_total_cost'].round(0),
+    })
+    if search_text.strip():
+        history_table['Relevance'] = history['relevance'].round(2)
+    st.dataframe(history_table, use_container_width=True, hide_index=True, height=300)
+
+    labels = {
+        row.id: f"#{row.id} · {row.project_name} · {row.tier_level} · ₹{row.final_total_cost:,.0f} · {row.created_at.replace('T', ' ')}"
+        for row in history.itertuples()
+    }
+
+    # Keep earlier picks selectable after the filters change
+    picked_elsewhere = [i for i in st.session_state.get('history_zip_ids', []) if i not in labels]
+    zip_ids = st.multiselect(
+        "Quotes for Client Pack",
+        list(labels) + picked_elsewhere,
+        format_func=lambda i: labels.get(i, f"#{i}"),
+        placeholder="Select quotes to bundle into one zip",
+        key="history_zip_ids"
+    )
+    if zip_ids:
+        st.download_button(
+            label=f"📦 Download {len(zip_ids)} Quotes + Comparison Sheet (Zip)",
+            data=functools.partial(build_quotes_zip, tuple(zip_ids),
+                                   f"{st.session_state.username} ({st.session_state.user_role})"),
+            file_name=f"PSS_Quotes_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+            mime="application/zip",
+            use_container_width=True,
+            key="history_zip_download"
+        )
+
+    reopen_col1, reopen_col2 = st.columns([3, 1])
+    with reopen_col1:
+        quote_id = st.selectbox("Reopen Quote", list(labels), format_func=labels.get, key="history_reopen")
+    with reopen_col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.button("📂 Load into Calculator", key="history_reopen_button", use_container_width=True,
+                  on_click=reopen_quote)
+    saved = store.load(quote_id)
+    if saved is None:
+        return
+    saved_inputs, saved_quote, meta = saved
+
+    current_version = rate_card_version(active_rate_card())
+    if meta['rate_card_version'] != current_version:
+        st.warning(f"⚠️ Priced with rate card {meta['rate_card_version']}; "
+                   f"the current rate card is {current_version}.")
+
+    col_a, col_b, col_c = st.columns(3)
+    with col_a:
+        st.metric("Final Cost", f"₹{saved_quote.final_total_cost:,.0f}")
+    with col_b:
+        st.metric("Total Manhours", f"{saved_quote.total_manhours:,.1f}")
+    with col_c:
+        st.metric("Estimated Buses", f"{saved_quote.estimated_buses}")
+
+    st.dataframe(summary_table(saved_inputs, saved_quote, prepared_by=meta['username'] or '').astype(str),
+                 use_container_width=True, hide_index=True)
+    export_download_buttons(
+        export_key=f"{meta['rate_card_version']}:{quote_input_hash(saved_inputs, exclude=())}",
+        quote_inputs=saved_inputs,
+        quote=saved_quote,
+        prepared_by=meta['username'] or '',
+        file_stem=f"PSS_Cost_Estimate_{saved_inputs.project_name}_Q{meta['id']}",
+        key_prefix="history_export"
+    )
+
+
+@st.fragment(key="results_scope_summary")
+def render_scope_summary():
+    """Scope of work as entered."""
+    quote_inputs, _ = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>📝 Project Scope Summary</h2>
     </div>
     """, unsafe_allow_html=True)
 
-with margin_col2:
-    st.markdown(f"""
-    <div style="text-align: center;">
-        <p style="margin: 0; font-size: 1rem; opacity: 0.9;">Project Margins ({custom_margin}%)</p>
-        <p style="margin: 0.5rem 0 0 0; font-size: 2rem; font-weight: 800;">₹{margin_amount:,.0f}</p>
+    st.markdown('<div class="scope-section">', unsafe_allow_html=True)
+    st.markdown(quote_inputs.scope_description)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_export(export_key, fmt, prepared_by, _quote_inputs, _quote):
+    """Export file bytes, cached on the full input hash + rate card and format."""
+    return export_bytes(fmt, _quote_inputs, _quote, prepared_by)
+
+
+def export_download_buttons(export_key, quote_inputs, quote, prepared_by, file_stem, key_prefix):
+    """
+    One download button per export format. Files are only built when a
+    button is clicked (deferred callable), then cached per input hash.
+    """
+    columns = st.columns(len(EXPORT_FORMATS))
+    for column, (fmt, (label, extension, mime, dependency)) in zip(columns, EXPORT_FORMATS.items()):
+        with column:
+            available = export_available(fmt)
+            st.download_button(
+                label=f"📥 Download ({label})",
+                data=functools.partial(cached_export, export_key, fmt, prepared_by, quote_inputs, quote),
+                file_name=f"{file_stem}.{extension}",
+                mime=mime,
+                disabled=not available,
+                help=None if available else f"Install {dependency} to enable {label} export",
+                use_container_width=True,
+                key=f"{key_prefix}_{fmt}"
+            )
+
+
+@st.fragment(key="results_export")
+def render_export():
+    """Project summary downloads (CSV, Excel, Parquet), generated on demand."""
+    quote_inputs, quote = priced_quote()
+    st.markdown("""
+    <div class="section-header">
+        <h2>📊 Export Project Summary</h2>
     </div>
     """, unsafe_allow_html=True)
 
-st.markdown("<hr style='margin: 2rem 0; border: none; border-top: 3px solid rgba(255,255,255,0.4);'>", unsafe_allow_html=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    export_download_buttons(
+        export_key=f"{rate_card_version(active_rate_card())}:{quote_input_hash(quote_inputs, exclude=())}",
+        quote_inputs=quote_inputs,
+        quote=quote,
+        prepared_by=f"{st.session_state.username} ({st.session_state.user_role})",
+        file_stem=f"PSS_Cost_Estimate_{quote_inputs.project_name}_{timestamp}",
+        key_prefix="export"
+    )
+
+
+rerun_timer.section("results.engineering")
+render_engineering_results()
+rerun_timer.section("results.study_cards")
+render_study_breakdown()
+rerun_timer.section("results.cost_summary")
+render_cost_summary()
+rerun_timer.section("results.final_quotation")
+render_final_quotation()
+rerun_timer.section("results.monte_carlo")
+render_monte_carlo()
+rerun_timer.section("results.sensitivity")
+render_sensitivity()
+rerun_timer.section("results.parameter_sweep")
+render_parameter_sweep()
+rerun_timer.section("results.capacity_thresholds")
+render_capacity_thresholds()
+rerun_timer.section("results.goal_seek")
+render_goal_seek()
+rerun_timer.section("results.scenarios")
+render_scenarios()
+rerun_timer.section("results.scope_summary")
+render_scope_summary()
+rerun_timer.section("results.export")
+render_export()
+rerun_timer.section("results.quote_history")
+render_quote_history()
+
+
+@st.cache_data(max_entries=4, show_spinner="Fitting rate card to historical actuals...")
+def cached_calibration_fit(file_hash, card_version, ridge, _history_file, _rate_card):
+    """Rate card fit to a history upload, cached on the file, the prior card and the ridge weight."""
+    _history_file.seek(0)
+    return fit_rate_card(read_history(_history_file), _rate_card, ridge=ridge)
+
+
+def render_rate_card_admin():
+    """Fit the hour tables to historical actuals, publish cards and choose the active one."""
+    store = shared_quote_store()
+    current = active_rate_card()
+    default_note = " (built-in default)" if current is DEFAULT_RATE_CARD else ""
+    st.caption(f"Active rate card: {rate_card_version(current)}{default_note}")
+
+    history_file = st.file_uploader(
+        "Historical Projects (CSV or Parquet)",
+        type=['csv', 'parquet'],
+        key="calibration_history",
+        help="One row per completed project: the quote inputs (as for batch pricing) plus the booked hours per "
+             "study (actual_load_flow_hours, actual_short_circuit_hours, ...) and optionally actual_buses."
+    )
+    ridge = st.slider(
+        "Weight of Current Rate Card (projects)", 0.0, 50.0, DEFAULT_RIDGE, 1.0, key="calibration_ridge",
+        help="Fitted factors are pulled towards the active card as if it were this many extra projects."
+    )
+    if history_file is not None:
+        try:
+            fit = cached_calibration_fit(file_sha256(history_file), rate_card_version(current), ridge,
+                                         history_file, current)
+        except ValueError as exc:
+            st.error(f"❌ Could not fit the history: {exc}")
+        else:
+            mape_before = fit.projects['residual_before'].abs().mean()
+            mape_after = fit.projects['residual_after'].abs().mean()
+            fit_col1, fit_col2, fit_col3, fit_col4 = st.columns(4)
+            with fit_col1:
+                st.metric("Projects", f"{len(fit.projects):,}")
+            with fit_col2:
+                st.metric("Hours MAPE", f"{mape_after:.1%}", delta=f"{mape_after - mape_before:+.1%}",
+                          delta_color="inverse")
+            with fit_col3:
+                st.metric("Bus Calibration", f"{fit.rate_card.bus_calibration:.2f}",
+                          delta=f"{fit.rate_card.bus_calibration - current.bus_calibration:+.2f}", delta_color="off")
+            with fit_col4:
+                st.metric("Fitted Version", fit.version)
+
+            percent = '{:.1%}'
+            st.dataframe(fit.studies.style.format({column: percent for column in fit.studies.columns[2:]}),
+                         hide_index=True, use_container_width=True)
+            st.dataframe(fit.tiers.style.format({column: percent for column in fit.tiers.columns[2:]}),
+                         hide_index=True, use_container_width=True)
+            st.dataframe(pd.DataFrame({
+                'Study': [STUDY_NAMES[key] for key in fit.rate_card.base_hours_per_bus],
+                'Base Hours/Bus (Current)': list(current.base_hours_per_bus.values()),
+                'Base Hours/Bus (Fitted)': list(fit.rate_card.base_hours_per_bus.values()),
+            }).round(3), hide_index=True, use_container_width=True)
+
+            note = st.text_input("Publish Note", key="calibration_note", placeholder="e.g. FY26 actuals")
+            publish_col, download_col = st.columns(2)
+            with publish_col:
+                if st.button("📤 Publish & Activate Fitted Card", key="publish_fitted_card", use_container_width=True):
+                    store.publish_rate_card(fit.rate_card, username=st.session_state.username, note=note)
+                    st.rerun()
+            with download_col:
+                st.download_button(
+                    label="📥 Download Fitted Card (JSON)",
+                    data=rate_card_to_json(fit.rate_card),
+                    file_name=f"PSS_Rate_Card_{fit.version}.json",
+                    mime="application/json",
+                    use_container_width=True
+                )
 
-st.markdown(f"""
-<div style="text-align: center; margin-top: 2rem;">
-    <p style="margin: 0; font-size: 1.3rem; font-weight: 600; opacity: 0.95;">FINAL PROJECT COST</p>
-    <p style="margin: 1rem 0 0 0; font-size: 3.5rem; font-weight: 900; text-shadow: 0 4px 10px rgba(0,0,0,0.3);">₹{final_total_cost:,.0f}</p>
-    <p style="margin: 0.5rem 0 0 0; font-size: 0.95rem; opacity: 0.9;">Inclusive of all charges, margins, and adjustments</p>
-</div>
-""", unsafe_allow_html=True)
+    cards = store.list_rate_cards()
+    if not cards.empty:
+        st.dataframe(cards, hide_index=True, use_container_width=True)
+    versions = [None] + cards['version'].tolist()
+    active_version = None if current is DEFAULT_RATE_CARD else rate_card_version(current)
+    activate_col, json_col = st.columns(2)
+    with activate_col:
+        choice = st.selectbox("Active Rate Card", versions, index=versions.index(active_version),
+                              format_func=lambda version: "Built-in default" if version is None else version,
+                              key="active_rate_card_choice")
+        if st.button("✅ Activate", key="activate_rate_card", disabled=choice == active_version):
+            store.activate_rate_card(choice)
+            st.rerun()
+    with json_col:
+        card_file = st.file_uploader("Publish Rate Card JSON", type=['json'], key="rate_card_json")
+        if card_file is not None and st.button("📤 Publish & Activate JSON Card", key="publish_json_card"):
+            try:
+                uploaded_card = rate_card_from_json(card_file.getvalue().decode('utf-8'))
+            except (ValueError, TypeError) as exc:
+                st.error(f"❌ Not a rate card: {exc}")
+            else:
+                store.publish_rate_card(uploaded_card, username=st.session_state.username, note=card_file.name)
+                st.rerun()
 
-st.markdown('</div>', unsafe_allow_html=True)
 
-st.markdown("""
-<div class="section-header">
-    <h2>📝 Project Scope Summary</h2>
-</div>
-""", unsafe_allow_html=True)
+def render_admin_tools():
+    """Shared cache counters, rerun timings and rate card calibration, visible to administrators only."""
+    with st.expander("🛠️ Administrator Tools", expanded=False):
+        stats = shared_quote_cache().stats()
+        st.markdown("**Shared Quote Cache**")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Entries", f"{stats['entries']:,} / {stats['max_entries']:,}")
+        with col2:
+            st.metric("Hits", f"{stats['hits']:,}")
+        with col3:
+            st.metric("Misses", f"{stats['misses']:,}")
+        with col4:
+            st.metric("Hit Rate", f"{stats['hit_rate']:.1%}")
+        st.caption(f"Rate card version: {stats['rate_card_version']} · Evictions: {stats['evictions']:,}")
+        if st.button("🗑️ Clear Shared Cache", key="clear_quote_cache"):
+            shared_quote_cache().clear()
+            st.rerun()
 
-st.markdown('<div class="scope-section">', unsafe_allow_html=True)
-st.markdown(scope_description)
-st.markdown('</div>', unsafe_allow_html=True)
+        st.markdown("---")
+        st.markdown("**Rerun Timing by Section**")
+        timing_store = shared_timing_store()
+        scope = st.radio("Scope", ["This Session", "All Sessions"], horizontal=True, key="timing_scope")
+        session = timing_session if scope == "This Session" else None
 
-st.markdown("""
-<div class="section-header">
-    <h2>📊 Export Project Summary</h2>
-</div>
-""", unsafe_allow_html=True)
-
-summary_data = {
-    'Parameter': [
-        'Project Name', 'Tier Level', 'IT Capacity (MW)', 'Mechanical Load (MW)',
-        'House Load (MW)', 'Estimated Buses', 'Competitive Pricing', 'IT Buses', 'Mech Buses', 'House Buses',
-        'Total Manhours', 'Delivery Type', 'Customer Type', 'Report Complexity', '',
-        'Labor Cost', 'Report Cost', 'Site Visit Cost', 'Meeting Cost',
-        'Label & Stickering Cost', 'Custom Services Cost', '',
-        'Subtotal', 'Urgency Charge', 'Discount', 'Subtotal After Discount',
-        'Project Margins', 'FINAL TOTAL COST', '', 'Prepared By'
-    ],
-    'Value': [
-        project_name, tier_level, it_capacity, mechanical_load,
-        house_load, estimated_buses, 'Yes' if competitive_pricing else 'No', it_buses_est, mech_buses_est, house_buses_est,
-        f"{total_manhours:.1f}", delivery_type, customer_type, report_complexity, '',
-        f"₹{total_labor_cost:,.0f}", f"₹{total_report_cost:,.0f}", 
-        f"₹{total_site_visit_cost:,.0f}", f"₹{total_meeting_cost:,.0f}",
-        f"₹{total_label_cost + total_stickering_cost:,.0f}", 
-        f"₹{custom_charges_cost + custom_cost_1_amount + custom_cost_2_amount:,.0f}", '',
-        f"₹{subtotal_before_adjustments:,.0f}", f"₹{urgency_cost:,.0f}", 
-        f"-₹{discount_amount:,.0f}", f"₹{subtotal_after_discount:,.0f}",
-        f"₹{margin_amount:,.0f} ({custom_margin}%)", f"₹{final_total_cost:,.0f}", '',
-        f"{st.session_state.username} ({st.session_state.user_role})"
-    ]
-}
+        timing_summary = timing_store.summary(session)
+        if timing_summary.empty:
+            st.info("No timing samples recorded yet.")
+        else:
+            st.dataframe(
+                timing_summary.style.format({
+                    'p50 (ms)': '{:.2f}', 'p95 (ms)': '{:.2f}',
+                    'Max (ms)': '{:.2f}', 'Total (ms)': '{:,.1f}'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        st.caption(f"{len(timing_store):,} samples held in memory (oldest dropped first). "
+                   f"Engine stages ({', '.join(stage.name for stage in PRICING_STAGES)}) are only "
+                   "timed when they are recomputed: a quote already in the shared cache is not priced, "
+                   "and stages memoized from this session's previous quote are reused untimed.")
+
+        col_dump, col_clear = st.columns(2)
+        with col_dump:
+            st.download_button(
+                label="📥 Download Raw Timing Samples (CSV)",
+                data=functools.partial(timing_store.samples_csv, session),
+                file_name=f"PSS_Timing_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+        with col_clear:
+            if st.button("🗑️ Clear Timing Samples", key="clear_timing_samples", use_container_width=True):
+                timing_store.clear()
+                st.rerun()
 
-df_summary = pd.DataFrame(summary_data)
+        st.markdown("---")
+        st.markdown("**Rate Card Calibration**")
+        render_rate_card_admin()
 
-csv = df_summary.to_csv(index=False)
-timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
-st.download_button(
-    label="📥 Download Project Summary (CSV)",
-    data=csv,
-    file_name=f"PSS_Cost_Estimate_{project_name}_{timestamp}.csv",
-    mime="text/csv",
-    use_container_width=True
-)
+if st.session_state.user_role == 'Administrator':
+    rerun_timer.section("admin_tools")
+    render_admin_tools()
 
+rerun_timer.section("footer")
 st.markdown(f"""
 <div style="text-align: center; margin-top: 4rem; padding: 2rem; 
             background: rgba(30, 41, 59, 0.5); border-radius: 12px; 
@@ -1760,3 +2419,5 @@ st.markdown(f"""
     </p>
 </div>
 """, unsafe_allow_html=True)
+
+rerun_timer.finish()
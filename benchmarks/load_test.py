@@ -0,0 +1,308 @@
+"""
+Offline load test: many estimator sessions against one app process.
+
+Each simulated session gets its own Streamlit AppTest instance (its own
+session state) but shares the process with every other session, as browser
+sessions share one `streamlit run` server: the same cache_resource
+singletons (quote cache, quote store, timing store) and the same memory.
+Sessions log in through the login form (and so through authenticate_user),
+then apply a random sequence of realistic widget edits with think time
+between them, timing every rerun.
+
+AppTest installs a process-global mock runtime for each run, so reruns are
+executed one at a time. That matches how a real server behaves under load
+anyway: script threads are CPU-bound and share one GIL, so concurrent reruns
+queue behind each other. Each rerun's latency is split into time spent
+waiting for its turn (queue) and executing the script (run).
+
+Reports latency percentiles, throughput, and the process's CPU time and
+resident memory, both in total and per session. Everything uses the standard
+library and the installed Streamlit; no network access is needed. Quotes are
+saved to a throwaway database unless --db is given.
+
+Usage:
+    python benchmarks/load_test.py --sessions 20 --edits 15
+    python benchmarks/load_test.py --sessions 50 --think 0 --json load.json
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+APP_SCRIPT = os.path.join(REPO_ROOT, "PSS-Cost-Estimator-Unified-v5.0.py")
+
+# Accounts from the page's USER_CREDENTIALS, cycled across sessions
+LOGINS = (('Sales1pg', 'sales1'), ('Sales2SK', 'sales2'), ('admin', 'admin123'))
+
+# (widget type, widget key, value generator) - the inputs sales engineers
+# actually move while shaping a quote; values stay inside each widget's limits
+EDITS = (
+    ('number_input', "it_capacity", lambda rng: round(rng.uniform(1.0, 200.0), 1)),
+    ('number_input', "mechanical_load", lambda rng: round(rng.uniform(0.5, 100.0), 1)),
+    ('number_input', "house_load", lambda rng: round(rng.uniform(0.2, 50.0), 1)),
+    ('number_input', "client_meetings", lambda rng: rng.randint(0, 10)),
+    ('number_input', "custom_margin", lambda rng: rng.randint(5, 30)),
+    ('selectbox', "tier_level", lambda rng: rng.choice(["Tier I", "Tier II", "Tier III", "Tier IV"])),
+    ('selectbox', "delivery_type", lambda rng: rng.choice(["Standard", "Urgent"])),
+    ('selectbox', "customer_type", lambda rng: rng.choice(["New Customer", "Repeat Customer"])),
+    ('selectbox', "report_complexity", lambda rng: rng.choice(["Basic", "Standard", "Premium"])),
+    ('slider', "pue_value", lambda rng: round(rng.uniform(1.2, 1.8), 2)),
+    ('checkbox', "harmonics_cb", lambda rng: rng.random() < 0.5),
+    ('checkbox', "transient_cb", lambda rng: rng.random() < 0.5),
+    ('checkbox', "af_labels_enabled", lambda rng: rng.random() < 0.5),
+)
+
+
+# AppTest swaps a process-global Runtime in and out around every run
+_RUN_LOCK = threading.Lock()
+
+
+def rss_bytes():
+    """Current resident set size of this process (Linux /proc)."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile (q in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def find_widget(at, kind, key):
+    """
+    The widget with `key`, or None when the last run did not render it.
+
+    After an input edit only that panel's fragment and the result fragments
+    rerun, and AppTest keeps just the elements of the last run.
+    """
+    for widget in getattr(at, kind):
+        if widget.key == key:
+            return widget
+    return None
+
+
+class SimulatedSession:
+    """One user: log in, then edit inputs with think time, timing each rerun."""
+
+    def __init__(self, index, edits, think, seed, timeout):
+        self.index = index
+        self.edits = edits
+        self.think = think
+        self.rng = random.Random(seed + index)
+        self.timeout = timeout
+        self.login = LOGINS[index % len(LOGINS)]
+        self.latencies = []      # (phase, queue seconds, run seconds)
+        self.errors = []
+
+    def _rerun(self, at, phase):
+        queued = time.perf_counter()
+        with _RUN_LOCK:
+            start = time.perf_counter()
+            at.run()
+            end = time.perf_counter()
+        self.latencies.append((phase, start - queued, end - start))
+        if at.exception:
+            self.errors.append(f"{phase}: {at.exception[0].message}")
+            return False
+        return True
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+
+        try:
+            at = AppTest.from_file(APP_SCRIPT, default_timeout=self.timeout)
+            if not self._rerun(at, 'first_load'):
+                return
+
+            username, password = self.login
+            at.text_input(key="login_username").input(username)
+            at.text_input(key="login_password").input(password)
+            at.button(key="login_button").click()
+            if not self._rerun(at, 'login'):
+                return
+            if not at.session_state.authenticated:
+                self.errors.append(f"login: {username} was not authenticated")
+                return
+
+            for _ in range(self.edits):
+                if self.think:
+                    time.sleep(self.rng.expovariate(1 / self.think))
+                kind, key, value = self.rng.choice(EDITS)
+                widget = find_widget(at, kind, key)
+                if widget is not None:
+                    widget.set_value(value(self.rng))
+                else:
+                    # Not in the last fragment run: send the new value with a
+                    # full rerun, as the browser would for that widget
+                    at.session_state[key] = value(self.rng)
+                if not self._rerun(at, 'edit'):
+                    return
+        except Exception as exc:  # keep the other sessions running
+            self.errors.append(f"{type(exc).__name__}: {exc}")
+
+
+def latency_stats(seconds):
+    if not seconds:
+        return {'count': 0}
+    ms = [s * 1000 for s in seconds]
+    return {
+        'count': len(ms),
+        'mean_ms': statistics.fmean(ms),
+        'p50_ms': percentile(ms, 50),
+        'p90_ms': percentile(ms, 90),
+        'p95_ms': percentile(ms, 95),
+        'p99_ms': percentile(ms, 99),
+        'max_ms': max(ms),
+    }
+
+
+def run_load_test(sessions, edits, think=0.5, ramp=0.0, seed=0, timeout=120):
+    """
+    Run `sessions` simulated users concurrently, starting them `ramp`
+    seconds apart.
+
+    Returns:
+        dict: Latency statistics per phase and overall, throughput, CPU and
+        memory totals and per-session figures, and any session errors
+    """
+    # Import the heavy modules up front so the memory baseline excludes them
+    from streamlit.testing.v1 import AppTest  # noqa: F401
+    import pss_engine  # noqa: F401
+
+    warmup = SimulatedSession(-1, 0, 0, seed, timeout)
+    warmup.run()
+    if warmup.errors:
+        raise RuntimeError(f"Warm-up session failed: {warmup.errors[0]}")
+
+    rss_before = rss_bytes()
+    cpu_before = cpu_seconds()
+    wall_start = time.perf_counter()
+
+    simulated = [SimulatedSession(i, edits, think, seed, timeout) for i in range(sessions)]
+    threads = [threading.Thread(target=session.run, name=f"session-{session.index}") for session in simulated]
+    for thread in threads:
+        thread.start()
+        if ramp:
+            time.sleep(ramp)
+    for thread in threads:
+        thread.join()
+
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_before
+    rss_after = rss_bytes()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    samples = [sample for session in simulated for sample in session.latencies]
+    phases = {}
+    for phase, queue, run in samples:
+        phases.setdefault(phase, []).append(queue + run)
+
+    return {
+        'sessions': sessions,
+        'edits_per_session': edits,
+        'think_s': think,
+        'ramp_s': ramp,
+        'wall_s': wall,
+        'reruns': len(samples),
+        'reruns_per_s': len(samples) / wall if wall else 0.0,
+        'latency': latency_stats([queue + run for _, queue, run in samples]),
+        'queue': latency_stats([queue for _, queue, _ in samples]),
+        'run': latency_stats([run for _, _, run in samples]),
+        'latency_by_phase': {phase: latency_stats(values) for phase, values in sorted(phases.items())},
+        'cpu_s': cpu,
+        'cpu_utilisation': cpu / wall if wall else 0.0,
+        'cpu_s_per_session': cpu / sessions if sessions else 0.0,
+        'rss_before_mb': rss_before / 2**20,
+        'rss_after_mb': rss_after / 2**20,
+        'peak_rss_mb': peak_rss / 2**20,
+        'rss_mb_per_session': (rss_after - rss_before) / 2**20 / sessions if sessions else 0.0,
+        'errors': [f"session {session.index}: {error}" for session in simulated for error in session.errors],
+    }
+
+
+def print_report(report):
+    out = sys.stderr
+    print(f"{report['sessions']} sessions x {report['edits_per_session']} edits, "
+          f"think {report['think_s']}s, ramp {report['ramp_s']}s", file=out)
+    print(f"{report['reruns']} reruns in {report['wall_s']:.1f}s ({report['reruns_per_s']:.1f}/s)", file=out)
+    print(f"\n{'phase':<12} {'n':>6} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)", file=out)
+    rows = list(report['latency_by_phase'].items()) + [
+        ('all', report['latency']), ('  queue', report['queue']), ('  run', report['run']),
+    ]
+    for phase, stats in rows:
+        if stats['count']:
+            print(f"{phase:<12} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p90_ms']:>9.1f} "
+                  f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}", file=out)
+    print(f"\nCPU    {report['cpu_s']:.1f}s total, {report['cpu_utilisation']:.0%} of one core, "
+          f"{report['cpu_s_per_session']:.2f}s per session", file=out)
+    print(f"Memory {report['rss_before_mb']:.0f} -> {report['rss_after_mb']:.0f} MB RSS "
+          f"(peak {report['peak_rss_mb']:.0f} MB), {report['rss_mb_per_session']:.1f} MB per session", file=out)
+    if report['errors']:
+        print(f"\n{len(report['errors'])} error(s):", file=out)
+        for error in report['errors'][:20]:
+            print(f"  {error}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent estimator sessions.")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent sessions (default: 10)")
+    parser.add_argument("--edits", type=int, default=10, help="Widget edits per session (default: 10)")
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="Mean think time between edits in seconds, exponentially distributed; "
+                             "0 for back-to-back reruns (default: 0.5)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds between session starts (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for edit sequences (default: 0)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-rerun timeout in seconds (default: 120)")
+    parser.add_argument("--db", metavar="PATH", help="Quote database to write to (default: a temporary file)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    # AppTest outside a real server logs warnings on every run
+    from streamlit.logger import set_log_level
+    set_log_level(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before the page (and so pss_store) is first imported
+        os.environ['PSS_QUOTE_DB'] = args.db or os.path.join(tmp, 'load_test_quotes.db')
+        report = run_load_test(args.sessions, args.edits, think=args.think, ramp=args.ramp,
+                               seed=args.seed, timeout=args.timeout)
+
+    report['environment'] = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+    return 1 if report['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Benchmarks for the estimator hot paths.
+
+Times the bus count (scalar and batch), the competitive-pricing category
+split, single-line topology generation, the study x bus-type hour group-by,
+the full cost roll-up, CSV export and an input edit rerun through
+Streamlit's headless AppTest harness, for small to large projects. The
+app benchmarks use a throwaway quote database.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json --tolerance 0.25
+
+With --compare the exit status is 1 when any benchmark's median is slower
+than the baseline by more than the tolerance, so it can gate CI.
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from pss_engine import (  # noqa: E402
+    MECH_REDUNDANCY_FACTORS,
+    QuoteInputs,
+    calculate_bus_count_accurate,
+    calculate_bus_count_batch,
+    estimate_buses,
+    price_quote,
+    quote_topology,
+    study_type_matrix,
+    split_category_buses,
+    split_category_buses_batch,
+    tier_codes,
+)
+from pss_export import summary_csv  # noqa: E402
+
+APP_SCRIPT = os.path.join(REPO_ROOT, "PSS-Cost-Estimator-Unified-v5.0.py")
+
+# Loads stay inside the page's widget limits so the AppTest rerun can use them
+PROJECT_SIZES = {
+    'small': dict(tier_level="Tier I", it_capacity=1.0, mechanical_load=0.7, house_load=0.3),
+    'medium': dict(tier_level="Tier III", it_capacity=20.0, mechanical_load=14.0, house_load=6.0),
+    'large': dict(tier_level="Tier IV", it_capacity=200.0, mechanical_load=100.0, house_load=50.0),
+}
+
+BATCH_ROWS = 10000
+
+
+def measure(fn, repeat=7, min_time=0.05):
+    """
+    Time fn like timeit.autorange: loop enough calls for each sample to take
+    at least min_time, then take repeat samples.
+
+    Returns:
+        dict: median_s / min_s per call, plus the loop and repeat counts
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+
+    return {
+        'median_s': statistics.median(samples),
+        'min_s': min(samples),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def engine_benchmarks(size, inputs):
+    """(name, callable) pairs for the headless engine at one project size."""
+    it_mw = inputs.it_capacity
+    mech_mw = inputs.mechanical_load
+    house_mw = inputs.house_load
+    estimated = estimate_buses(inputs)
+    quote = price_quote(inputs)
+
+    rng = np.random.default_rng(0)
+    batch_it = np.round(rng.uniform(0.5 * it_mw, 1.5 * it_mw, BATCH_ROWS), 1)
+    batch_tier = tier_codes(np.full(BATCH_ROWS, inputs.tier_level))
+    batch_buses = calculate_bus_count_batch(batch_it, batch_tier, pue=inputs.pue_value)
+    mech_factor = MECH_REDUNDANCY_FACTORS[inputs.mech_redundancy]
+    topology = quote_topology(inputs)
+
+    return [
+        (f"{size}/bus_count_scalar", lambda: calculate_bus_count_accurate(
+            it_mw, mech_mw, house_mw, inputs.tier_level, pue=inputs.pue_value,
+            ups_lineup=inputs.ups_lineup, transformer_mva=inputs.transformer_mva,
+            lv_bus_mw=inputs.lv_bus_mw, pdu_mva=inputs.pdu_mva,
+            power_factor=inputs.power_factor, bus_calibration=inputs.bus_calibration)),
+        (f"{size}/bus_count_batch_{BATCH_ROWS}", lambda: calculate_bus_count_batch(
+            batch_it, batch_tier, pue=inputs.pue_value, ups_lineup=inputs.ups_lineup,
+            transformer_mva=inputs.transformer_mva, lv_bus_mw=inputs.lv_bus_mw,
+            pdu_mva=inputs.pdu_mva, power_factor=inputs.power_factor)),
+        (f"{size}/category_split", lambda: split_category_buses(
+            estimated, it_mw, mech_mw, house_mw, inputs.mech_redundancy)),
+        (f"{size}/category_split_batch_{BATCH_ROWS}", lambda: split_category_buses_batch(
+            batch_buses, batch_it, mech_mw, house_mw, mech_factor)),
+        (f"{size}/topology_build", lambda: quote_topology(inputs)),
+        (f"{size}/study_type_hours", lambda: study_type_matrix(topology.bus_type)),
+        (f"{size}/cost_rollup", lambda: price_quote(inputs)),
+        (f"{size}/csv_export", lambda: summary_csv(inputs, quote, prepared_by="bench")),
+    ]
+
+
+def app_rerun_benchmark(size, project, repeat):
+    """
+    One IT capacity edit per sample via AppTest, starting from the project
+    inputs: the edit's callback re-prices and the page reruns the edited
+    panel and the result sections.
+
+    Every sample uses a new capacity, so none is served from the shared
+    quote cache. Run inside main(), which points PSS_QUOTE_DB at a
+    throwaway database.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=300)
+    at.session_state.authenticated = True
+    at.session_state.username = "bench"
+    at.session_state.user_role = "User"
+    for key in ('tier_level', 'it_capacity', 'mechanical_load', 'house_load'):
+        at.session_state[key] = project[key]
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"App raised during benchmark: {at.exception[0].message}")
+
+    # Step away from the widget's limit so every sample stays in range
+    step = -0.1 if project['it_capacity'] > 100 else 0.1
+    edits = itertools.count(1)
+
+    def edit_it_capacity():
+        at.number_input(key="it_capacity").set_value(round(project['it_capacity'] + step * next(edits), 1))
+        at.run()
+
+    stats = measure(edit_it_capacity, repeat=repeat, min_time=0)
+    if at.exception:
+        raise RuntimeError(f"App raised during benchmark: {at.exception[0].message}")
+    return f"{size}/app_rerun", stats
+
+
+def run_all(sizes, repeat=7, include_app=True):
+    results = {}
+    for size in sizes:
+        project = PROJECT_SIZES[size]
+        inputs = QuoteInputs(competitive_pricing=True, **project)
+        for name, fn in engine_benchmarks(size, inputs):
+            results[name] = measure(fn, repeat=repeat)
+            print(f"{name:<40} {results[name]['median_s'] * 1e6:>12.1f} µs", file=sys.stderr)
+        if include_app:
+            name, stats = app_rerun_benchmark(size, project, repeat)
+            results[name] = stats
+            print(f"{name:<40} {stats['median_s'] * 1e6:>12.1f} µs", file=sys.stderr)
+    return results
+
+
+def environment():
+    import pandas as pd
+    import streamlit
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'streamlit': streamlit.__version__,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return the benchmarks whose median regressed by more than tolerance."""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = stats['median_s'] / base['median_s']
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:<40} {ratio:>7.2f}x  {flag}", file=sys.stderr)
+        if flag:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the estimator hot paths.")
+    parser.add_argument("--sizes", nargs="+", choices=list(PROJECT_SIZES), default=list(PROJECT_SIZES),
+                        help="Project sizes to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=7, help="Samples per benchmark (default: 7)")
+    parser.add_argument("--no-app", action="store_true", help="Skip the AppTest rerun benchmarks")
+    parser.add_argument("--save", metavar="JSON", help="Write results as a baseline file")
+    parser.add_argument("--compare", metavar="JSON", help="Compare against a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown vs baseline before failing (default: 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before the page (and so pss_store) is first imported
+        os.environ['PSS_QUOTE_DB'] = os.path.join(tmp, 'benchmark_quotes.db')
+        results = run_all(args.sizes, repeat=args.repeat, include_app=not args.no_app)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved {len(results)} benchmarks -> {args.save}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than baseline by more than "
+                  f"{args.tolerance:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
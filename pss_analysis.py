@@ -0,0 +1,551 @@
+"""
+Pricing analysis tools built on the vectorized engine.
+
+Everything here evaluates many variants of a quote in one
+price_quote_batch() call instead of re-running the page per variant.
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from pss_engine import (
+    DEFAULT_RATE_CARD,
+    IMPORTED_BUS_METHOD,
+    MECH_REDUNDANCY_FACTORS,
+    TIER_LEVELS,
+    calculate_bus_count_batch,
+    price_quote_batch,
+    tier_codes,
+    topology_bus_counts,
+    topology_params,
+)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MONTE CARLO PRICE UNCERTAINTY
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Inputs that may be given a distribution, with the page's widget bounds
+# used to clip samples to physically meaningful values
+UNCERTAIN_PARAMETERS = {
+    'pue_value': ('PUE', 1.1, 2.0),
+    'load_flow_factor': ('Load Flow Factor', 0.3, 3.0),
+    'short_circuit_factor': ('Short Circuit Factor', 0.3, 3.0),
+    'pdc_factor': ('PDC Factor', 0.3, 3.0),
+    'arc_flash_factor': ('Arc Flash Factor', 0.3, 3.0),
+    'harmonics_factor': ('Harmonics Factor', 0.3, 3.0),
+    'transient_factor': ('Transient Factor', 0.3, 3.0),
+    'bus_calibration': ('Bus Calibration', 0.5, 2.5),
+    'hour_reduction': ('Hour Reduction (%)', 0, 90),
+}
+
+PERCENTILES = (10, 50, 90)
+
+
+def sample_distribution(rng, spec, n_samples):
+    """
+    Draw samples for one distribution spec.
+
+    Supported specs:
+        ('fixed', value)
+        ('uniform', low, high)
+        ('triangular', low, mode, high)
+        ('normal', mean, std)
+    """
+    kind, *params = spec
+    if kind == 'fixed':
+        return np.full(n_samples, float(params[0]))
+    if kind == 'uniform':
+        return rng.uniform(params[0], params[1], n_samples)
+    if kind == 'triangular':
+        low, mode, high = params
+        if low == high:
+            return np.full(n_samples, float(mode))
+        return rng.triangular(low, mode, high, n_samples)
+    if kind == 'normal':
+        return rng.normal(params[0], params[1], n_samples)
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def triangular_spread(value, spread_pct):
+    """Triangular distribution centred on value, +/- spread_pct percent."""
+    delta = abs(value) * spread_pct / 100
+    return ('triangular', value - delta, value, value + delta)
+
+
+def percentile_bands(values, percentiles=PERCENTILES):
+    """Percentiles of a sample array as {percentile: value}."""
+    return {p: float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+
+
+def run_monte_carlo(inputs, distributions, n_samples=20000, seed=42, rate_card=DEFAULT_RATE_CARD):
+    """
+    Propagate input uncertainty through bus count, manhours and the cost roll-up.
+
+    Args:
+        inputs (QuoteInputs): Base quote; anything without a distribution stays fixed
+        distributions (dict): Field name -> distribution spec (see sample_distribution)
+        n_samples (int): Number of Monte Carlo samples
+        seed (int): Seed for a reproducible run
+        rate_card (RateCard): Factor tables to price against
+
+    Returns:
+        dict: 'samples' (sampled inputs), 'total_manhours' and 'final_total_cost'
+        sample arrays, plus 'percentiles' {metric: {10: ..., 50: ..., 90: ...}}
+    """
+    unknown = set(distributions) - set(UNCERTAIN_PARAMETERS)
+    if unknown:
+        raise ValueError(f"No distribution support for: {', '.join(sorted(unknown))}")
+
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for name, spec in distributions.items():
+        _, low, high = UNCERTAIN_PARAMETERS[name]
+        samples[name] = np.clip(sample_distribution(rng, spec, n_samples), low, high)
+
+    result = price_quote_batch(inputs, rate_card=rate_card, **samples)
+    total_manhours = np.broadcast_to(result['total_manhours'], (n_samples,))
+    final_total_cost = np.broadcast_to(result['final_total_cost'], (n_samples,))
+
+    return {
+        'samples': samples,
+        'total_manhours': total_manhours,
+        'final_total_cost': final_total_cost,
+        'percentiles': {
+            'total_manhours': percentile_bands(total_manhours),
+            'final_total_cost': percentile_bands(final_total_cost),
+        }
+    }
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TORNADO SENSITIVITY
+# ═══════════════════════════════════════════════════════════════════════════════
+
+SENSITIVITY_PARAMETERS = {
+    'senior_rate': 'Senior Engineer Rate',
+    'mid_rate': 'Mid-level Engineer Rate',
+    'junior_rate': 'Junior Engineer Rate',
+    'load_flow_factor': 'Load Flow Factor',
+    'short_circuit_factor': 'Short Circuit Factor',
+    'pdc_factor': 'PDC Factor',
+    'arc_flash_factor': 'Arc Flash Factor',
+    'harmonics_factor': 'Harmonics Factor',
+    'transient_factor': 'Transient Factor',
+    'load_flow_report_cost': 'Load Flow Report Cost',
+    'short_circuit_report_cost': 'Short Circuit Report Cost',
+    'pdc_report_cost': 'PDC Report Cost',
+    'arc_flash_report_cost': 'Arc Flash Report Cost',
+    'harmonics_report_cost': 'Harmonics Report Cost',
+    'transient_report_cost': 'Transient Report Cost',
+    'it_capacity': 'IT Capacity',
+    'mechanical_load': 'Mechanical Load',
+    'house_load': 'House Load',
+    'pue_value': 'PUE',
+    'ups_lineup': 'UPS Lineup',
+    'transformer_mva': 'Transformer MVA',
+    'lv_bus_mw': 'LV Bus Section',
+    'pdu_mva': 'PDU Capacity',
+    'power_factor': 'Power Factor',
+    'bus_calibration': 'Bus Calibration',
+    'hour_reduction': 'Hour Reduction',
+    'custom_margin': 'Project Margin',
+    'repeat_discount': 'Repeat Discount',
+    'urgency_multiplier': 'Urgency Multiplier',
+    'meeting_cost': 'Cost per Meeting',
+    'client_meetings': 'Client Meetings',
+    'site_visit_cost': 'Cost per Site Visit',
+    'site_visits': 'Site Visits',
+}
+
+
+def tornado_sensitivity(inputs, perturb_pct=10, parameters=None, rate_card=DEFAULT_RATE_CARD):
+    """
+    Rank inputs by their effect on final_total_cost when moved by +/- perturb_pct.
+
+    All 2 x N perturbations are priced in a single price_quote_batch() call:
+    row 2i holds parameter i at -perturb_pct, row 2i+1 at +perturb_pct, with
+    every other input at its base value.
+
+    Returns:
+        tuple: (base_cost, rows) where rows is a list of dicts with parameter,
+        label, low_value, high_value, low_cost, high_cost and swing, sorted by
+        swing (largest first)
+    """
+    parameters = list(parameters or SENSITIVITY_PARAMETERS)
+    n_rows = 2 * len(parameters)
+    step = perturb_pct / 100
+
+    overrides = {}
+    for i, name in enumerate(parameters):
+        base_value = float(getattr(inputs, name))
+        column = np.full(n_rows, base_value)
+        column[2 * i] = base_value * (1 - step)
+        column[2 * i + 1] = base_value * (1 + step)
+        overrides[name] = column
+
+    costs = price_quote_batch(inputs, rate_card=rate_card, **overrides)['final_total_cost']
+    base_cost = float(price_quote_batch(inputs, rate_card=rate_card)['final_total_cost'])
+
+    rows = []
+    for i, name in enumerate(parameters):
+        low_cost = float(costs[2 * i])
+        high_cost = float(costs[2 * i + 1])
+        rows.append({
+            'parameter': name,
+            'label': SENSITIVITY_PARAMETERS.get(name, name),
+            'low_value': float(overrides[name][2 * i]),
+            'high_value': float(overrides[name][2 * i + 1]),
+            'low_cost': low_cost,
+            'high_cost': high_cost,
+            'swing': abs(high_cost - low_cost),
+        })
+
+    rows.sort(key=lambda row: row['swing'], reverse=True)
+    return base_cost, rows
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PARAMETER SWEEP (IT CAPACITY x TIER x PUE)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+SWEEP_METRICS = {
+    'estimated_buses': 'Estimated Buses',
+    'total_manhours': 'Total Manhours',
+    'final_total_cost': 'Final Project Cost (₹)',
+}
+
+
+def parameter_sweep(inputs, it_capacities, pue_values, tiers=TIER_LEVELS, rate_card=DEFAULT_RATE_CARD):
+    """
+    Price every IT capacity x tier x PUE combination in one vectorized call.
+
+    Returns:
+        dict: 'it_capacity', 'tier_level', 'pue_value' axes plus one array of
+        shape (len(it_capacities), len(tiers), len(pue_values)) per SWEEP_METRICS key
+    """
+    it_capacities = np.asarray(it_capacities, dtype=np.float64)
+    pue_values = np.asarray(pue_values, dtype=np.float64)
+    tiers = list(tiers)
+
+    result = price_quote_batch(
+        inputs,
+        rate_card=rate_card,
+        it_capacity=it_capacities[:, None, None],
+        tier_level=tier_codes(tiers)[None, :, None],
+        pue_value=pue_values[None, None, :]
+    )
+
+    sweep = {
+        'it_capacity': it_capacities,
+        'tier_level': tiers,
+        'pue_value': pue_values,
+    }
+    for metric in SWEEP_METRICS:
+        sweep[metric] = np.array(result[metric])
+    return sweep
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BUS COUNT BREAKPOINT INDEX
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Mechanical share of non-IT load assumed by estimate_buses()
+MECH_FRACTION = 0.70
+
+
+def _bus_counts_at(inputs, it_capacity):
+    """Bus counts for the quote's configuration at an array of IT capacities."""
+    if inputs.bus_method == IMPORTED_BUS_METHOD and inputs.imported_bus_counts:
+        # A real bus list does not move with IT capacity
+        return np.full(np.shape(it_capacity), max(1, sum(inputs.imported_bus_counts.values())), dtype=np.int64)
+    if inputs.bus_method == "Topology":
+        counts = topology_bus_counts(it_capacity, inputs.mechanical_load, inputs.house_load,
+                                     tier_codes(inputs.tier_level), mech_fraction=MECH_FRACTION,
+                                     **topology_params(inputs))
+        return np.maximum(1, sum(counts.values()))
+    return calculate_bus_count_batch(
+        it_capacity,
+        tier_codes(inputs.tier_level),
+        pue=inputs.pue_value,
+        mech_fraction=MECH_FRACTION,
+        ups_lineup=inputs.ups_lineup,
+        transformer_mva=inputs.transformer_mva,
+        lv_bus_mw=inputs.lv_bus_mw,
+        pdu_mva=inputs.pdu_mva,
+        utility_incomers=inputs.utility_incomers,
+        power_factor=inputs.power_factor,
+        voltage_levels=inputs.voltage_levels,
+        backup_gens=inputs.backup_gens,
+        expansion_factor=inputs.expansion_factor,
+        bus_calibration=inputs.bus_calibration
+    )
+
+
+def _candidate_breakpoints(inputs, it_min, it_max):
+    """IT capacities where one of the ceil() terms of the bus count can step."""
+    non_it_share = inputs.pue_value - 1
+    # (divisor, load per MW of IT, fixed load) for every ceil(load / divisor) term
+    if inputs.bus_method == IMPORTED_BUS_METHOD and inputs.imported_bus_counts:
+        terms = []
+    elif inputs.bus_method == "Topology":
+        expansion = inputs.expansion_factor
+        mech_factor = MECH_REDUNDANCY_FACTORS.get(inputs.mech_redundancy, 1.25)
+        fixed_mech = inputs.mechanical_load * expansion
+        fixed_house = inputs.house_load * expansion
+        if fixed_mech + fixed_house > 0:
+            non_it_terms = [(inputs.transformer_mva * inputs.power_factor, expansion, fixed_mech + fixed_house)]
+        else:
+            non_it_terms = [
+                (inputs.lv_bus_mw, MECH_FRACTION * non_it_share * expansion * mech_factor, 0.0),
+                (inputs.lv_bus_mw, (1 - MECH_FRACTION) * non_it_share * expansion, 0.0),
+                (inputs.transformer_mva * inputs.power_factor, inputs.pue_value * expansion, 0.0),
+            ]
+        terms = [
+            (inputs.lv_bus_mw, expansion, 0.0),
+            (inputs.ups_lineup, expansion, 0.0),
+            (inputs.pdu_mva, expansion, 0.0),
+        ] + non_it_terms
+    else:
+        terms = [
+            (inputs.lv_bus_mw, 1.0, 0.0),
+            (inputs.lv_bus_mw, MECH_FRACTION * non_it_share, 0.0),
+            (inputs.lv_bus_mw, (1 - MECH_FRACTION) * non_it_share, 0.0),
+            (inputs.ups_lineup, 1.0, 0.0),
+            (inputs.pdu_mva, 1.0, 0.0),
+            (inputs.transformer_mva * inputs.power_factor, inputs.pue_value, 0.0),
+        ]
+    candidates = []
+    for divisor, per_mw, fixed in terms:
+        if per_mw <= 0:
+            continue
+        # Steps where per_mw * it + fixed crosses a multiple of divisor
+        k = np.arange(math.floor((it_min * per_mw + fixed) / divisor),
+                      math.ceil((it_max * per_mw + fixed) / divisor) + 1)
+        candidates.append((k * divisor - fixed) / per_mw)
+    candidates = np.concatenate(candidates) if candidates else np.empty(0)
+    candidates = candidates[(candidates > it_min) & (candidates < it_max)]
+    return np.unique(candidates)
+
+
+@dataclass
+class BreakpointTable:
+    """
+    Piecewise-constant bus count (and price) over IT capacity.
+
+    bus_counts[i] applies for starts[i] <= IT capacity < starts[i + 1].
+    In standard pricing the price only moves with the bus count, so
+    final_costs[i] holds for the whole segment; in competitive pricing the
+    category split also depends on the MW mix, and final_costs[i] is the
+    price at the start of the segment.
+    """
+
+    starts: np.ndarray
+    bus_counts: np.ndarray
+    final_costs: np.ndarray
+    it_min: float
+    it_max: float
+
+    def segment(self, it_capacity):
+        """Index of the segment containing each capacity (binary search)."""
+        index = np.searchsorted(self.starts, it_capacity, side='right') - 1
+        return np.clip(index, 0, len(self.starts) - 1)
+
+    def bus_count_at(self, it_capacity):
+        return self.bus_counts[self.segment(it_capacity)]
+
+    def price_at(self, it_capacity):
+        return self.final_costs[self.segment(it_capacity)]
+
+    def next_cliff(self, it_capacity):
+        """
+        First capacity above it_capacity where the bus count steps up.
+
+        Returns:
+            dict or None: it_capacity, bus_count, final_total_cost of the next
+            segment and the price jump from the current segment
+        """
+        index = int(self.segment(it_capacity)) + 1
+        if index >= len(self.starts):
+            return None
+        return {
+            'it_capacity': float(self.starts[index]),
+            'bus_count': int(self.bus_counts[index]),
+            'final_total_cost': float(self.final_costs[index]),
+            'price_jump': float(self.final_costs[index] - self.final_costs[index - 1]),
+        }
+
+    def cliffs_between(self, low, high):
+        """Indices of every step inside (low, high]."""
+        return np.nonzero((self.starts > low) & (self.starts <= high))[0]
+
+
+def build_breakpoint_table(inputs, it_min=0.1, it_max=200.0, rate_card=DEFAULT_RATE_CARD):
+    """
+    Index every IT capacity in [it_min, it_max] where the bus count steps.
+
+    Candidate steps come from the ceil() terms of calculate_bus_count_accurate
+    (LV sections, UPS lineups, PDUs, transformers). The count is sampled
+    between candidates and each change is then bisected in floating point, so
+    starts[i] is the exact smallest capacity that yields bus_counts[i].
+
+    Returns:
+        BreakpointTable
+    """
+    candidates = _candidate_breakpoints(inputs, it_min, it_max)
+    edges = np.concatenate(([it_min], candidates, [it_max]))
+    probes = np.concatenate(([it_min], (edges[:-1] + edges[1:]) / 2, [it_max]))
+    counts = _bus_counts_at(inputs, probes)
+
+    # Bisect each change between neighbouring probes down to adjacent floats.
+    # Several steps can share one bracket (candidates a few ulps apart), so
+    # any bracket whose first step does not reach its upper count is bisected
+    # again from that step.
+    changed = np.nonzero(counts[1:] != counts[:-1])[0]
+    bracket_low = probes[changed]
+    bracket_high = probes[changed + 1]
+    high_counts = counts[changed + 1]
+    found = []
+    while len(bracket_low):
+        low, high = bracket_low, bracket_high
+        low_counts = _bus_counts_at(inputs, low)
+        for _ in range(128):
+            open_brackets = np.nextafter(low, high) < high
+            if not open_brackets.any():
+                break
+            mid = np.where(open_brackets, low + (high - low) / 2, low)
+            moved = _bus_counts_at(inputs, mid) != low_counts
+            high = np.where(open_brackets & moved, mid, high)
+            low = np.where(open_brackets & ~moved, mid, low)
+        found.append(high)
+        unfinished = _bus_counts_at(inputs, high) != high_counts
+        bracket_low = high[unfinished]
+        bracket_high = bracket_high[unfinished]
+        high_counts = high_counts[unfinished]
+
+    starts = np.unique(np.concatenate([[it_min]] + found))
+    bus_counts = _bus_counts_at(inputs, starts)
+    final_costs = np.asarray(price_quote_batch(inputs, rate_card=rate_card, it_capacity=starts)['final_total_cost'])
+
+    return BreakpointTable(starts=starts, bus_counts=bus_counts, final_costs=final_costs,
+                           it_min=it_min, it_max=it_max)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GOAL SEEK (TARGET FINAL COST)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# lever -> (label, lower bound, upper bound, how the final cost responds)
+GOAL_SEEK_LEVERS = {
+    'custom_margin': ('Project Margin (%)', 0.0, 50.0, 'linear'),
+    'repeat_discount': ('Repeat Customer Discount (%)', 0.0, 25.0, 'linear'),
+    'hour_reduction': ('Hour Reduction (%)', 0.0, 90.0, 'linear'),
+    'bus_calibration': ('Bus Calibration', 0.5, 2.5, 'stepwise'),
+}
+
+
+def _final_cost(inputs, rate_card, **overrides):
+    return np.asarray(price_quote_batch(inputs, rate_card=rate_card, **overrides)['final_total_cost'], dtype=np.float64)
+
+
+def goal_seek(inputs, lever, target_cost, rate_card=DEFAULT_RATE_CARD):
+    """
+    Find the value of one lever that brings final_total_cost to target_cost.
+
+    Margin, discount and hour reduction enter the cost chain linearly, so
+    they are solved in closed form from two evaluations of the chain. Bus
+    calibration moves the price in steps (the bus count is rounded up), so it
+    is bisected for the largest value whose price does not exceed the target.
+
+    Returns:
+        dict: lever, value (clipped to the widget range), achieved_cost,
+        feasible (target reachable inside the range) and method
+    """
+    label, low, high, method = GOAL_SEEK_LEVERS[lever]
+    extra = {}
+    if lever == 'repeat_discount':
+        # Discounts only apply to repeat customers
+        extra['customer_type'] = "Repeat Customer"
+
+    if method == 'linear':
+        cost_low, cost_high = _final_cost(inputs, rate_card, **{lever: np.array([low, high])}, **extra)
+        if cost_high == cost_low:
+            value = float(getattr(inputs, lever))
+            feasible = bool(np.isclose(cost_low, target_cost))
+        else:
+            value = low + (target_cost - cost_low) * (high - low) / (cost_high - cost_low)
+            feasible = low <= value <= high
+            value = float(np.clip(value, low, high))
+    else:
+        cost_low, cost_high = _final_cost(inputs, rate_card, **{lever: np.array([low, high])}, **extra)
+        if target_cost < cost_low:
+            value, feasible = low, False
+        elif target_cost >= cost_high:
+            value, feasible = high, bool(np.isclose(cost_high, target_cost))
+        else:
+            lo, hi = low, high
+            while np.nextafter(lo, hi) < hi:
+                mid = lo + (hi - lo) / 2
+                if _final_cost(inputs, rate_card, **{lever: mid}, **extra) <= target_cost:
+                    lo = mid
+                else:
+                    hi = mid
+            value, feasible = float(lo), True
+
+    return {
+        'lever': lever,
+        'label': label,
+        'value': value,
+        'achieved_cost': float(_final_cost(inputs, rate_card, **{lever: value}, **extra)),
+        'feasible': feasible,
+        'method': 'closed form' if method == 'linear' else 'bracketed bisection',
+    }
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SCENARIO COMPARISON
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# name -> QuoteInputs overrides (studies_selected / work_allocation take partial dicts)
+SCENARIO_PRESETS = {
+    "Tier III": {'tier_level': "Tier III"},
+    "Tier IV": {'tier_level': "Tier IV"},
+    "Standard Pricing": {'competitive_pricing': False},
+    "Competitive Pricing": {'competitive_pricing': True},
+    "Typical Model": {'hour_reduction': 0},
+    "ETAP Model (30% Reduction)": {'hour_reduction': 30},
+    "Urgent Delivery": {'delivery_type': "Urgent"},
+    "With Harmonics & Transient": {'studies_selected': {'harmonics': True, 'transient': True}},
+    "Without Harmonics & Transient": {'studies_selected': {'harmonics': False, 'transient': False}},
+}
+
+
+def price_scenarios(inputs, scenarios, rate_card=DEFAULT_RATE_CARD):
+    """
+    Price the base quote and every scenario in a single price_quote_batch call.
+
+    Args:
+        inputs (QuoteInputs): Base quote; element 0 of every result array
+        scenarios (list): Override dicts, one per scenario (element i + 1)
+
+    Returns:
+        dict: price_quote_batch result with arrays of length len(scenarios) + 1
+    """
+    variants = [{}] + list(scenarios)
+    overrides = {}
+
+    for group in ('studies_selected', 'work_allocation'):
+        base = getattr(inputs, group)
+        keys = sorted({key for variant in variants for key in variant.get(group, {})})
+        if keys:
+            overrides[group] = {
+                key: np.array([variant.get(group, {}).get(key, base[key]) for variant in variants])
+                for key in keys
+            }
+
+    fields = sorted({name for variant in variants for name in variant} - {'studies_selected', 'work_allocation'})
+    for name in fields:
+        base = getattr(inputs, name)
+        overrides[name] = np.array([variant.get(name, base) for variant in variants])
+
+    if not overrides:
+        # Nothing varies: still return one element per scenario
+        overrides['custom_margin'] = np.full(len(variants), inputs.custom_margin)
+
+    return price_quote_batch(inputs, rate_card, **overrides)
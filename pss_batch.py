@@ -0,0 +1,282 @@
+"""
+Batch quoting over CSV/Parquet project lists.
+
+Prices every row of a project spreadsheet with the same engine as the
+Streamlit page and streams the results out chunk by chunk.
+
+Usage:
+    python pss_batch.py halls.csv -o quotes.parquet --chunksize 500 --workers 8
+    python pss_batch.py variants.csv -o client_pack.zip
+
+A .zip output holds one summary CSV per row plus comparison.csv with every
+quote side by side (see pss_export.write_quotes_zip).
+
+Columns are matched to QuoteInputs field names (case and spaces ignored);
+anything missing falls back to the page defaults. A few spreadsheet-style
+aliases are understood, e.g. "Tier", "IT MW", "Mechanical MW", "House MW".
+The "studies" column takes a comma/semicolon separated list of study keys
+(or "all"); individual study columns (load_flow, harmonics, ...) also work.
+"""
+
+import argparse
+import dataclasses
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pss_engine import (
+    STUDY_KEYS,
+    TIER_LEVELS,
+    QuoteInputs,
+    normalize_work_allocation,
+    price_quote,
+    result_row,
+)
+from pss_export import write_quotes_zip
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ROW PARSING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+QUOTE_FIELDS = {f.name: f for f in dataclasses.fields(QuoteInputs)}
+
+COLUMN_ALIASES = {
+    'tier': 'tier_level',
+    'it_mw': 'it_capacity',
+    'it_capacity_mw': 'it_capacity',
+    'mechanical_mw': 'mechanical_load',
+    'mech_mw': 'mechanical_load',
+    'mechanical_load_mw': 'mechanical_load',
+    'house_mw': 'house_load',
+    'house_load_mw': 'house_load',
+    'pue': 'pue_value',
+    'margin': 'custom_margin',
+    'project': 'project_name',
+    'competitive': 'competitive_pricing',
+    'meetings': 'client_meetings',
+}
+
+ALLOCATION_COLUMNS = {
+    'senior_allocation': 'senior',
+    'mid_allocation': 'mid',
+    'junior_allocation': 'junior',
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on', 'enabled'}
+
+ROMAN_TIERS = {'I': 'Tier I', 'II': 'Tier II', 'III': 'Tier III', 'IV': 'Tier IV',
+               '1': 'Tier I', '2': 'Tier II', '3': 'Tier III', '4': 'Tier IV'}
+
+
+def _column_key(name):
+    key = str(name).strip().lower().replace(' ', '_').replace('-', '_')
+    return COLUMN_ALIASES.get(key, key)
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return bool(value)
+
+
+def _parse_tier(value):
+    text = str(value).strip()
+    if text in TIER_LEVELS:
+        return text
+    text = text.upper().replace('TIER', '').strip()
+    if text.endswith('.0'):
+        text = text[:-2]
+    if text not in ROMAN_TIERS:
+        raise ValueError(f"Unrecognised tier level: {value!r}")
+    return ROMAN_TIERS[text]
+
+
+def _parse_studies(value):
+    text = str(value).strip().lower()
+    if text == 'all':
+        return {key: True for key in STUDY_KEYS}
+    keys = {part.strip().replace(' ', '_') for part in text.replace(';', ',').split(',') if part.strip()}
+    unknown = keys - set(STUDY_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown studies: {', '.join(sorted(unknown))}")
+    return {key: key in keys for key in STUDY_KEYS}
+
+
+def quote_inputs_from_record(record):
+    """Build QuoteInputs from one spreadsheet row (dict of column -> value)."""
+    values = {}
+    studies = QuoteInputs().studies_selected
+    allocation = QuoteInputs().work_allocation
+
+    for column, value in record.items():
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            continue
+        key = _column_key(column)
+
+        if key == 'studies':
+            studies = _parse_studies(value)
+        elif key in STUDY_KEYS:
+            studies[key] = _parse_bool(value)
+        elif key in ALLOCATION_COLUMNS:
+            allocation[ALLOCATION_COLUMNS[key]] = float(value)
+        elif key == 'tier_level':
+            values[key] = _parse_tier(value)
+        elif key in QUOTE_FIELDS:
+            field_type = QUOTE_FIELDS[key].type
+            if field_type in (bool, 'bool'):
+                values[key] = _parse_bool(value)
+            elif field_type in (int, 'int'):
+                values[key] = int(float(value))
+            elif field_type in (float, 'float'):
+                values[key] = float(value)
+            else:
+                values[key] = str(value)
+
+    values['studies_selected'] = studies
+    values['work_allocation'] = normalize_work_allocation(allocation)
+
+    # Mirror the page: discounts only apply to repeat customers
+    if values.get('customer_type', 'New Customer') != "Repeat Customer":
+        values['repeat_discount'] = 0
+
+    return QuoteInputs(**values)
+
+
+def price_records(records):
+    """Price a list of row dicts; returns one output row (inputs + results) per record."""
+    rows = []
+    for record in records:
+        inputs = quote_inputs_from_record(record)
+        row = dict(record)
+        row.update(result_row(price_quote(inputs)))
+        rows.append(row)
+    return rows
+
+
+def price_quotes(records):
+    """Price a list of row dicts; returns (label, QuoteInputs, QuoteResult) per record."""
+    quotes = []
+    for record in records:
+        inputs = quote_inputs_from_record(record)
+        quotes.append((inputs.project_name, inputs, price_quote(inputs)))
+    return quotes
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CHUNKED INPUT / OUTPUT
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def iter_input_chunks(path, chunksize):
+    """Yield the input file as DataFrames of at most chunksize rows."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        yield from pd.read_csv(path, chunksize=chunksize)
+    elif ext in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported input format: {ext} (expected .csv or .parquet)")
+
+
+class ChunkWriter:
+    """Append DataFrame chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        if self.ext not in ('.csv', '.parquet', '.pq'):
+            raise ValueError(f"Unsupported output format: {self.ext} (expected .csv or .parquet)")
+        self._parquet_writer = None
+        self._header_written = False
+        self.rows_written = 0
+
+    def write(self, df):
+        if self.ext == '.csv':
+            df.to_csv(self.path, mode='a' if self._header_written else 'w',
+                      header=not self._header_written, index=False)
+            self._header_written = True
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._parquet_writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._schema = table.schema
+                self._parquet_writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            self._parquet_writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def iter_priced_chunks(input_path, chunksize, workers, price_fn):
+    """
+    Yield price_fn(records) for each input chunk, in input order.
+
+    Chunks are priced in a process pool; at most two chunks per worker are in
+    flight at once so memory stays bounded for large files.
+    """
+    if workers == 1:
+        for chunk in iter_input_chunks(input_path, chunksize):
+            yield price_fn(chunk.to_dict('records'))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk in iter_input_chunks(input_path, chunksize):
+            pending.append(pool.submit(price_fn, chunk.to_dict('records')))
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def run_batch(input_path, output_path, chunksize=500, workers=None):
+    """
+    Price every row of input_path and stream the results to output_path.
+
+    CSV/Parquet outputs get one row per input row (inputs + results); a .zip
+    output gets per-quote summaries plus a comparison sheet. Output keeps the
+    input order.
+
+    Returns:
+        int: Number of rows written
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if os.path.splitext(output_path)[1].lower() == '.zip':
+        with open(output_path, 'wb') as f:
+            chunks = iter_priced_chunks(input_path, chunksize, workers, price_quotes)
+            return write_quotes_zip(f, (quote for chunk in chunks for quote in chunk))
+
+    writer = ChunkWriter(output_path)
+    try:
+        for rows in iter_priced_chunks(input_path, chunksize, workers, price_records):
+            writer.write(pd.DataFrame(rows))
+    finally:
+        writer.close()
+
+    return writer.rows_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-price data center halls from a CSV/Parquet project list.")
+    parser.add_argument("input", help="Project list (.csv or .parquet)")
+    parser.add_argument("-o", "--output", required=True, help="Priced output (.csv, .parquet or .zip)")
+    parser.add_argument("--chunksize", type=int, default=500, help="Rows per chunk (default: 500)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    rows = run_batch(args.input, args.output, chunksize=args.chunksize, workers=args.workers)
+    print(f"Priced {rows} projects -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Bus list import from ETAP / SKM PowerTools bus schedule exports.
+
+The export is read in fixed-size chunks (CSV through pandas, XLSX through
+openpyxl's read-only mode), so a 50k+ row schedule never holds more than one
+chunk of text in memory. Only the name, voltage and type columns are kept,
+and each bus is reduced to a compact (bus type, nominal kV) pair classified
+into the same BUS_TYPES the topology engine enumerates.
+"""
+
+import csv
+import hashlib
+import importlib.util
+import io
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from pss_engine import BUS_TYPE_NAMES, BUS_TYPES, study_type_matrix
+
+# Header aliases after normalisation (lower case, punctuation -> '_')
+NAME_COLUMNS = ('id', 'bus_id', 'bus', 'bus_name', 'name', 'bus_tag')
+VOLTAGE_COLUMNS = ('nominal_kv', 'nom_kv', 'kv', 'base_kv', 'bus_kv', 'voltage_kv', 'nominal_voltage_kv',
+                   'nominal_voltage', 'nominal_voltage_v', 'voltage', 'voltage_v', 'bus_voltage', 'base_voltage')
+TYPE_COLUMNS = ('type', 'bus_type', 'equipment_type', 'equipment', 'category', 'description', 'load_type')
+
+# Buses above this nominal voltage are medium voltage
+MV_THRESHOLD_KV = 1.0
+
+# Rows scanned for the header line (exports often start with title rows)
+HEADER_SCAN_ROWS = 30
+
+# Keyword rules on "<type> <name>" text, checked in order
+_GENERATOR = r'\bgen|genset|\bdg\d*\b'
+_TRANSFORMER = r'xfmr|transformer|\btx\d*\b|\btr\d+\b|\bxf\d*\b'
+_MV = r'swgr|switchgear|\bmv\b|\bhv\b|incomer|utility'
+_PDU = r'\bpdu|\brpp|busway|\brack'
+_UPS = r'\bups'
+_MECH = r'\bmcc|mech|chiller|\bcra[ch]\b|\bahu|pump|cooling|hvac|\bfan'
+_IT = r'\bit\b|data ?hall|server|critical|\bwhite ?space'
+
+FILE_FORMATS = {
+    'csv': ('CSV', None),
+    'xlsx': ('Excel', 'openpyxl'),
+}
+
+
+def _column_key(name):
+    return re.sub(r'[^0-9a-z]+', '_', str(name).strip().lower()).strip('_')
+
+
+def format_available(fmt):
+    """Whether the optional dependency for a bus list format is installed."""
+    dependency = FILE_FORMATS[fmt][1]
+    return dependency is None or importlib.util.find_spec(dependency) is not None
+
+
+def file_sha256(fileobj, block_size=1 << 20):
+    """Content hash of a binary file object, read in blocks; the position is restored."""
+    position = fileobj.tell()
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(block_size), b''):
+        digest.update(block)
+    fileobj.seek(position)
+    return digest.hexdigest()
+
+
+def _find_columns(header):
+    """Map roles (name, voltage, type) to column positions in a header row."""
+    keys = [_column_key(cell) for cell in header]
+    columns = {}
+    for role, aliases in (('name', NAME_COLUMNS), ('voltage', VOLTAGE_COLUMNS), ('type', TYPE_COLUMNS)):
+        for alias in aliases:
+            if alias in keys:
+                columns[role] = keys.index(alias)
+                break
+    return columns
+
+
+def _locate_header(rows):
+    """Index and column roles of the first row that names a voltage or type column."""
+    for index, row in enumerate(rows):
+        columns = _find_columns(row)
+        if 'voltage' in columns or 'type' in columns:
+            return index, columns
+    raise ValueError("No voltage or bus type column found (expected e.g. 'Nominal kV', 'Voltage' or 'Type')")
+
+
+def _csv_chunks(fileobj, chunksize):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        head = [row for _, row in zip(range(HEADER_SCAN_ROWS), csv.reader(text))]
+        header_index, columns = _locate_header(head)
+        header = head[header_index]
+        text.seek(0)
+        reader = pd.read_csv(
+            text, skiprows=header_index + 1, header=None, usecols=sorted(columns.values()),
+            dtype=str, keep_default_na=False, chunksize=chunksize, on_bad_lines='skip',
+        )
+        yield header, columns
+        for chunk in reader:
+            yield chunk.rename(columns={position: role for role, position in columns.items()})
+    finally:
+        text.detach()
+
+
+def _xlsx_chunks(fileobj, chunksize):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        head = [['' if cell is None else str(cell) for cell in row]
+                for _, row in zip(range(HEADER_SCAN_ROWS), rows)]
+        header_index, columns = _locate_header(head)
+        yield head[header_index], columns
+
+        roles = sorted(columns, key=columns.get)
+        positions = [columns[role] for role in roles]
+        # Rows scanned past the header are data too
+        batch = [[row[position] if position < len(row) else '' for position in positions]
+                 for row in head[header_index + 1:]]
+        for row in rows:
+            batch.append(['' if position >= len(row) or row[position] is None else str(row[position])
+                          for position in positions])
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=roles)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=roles)
+    finally:
+        workbook.close()
+
+
+def _voltage_scale(column_name, values):
+    """1.0 when the column holds kV, 0.001 when it holds volts."""
+    key = _column_key(column_name)
+    if 'kv' in key:
+        return 1.0
+    if key.endswith('_v'):
+        return 0.001
+    # Unlabelled: SKM writes volts (480, 13800), ETAP writes kV (0.48, 13.8)
+    finite = values[np.isfinite(values)]
+    return 0.001 if len(finite) and np.median(finite) > 100 else 1.0
+
+
+def classify_buses(type_text, kv):
+    """
+    Vectorized bus classification.
+
+    Generator and transformer keywords win regardless of voltage; any other
+    bus above MV_THRESHOLD_KV (or named like switchgear when no voltage is
+    given) is MV switchgear. Low-voltage buses are PDU, UPS, mechanical MCC
+    or IT PCC by keyword, and house/auxiliary distribution otherwise.
+
+    Args:
+        type_text (pd.Series): Lower-cased "<type> <name>" text per bus
+        kv (np.ndarray): Nominal kV per bus (NaN if unknown)
+
+    Returns:
+        np.ndarray: int8 codes into BUS_TYPES
+    """
+    def matches(pattern):
+        return type_text.str.contains(pattern, regex=True).to_numpy()
+
+    mv = np.where(np.isnan(kv), matches(_MV), kv > MV_THRESHOLD_KV)
+    conditions = [matches(_GENERATOR), matches(_TRANSFORMER), mv,
+                  matches(_PDU), matches(_UPS), matches(_MECH), matches(_IT)]
+    choices = ['generator', 'transformer', 'mv_switchgear', 'pdu', 'ups_output', 'lv_mech_mcc', 'lv_it_pcc']
+    codes = np.select(conditions, [BUS_TYPES.index(choice) for choice in choices],
+                      default=BUS_TYPES.index('lv_house_pcc'))
+    return codes.astype(np.int8)
+
+
+@dataclass(frozen=True)
+class BusList:
+    """Imported buses as parallel arrays: one (type, kV) pair per bus."""
+
+    bus_type: np.ndarray   # int8 index into BUS_TYPES
+    kv: np.ndarray         # float32 nominal kV, NaN where the export had none
+    rows: int              # data rows read
+    skipped: int           # rows with neither a voltage nor a type/name
+    columns: dict          # role -> source column header
+
+    def __len__(self):
+        return len(self.bus_type)
+
+    def counts(self):
+        """Buses per type (BUS_TYPES order)."""
+        totals = np.bincount(self.bus_type, minlength=len(BUS_TYPES))
+        return {bus_type: int(total) for bus_type, total in zip(BUS_TYPES, totals)}
+
+    def study_hours(self, rate_card=None, **factors):
+        """Study x bus-type hours for these buses (see study_type_matrix)."""
+        return study_type_matrix(self.bus_type, rate_card, **factors)
+
+    def voltage_table(self):
+        """Bus counts by nominal kV (rows) and bus type (columns)."""
+        frame = pd.DataFrame({
+            'Nominal kV': np.round(self.kv.astype(np.float64), 3),
+            'Type': [BUS_TYPE_NAMES[bus_type] for bus_type in np.asarray(BUS_TYPES)[self.bus_type]],
+        })
+        table = pd.crosstab(frame['Nominal kV'].fillna(-1), frame['Type'])
+        return table.rename(index={-1: 'Unknown'})
+
+
+def read_bus_list(source, filename=None, chunksize=10000):
+    """
+    Parse an ETAP / SKM bus schedule export.
+
+    The header row is located automatically (title rows above it are
+    skipped) and the name, voltage and type columns are matched by their
+    usual export headings. Voltages in volts are converted to kV.
+
+    Args:
+        source: Path or binary file object (e.g. a Streamlit upload)
+        filename (str): Name used to pick the format when source is a file object
+        chunksize (int): Rows parsed at a time
+
+    Returns:
+        BusList
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as fileobj:
+            return read_bus_list(fileobj, filename=os.fspath(source), chunksize=chunksize)
+
+    name = filename or getattr(source, 'name', '') or ''
+    fmt = 'xlsx' if name.lower().endswith(('.xlsx', '.xlsm')) else 'csv'
+    if not format_available(fmt):
+        raise ImportError(f"Reading {FILE_FORMATS[fmt][0]} bus lists requires {FILE_FORMATS[fmt][1]}")
+
+    chunks = _xlsx_chunks(source, chunksize) if fmt == 'xlsx' else _csv_chunks(source, chunksize)
+    header, columns = next(chunks)
+
+    types, voltages = [], []
+    rows = skipped = 0
+    scale = None
+    for chunk in chunks:
+        rows += len(chunk)
+        kv = pd.to_numeric(chunk['voltage'], errors='coerce').to_numpy(np.float64) \
+            if 'voltage' in chunk else np.full(len(chunk), np.nan)
+        text = (chunk['type'] if 'type' in chunk else pd.Series('', index=chunk.index)).str.cat(
+            chunk['name'] if 'name' in chunk else pd.Series('', index=chunk.index), sep=' ').str.lower()
+
+        keep = np.isfinite(kv) | (text.str.strip() != '').to_numpy()
+        skipped += int((~keep).sum())
+        kv, text = kv[keep], text[keep]
+        if not len(kv):
+            continue
+        if scale is None and 'voltage' in columns:
+            scale = _voltage_scale(header[columns['voltage']], kv)
+        if scale is not None:
+            kv = kv * scale
+
+        types.append(classify_buses(text, kv))
+        voltages.append(kv.astype(np.float32))
+
+    bus_type = np.concatenate(types) if types else np.empty(0, dtype=np.int8)
+    kv = np.concatenate(voltages) if voltages else np.empty(0, dtype=np.float32)
+
+    # MV buses below the highest MV level are intermediate voltage switchgear
+    mv = bus_type == BUS_TYPES.index('mv_switchgear')
+    if mv.any() and np.isfinite(kv[mv]).any():
+        top_kv = np.nanmax(kv[mv])
+        bus_type[mv & (kv < top_kv)] = BUS_TYPES.index('intermediate')
+
+    return BusList(
+        bus_type=bus_type,
+        kv=kv,
+        rows=rows,
+        skipped=skipped,
+        columns={role: header[position] for role, position in columns.items()},
+    )
@@ -0,0 +1,80 @@
+"""
+Size-bounded LRU cache of priced quotes, shared across Streamlit sessions.
+
+Entries are keyed by the canonical input hash plus the rate-card version,
+so editing any factor table (base hours, category hours, tier complexity,
+report complexity, mechanical redundancy) makes every old entry unreachable;
+entries from a superseded rate card are also dropped eagerly.
+"""
+
+import threading
+from collections import OrderedDict
+
+from pss_engine import DEFAULT_RATE_CARD, price_quote, quote_input_hash, rate_card_version
+
+
+class QuoteCache:
+    """Thread-safe LRU of QuoteResult objects (treat returned results as read-only)."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._rate_card_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_price(self, inputs, rate_card=DEFAULT_RATE_CARD, span=None, price_fn=price_quote):
+        """
+        Return the cached QuoteResult for inputs, pricing and storing it on a miss.
+
+        span is passed to price_fn, so engine stages are only timed on misses.
+        price_fn defaults to price_quote; a session's IncrementalPricer.price
+        can be passed instead so a miss only recomputes the changed stages.
+        """
+        version = rate_card_version(rate_card)
+        key = (version, quote_input_hash(inputs))
+
+        with self._lock:
+            if version != self._rate_card_version:
+                # Factor tables changed: nothing priced on the old card is valid
+                self._entries = OrderedDict(
+                    (k, v) for k, v in self._entries.items() if k[0] == version
+                )
+                self._rate_card_version = version
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = price_fn(inputs, rate_card, span=span)
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Counters for the admin panel."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'rate_card_version': self._rate_card_version or rate_card_version(DEFAULT_RATE_CARD),
+            }
@@ -0,0 +1,324 @@
+"""
+Calibration of the rate card's hour tables against historical projects.
+
+A history file has one row per completed project: the quote inputs (the
+same columns as a pss_batch project list) plus the hours actually booked per
+study (actual_<study>_hours, e.g. actual_load_flow_hours). Optional columns:
+actual_buses (bus count of the final model) and, for projects priced from an
+imported bus list, the buses by type (<bus_type>_buses, as written by
+pss_batch).
+
+Quoted study hours are linear in the hour tables:
+
+    hours = (buses x base_hours_per_bus               standard pricing
+             or category buses . category_hours       competitive pricing
+             or buses by type . type_hours)           competitive, buses by type
+            x study factor x tier complexity
+
+so each study is an independent least-squares problem over at most 13
+coefficients, built and solved with NumPy over every project at once. The
+fit is weighted by 1 / actual hours, so it minimises percentage error rather
+than letting the largest projects dominate, and ridge-regularized towards
+the current rate card (worth --ridge projects): a coefficient no project
+exercises keeps its current value. Actual hours are compared with the hours before any hour reduction
+(a commercial discount, not part of the model).
+
+bus_calibration (the default offered for new quotes) is fitted the same way
+from actual_buses against the uncalibrated component estimate.
+
+Usage:
+    python pss_calibration.py history.csv
+    python pss_calibration.py history.csv --ridge 0.05 --json rate_card.json
+    python pss_calibration.py history.csv --publish --note "FY26 actuals" --user admin
+"""
+
+import argparse
+import dataclasses
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from pss_batch import quote_inputs_from_record
+from pss_engine import (
+    BUS_TYPES,
+    DEFAULT_RATE_CARD,
+    IMPORTED_BUS_METHOD,
+    PRICING_STAGES,
+    STUDY_KEYS,
+    STUDY_NAMES,
+    QuoteInputs,
+    RateCard,
+    price_quote_batch,
+    rate_card_to_json,
+    rate_card_version,
+)
+
+ACTUAL_COLUMNS = {study_key: f"actual_{study_key}_hours" for study_key in STUDY_KEYS}
+ACTUAL_BUSES_COLUMN = 'actual_buses'
+TYPE_COUNT_COLUMNS = {bus_type: f"{bus_type}_buses" for bus_type in BUS_TYPES}
+
+# Page slider range for bus_calibration
+CALIBRATION_RANGE = (0.5, 2.5)
+
+# QuoteInputs fields the hour model reads (bus count, split and study hours stages)
+HOUR_FIELDS = tuple(dict.fromkeys(
+    name for stage in PRICING_STAGES[:3] for name in stage.fields
+    if name not in ('studies_selected', 'imported_bus_counts')
+))
+
+CATEGORIES = ('it', 'mech', 'house')
+
+# Weight of the current rate card in the fit, in projects
+DEFAULT_RIDGE = 5.0
+
+
+@dataclass(frozen=True)
+class CalibrationFit:
+    """Fitted rate card plus before/after fit statistics."""
+
+    rate_card: RateCard     # prior card with the fitted tables
+    prior: RateCard         # card the fit was regularized towards
+    studies: pd.DataFrame   # per study: projects, MAPE / bias before and after
+    tiers: pd.DataFrame     # per tier: projects, total-hours residuals before and after
+    projects: pd.DataFrame  # per project: actual and predicted total hours
+    buses: dict             # bus_calibration fit: projects, MAPE before / after
+
+    @property
+    def version(self):
+        return rate_card_version(self.rate_card)
+
+    def summary(self):
+        """Plain-text report for the command line."""
+        lines = [f"Projects: {len(self.projects):,}  "
+                 f"rate card {rate_card_version(self.prior)} -> {self.version}"]
+        if self.buses['projects']:
+            lines.append(f"Bus calibration: {self.prior.bus_calibration:.3f} -> {self.rate_card.bus_calibration:.3f}"
+                         f"  (MAPE {self.buses['mape_before']:.1%} -> {self.buses['mape_after']:.1%},"
+                         f" {self.buses['projects']:,} projects)")
+        for title, table in (("Studies", self.studies), ("Residuals by tier", self.tiers)):
+            lines += ["", title, table.to_string(index=False, float_format=lambda value: f"{value:.3f}")]
+        return '\n'.join(lines)
+
+
+def read_history(source, filename=None):
+    """Historical projects from a CSV or Parquet path or file object."""
+    name = filename or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', ''))
+    if str(name).lower().endswith(('.parquet', '.pq')):
+        return pd.read_parquet(source)
+    return pd.read_csv(source)
+
+
+def _history_overrides(history):
+    """price_quote_batch overrides (one array element per project) from the history rows."""
+    records = history.to_dict('records')
+    inputs = [quote_inputs_from_record(record) for record in records]
+    overrides = {name: np.array([getattr(quote, name) for quote in inputs]) for name in HOUR_FIELDS}
+    overrides['studies_selected'] = {
+        study_key: np.array([quote.studies_selected[study_key] for quote in inputs]) for study_key in STUDY_KEYS
+    }
+    return overrides
+
+
+def _column(history, name, default=np.nan):
+    if name not in history:
+        return np.full(len(history), default, dtype=np.float64)
+    return pd.to_numeric(history[name], errors='coerce').to_numpy(np.float64)
+
+
+def _ridge(features, target, prior, ridge):
+    """
+    Weighted ridge solution of features @ coef ~= target, shrunk towards prior.
+
+    The prior counts as ridge typical projects: each coefficient's penalty is
+    ridge times the mean per-project weight of the projects that exercise it,
+    so the prior matters less as history grows. Coefficients without data
+    (all-zero feature columns) come out equal to prior.
+    """
+    weighted = features / target[:, None]
+    gram = weighted.T @ weighted
+    diagonal = np.diag(gram)
+    support = np.count_nonzero(weighted, axis=0)
+    penalty = np.where(support > 0, ridge * diagonal / np.maximum(support, 1), 1.0)
+    coef = np.linalg.solve(gram + np.diag(penalty), weighted.sum(axis=0) + penalty * prior)
+    return np.maximum(coef, 0.0)
+
+
+def _study_features(study_key, batch, overrides, by_type, type_counts, rate_card):
+    """Feature matrix (projects x coefficients) for one study, and the prior coefficients."""
+    scale = overrides[f"{study_key}_factor"] * batch['tier_complexity']
+    competitive = overrides['competitive_pricing'].astype(bool)
+    has_category = study_key in rate_card.category_hours
+    standard = ~competitive | (~by_type & ~has_category)
+    category = competitive & ~by_type & has_category
+    typed = competitive & by_type
+
+    features = np.zeros((len(scale), 1 + len(CATEGORIES) + len(BUS_TYPES)))
+    features[:, 0] = np.where(standard, batch['estimated_buses'], 0) * scale
+    for column, name in enumerate(CATEGORIES, start=1):
+        features[:, column] = np.where(category, batch[f"{name}_buses_est"], 0) * scale
+    features[:, 1 + len(CATEGORIES):] = np.where(typed[:, None], type_counts, 0) * scale[:, None]
+
+    base = rate_card.base_hours_per_bus[study_key]
+    category_hours = rate_card.category_hours.get(study_key, dict.fromkeys(CATEGORIES, base))
+    prior = np.array([base] + [category_hours[name] for name in CATEGORIES] +
+                     [rate_card.type_hours[study_key][bus_type] for bus_type in BUS_TYPES])
+    return features, prior
+
+
+def _fit_bus_calibration(history, overrides, by_type, rate_card, ridge):
+    """Fitted default bus_calibration and its before/after MAPE."""
+    actual = _column(history, ACTUAL_BUSES_COLUMN)
+    rows = np.isfinite(actual) & (actual > 0) & ~by_type
+    stats = {'projects': int(rows.sum()), 'mape_before': np.nan, 'mape_after': np.nan}
+    if not rows.any():
+        return rate_card.bus_calibration, stats
+
+    # Uncalibrated component estimate; minimise sum((c * raw / actual - 1)^2)
+    raw = price_quote_batch(QuoteInputs(), rate_card, **{**overrides, 'bus_calibration': 1.0})['estimated_buses']
+    ratio = raw[rows] / actual[rows]
+    penalty = ridge * np.mean(ratio ** 2)
+    calibration = (ratio.sum() + penalty * rate_card.bus_calibration) / ((ratio ** 2).sum() + penalty)
+    calibration = float(np.clip(calibration, *CALIBRATION_RANGE))
+
+    def mape(factor):
+        return float(np.mean(np.abs(np.maximum(1, np.ceil(raw[rows] * factor)) / actual[rows] - 1)))
+
+    stats.update(mape_before=mape(rate_card.bus_calibration), mape_after=mape(calibration))
+    return calibration, stats
+
+
+def fit_rate_card(history, rate_card=DEFAULT_RATE_CARD, ridge=DEFAULT_RIDGE):
+    """
+    Fit bus_calibration, base_hours_per_bus, category_hours and type_hours
+    to historical actuals.
+
+    Args:
+        history (pd.DataFrame): One row per project (see module docstring)
+        rate_card (RateCard): Current card; the prior for the ridge penalty
+        ridge (float): Weight of the current card, in projects
+            (0 = plain weighted least squares)
+
+    Returns:
+        CalibrationFit
+    """
+    if not any(column in history for column in ACTUAL_COLUMNS.values()):
+        raise ValueError(f"No actual hours columns found (expected e.g. '{ACTUAL_COLUMNS['load_flow']}')")
+
+    overrides = _history_overrides(history)
+    batch = price_quote_batch(QuoteInputs(), rate_card, **overrides)
+
+    # Buses by type: topology projects from the engine, imported lists from the history
+    method = overrides['bus_method']
+    history_types = np.column_stack([_column(history, TYPE_COUNT_COLUMNS[bus_type], 0.0) for bus_type in BUS_TYPES])
+    history_types = np.nan_to_num(history_types)
+    imported = (method == IMPORTED_BUS_METHOD) & (history_types.sum(axis=1) > 0)
+    topology = method == "Topology"
+    type_counts = np.zeros_like(history_types)
+    if batch['bus_type_counts']:
+        type_counts = np.column_stack([np.broadcast_to(batch['bus_type_counts'][bus_type], len(history))
+                                       for bus_type in BUS_TYPES]).astype(np.float64)
+    type_counts = np.where(imported[:, None], history_types, type_counts)
+    by_type = topology | imported
+    batch['estimated_buses'] = np.where(imported, np.maximum(1, history_types.sum(axis=1)), batch['estimated_buses'])
+
+    calibration, bus_stats = _fit_bus_calibration(history, overrides, by_type, rate_card, ridge)
+
+    base_hours = dict(rate_card.base_hours_per_bus)
+    category_hours = {key: dict(hours) for key, hours in rate_card.category_hours.items()}
+    type_hours = {key: dict(hours) for key, hours in rate_card.type_hours.items()}
+    study_rows = []
+    actual_total = np.zeros(len(history))
+    before_total = np.zeros(len(history))
+    after_total = np.zeros(len(history))
+
+    for study_key in STUDY_KEYS:
+        actual = _column(history, ACTUAL_COLUMNS[study_key])
+        rows = (np.isfinite(actual) & (actual > 0) &
+                np.broadcast_to(overrides['studies_selected'][study_key], len(history)))
+        features, prior = _study_features(study_key, batch, overrides, by_type, type_counts, rate_card)
+        usable = rows & (features.sum(axis=1) > 0)
+        coef = _ridge(features[usable], actual[usable], prior, ridge) if usable.any() else prior
+
+        base_hours[study_key] = float(coef[0])
+        if study_key in category_hours:
+            category_hours[study_key] = {name: float(value) for name, value in zip(CATEGORIES, coef[1:4])}
+        type_hours[study_key] = {bus_type: float(value) for bus_type, value in zip(BUS_TYPES, coef[4:])}
+
+        before, after = features @ prior, features @ coef
+        error_before = before[usable] / actual[usable] - 1
+        error_after = after[usable] / actual[usable] - 1
+        study_rows.append({
+            'Study': STUDY_NAMES[study_key],
+            'Projects': int(usable.sum()),
+            'MAPE Before': float(np.mean(np.abs(error_before))) if usable.any() else np.nan,
+            'MAPE After': float(np.mean(np.abs(error_after))) if usable.any() else np.nan,
+            'Bias Before': float(np.mean(error_before)) if usable.any() else np.nan,
+            'Bias After': float(np.mean(error_after)) if usable.any() else np.nan,
+        })
+        actual_total += np.where(usable, actual, 0.0)
+        before_total += np.where(usable, before, 0.0)
+        after_total += np.where(usable, after, 0.0)
+
+    fitted = dataclasses.replace(rate_card, base_hours_per_bus=base_hours, category_hours=category_hours,
+                                 type_hours=type_hours, bus_calibration=calibration)
+
+    projects = pd.DataFrame({
+        'project_name': [str(name) for name in history.get('project_name', history.index)],
+        'tier_level': overrides['tier_level'],
+        'actual_hours': actual_total,
+        'predicted_before': before_total,
+        'predicted_after': after_total,
+    })[actual_total > 0].reset_index(drop=True)
+    projects['residual_before'] = projects['predicted_before'] / projects['actual_hours'] - 1
+    projects['residual_after'] = projects['predicted_after'] / projects['actual_hours'] - 1
+
+    tiers = projects.groupby('tier_level', sort=True).agg(
+        Projects=('actual_hours', 'size'),
+        **{'Mean Residual Before': ('residual_before', 'mean'),
+           'Mean Residual After': ('residual_after', 'mean'),
+           'MAPE Before': ('residual_before', lambda residual: residual.abs().mean()),
+           'MAPE After': ('residual_after', lambda residual: residual.abs().mean())}
+    ).reset_index().rename(columns={'tier_level': 'Tier'})
+
+    return CalibrationFit(rate_card=fitted, prior=rate_card, studies=pd.DataFrame(study_rows),
+                          tiers=tiers, projects=projects, buses=bus_stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit rate-card hour tables to historical project actuals.")
+    parser.add_argument("history", help="Historical projects (.csv or .parquet)")
+    parser.add_argument("--ridge", type=float, default=DEFAULT_RIDGE,
+                        help=f"Weight of the current card, in projects (default: {DEFAULT_RIDGE})")
+    parser.add_argument("--json", help="Write the fitted rate card to this JSON file")
+    parser.add_argument("--publish", action="store_true", help="Publish the fitted card to the quote database and make it active")
+    parser.add_argument("--db", help="Quote database whose active card is fitted against and published to "
+                                     "(default with --publish: PSS_QUOTE_DB or quotes.db)")
+    parser.add_argument("--user", default=None, help="Username recorded with a published card")
+    parser.add_argument("--note", default="", help="Note recorded with a published card")
+    args = parser.parse_args(argv)
+
+    store = None
+    rate_card = DEFAULT_RATE_CARD
+    if args.publish or args.db:
+        from pss_store import DEFAULT_DB_PATH, QuoteStore
+        store = QuoteStore(args.db or DEFAULT_DB_PATH)
+        rate_card = store.active_rate_card() or DEFAULT_RATE_CARD
+
+    fit = fit_rate_card(read_history(args.history), rate_card, ridge=args.ridge)
+    print(fit.summary())
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            handle.write(rate_card_to_json(fit.rate_card))
+        print(f"\nWrote rate card {fit.version} -> {args.json}", file=sys.stderr)
+    if store is not None:
+        store.publish_rate_card(fit.rate_card, username=args.user, note=args.note)
+        print(f"\nPublished and activated rate card {fit.version}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
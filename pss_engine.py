@@ -0,0 +1,1650 @@
+"""
+Headless pricing engine for the DC Power System Studies Cost Estimator.
+
+All of the estimating math lives here so it can be driven from the Streamlit
+page, batch jobs, services and benchmarks without booting a Streamlit session.
+"""
+
+import contextlib
+import dataclasses
+import hashlib
+import json
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RATE CARD (FACTOR TABLES)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+STUDY_KEYS = ('load_flow', 'short_circuit', 'pdc', 'arc_flash', 'harmonics', 'transient')
+
+STUDY_NAMES = {
+    'load_flow': 'Load Flow Study',
+    'short_circuit': 'Short Circuit Study',
+    'pdc': 'Protective Device Coordination',
+    'arc_flash': 'Arc Flash Study',
+    'harmonics': 'Harmonics Study',
+    'transient': 'Transient Analysis'
+}
+
+TIER_LEVELS = ("Tier I", "Tier II", "Tier III", "Tier IV")
+
+# Integer tier codes used by the vectorized functions (0 = unrecognised tier)
+TIER_CODES = {"Tier I": 1, "Tier II": 2, "Tier III": 3, "Tier IV": 4}
+
+# Mechanical redundancy multiplier (competitive pricing)
+MECH_REDUNDANCY_FACTORS = {"N": 1.0, "N+1": 1.25, "N+N": 2.0, "2N": 2.0}
+
+
+@dataclass(frozen=True)
+class RateCard:
+    """Factor tables that turn bus counts into manhours and report costs."""
+
+    # Standard base hours (non-competitive)
+    base_hours_per_bus: dict = field(default_factory=lambda: {
+        'load_flow': 2.5,
+        'short_circuit': 3.0,
+        'pdc': 4.0,
+        'arc_flash': 3.5,
+        'harmonics': 4.0,
+        'transient': 5.0
+    })
+
+    # Category-wise base hours (for competitive pricing)
+    category_hours: dict = field(default_factory=lambda: {
+        'load_flow': {'it': 0.3, 'mech': 0.4, 'house': 0.6},
+        'short_circuit': {'it': 0.3, 'mech': 0.4, 'house': 0.7},
+        'pdc': {'it': 0.5, 'mech': 0.6, 'house': 0.65},
+        'arc_flash': {'it': 0.4, 'mech': 0.5, 'house': 0.5},
+        'harmonics': {'it': 0.5, 'mech': 0.6, 'house': 0.6},
+        'transient': {'it': 0.8, 'mech': 1.3, 'house': 0.7}
+    })
+
+    # Competitive hours per bus by BUS_TYPES entry, used in place of
+    # category_hours when buses are counted by type (topology / imported list)
+    type_hours: dict = field(default_factory=lambda: {
+        'load_flow': {'mv_switchgear': 0.6, 'generator': 0.5, 'intermediate': 0.6, 'transformer': 0.4,
+                      'lv_it_pcc': 0.3, 'lv_mech_mcc': 0.4, 'lv_house_pcc': 0.6, 'ups_output': 0.3, 'pdu': 0.2},
+        'short_circuit': {'mv_switchgear': 0.8, 'generator': 0.7, 'intermediate': 0.8, 'transformer': 0.5,
+                          'lv_it_pcc': 0.4, 'lv_mech_mcc': 0.4, 'lv_house_pcc': 0.7, 'ups_output': 0.3, 'pdu': 0.2},
+        'pdc': {'mv_switchgear': 1.0, 'generator': 0.9, 'intermediate': 0.9, 'transformer': 0.6,
+                'lv_it_pcc': 0.6, 'lv_mech_mcc': 0.6, 'lv_house_pcc': 0.65, 'ups_output': 0.5, 'pdu': 0.3},
+        'arc_flash': {'mv_switchgear': 0.7, 'generator': 0.5, 'intermediate': 0.7, 'transformer': 0.5,
+                      'lv_it_pcc': 0.5, 'lv_mech_mcc': 0.5, 'lv_house_pcc': 0.5, 'ups_output': 0.4, 'pdu': 0.3},
+        'harmonics': {'mv_switchgear': 0.5, 'generator': 0.6, 'intermediate': 0.5, 'transformer': 0.4,
+                      'lv_it_pcc': 0.5, 'lv_mech_mcc': 0.6, 'lv_house_pcc': 0.6, 'ups_output': 0.8, 'pdu': 0.4},
+        'transient': {'mv_switchgear': 1.5, 'generator': 1.5, 'intermediate': 1.2, 'transformer': 1.0,
+                      'lv_it_pcc': 0.8, 'lv_mech_mcc': 1.3, 'lv_house_pcc': 0.7, 'ups_output': 0.9, 'pdu': 0.4}
+    })
+
+    # Study complexity factors
+    tier_complexity_factors: dict = field(default_factory=lambda: {
+        "Tier I": 1.0, "Tier II": 1.2, "Tier III": 1.5, "Tier IV": 2.0
+    })
+
+    # Report complexity multipliers
+    complexity_multipliers: dict = field(default_factory=lambda: {
+        "Basic": 0.8, "Standard": 1.0, "Premium": 1.3
+    })
+
+    # Default bus count calibration offered for new quotes
+    bus_calibration: float = 1.0
+
+
+DEFAULT_RATE_CARD = RateCard()
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# QUOTE INPUTS & BREAKDOWN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def _default_studies():
+    return {
+        'load_flow': True,
+        'short_circuit': True,
+        'pdc': True,
+        'arc_flash': True,
+        'harmonics': False,
+        'transient': False
+    }
+
+
+def _default_allocation():
+    return {'senior': 20, 'mid': 30, 'junior': 50}
+
+
+def normalize_work_allocation(work_allocation):
+    """Rescale senior/mid/junior percentages so they sum to 100 (as the page does)."""
+    total_allocation = sum(work_allocation.values())
+    if total_allocation != 100:
+        factor = 100 / total_allocation
+        return {key: round(value * factor, 1) for key, value in work_allocation.items()}
+    return dict(work_allocation)
+
+
+@dataclass
+class QuoteInputs:
+    """Everything the estimator page collects for one quote (page defaults)."""
+
+    # Project information
+    project_name: str = "Project-Alpha"
+    tier_level: str = "Tier IV"
+    it_capacity: float = 10.0
+    mechanical_load: float = 7.0
+    house_load: float = 3.0
+    delivery_type: str = "Standard"
+    report_complexity: str = "Standard"
+    client_meetings: int = 3
+
+    # Customer information
+    customer_type: str = "New Customer"
+    repeat_discount: float = 0
+    custom_margin: float = 15
+    pue_value: float = 1.4
+
+    # Competitive pricing
+    competitive_pricing: bool = False
+    mech_redundancy: str = "N+1"
+
+    # Bus count configuration (standard block sizes)
+    ups_lineup: float = 1.0
+    transformer_mva: float = 2.0
+    lv_bus_mw: float = 2.0
+    pdu_mva: float = 0.3
+    power_factor: float = 0.95
+    bus_calibration: float = 1.0
+
+    # Single-line parameters; "Topology" enumerates buses by type from them
+    bus_method: str = "Component Estimate"
+    utility_incomers: int = 1
+    voltage_levels: int = 2
+    backup_gens: int = 0
+    expansion_factor: float = 1.0
+
+    # Buses per BUS_TYPES entry from an imported bus list (IMPORTED_BUS_METHOD)
+    imported_bus_counts: dict = field(default_factory=dict)
+
+    # Model type
+    hour_reduction: float = 0
+
+    # Studies and work allocation (percent)
+    studies_selected: dict = field(default_factory=_default_studies)
+    work_allocation: dict = field(default_factory=_default_allocation)
+
+    # Rates and study factors
+    senior_rate: float = 2200
+    mid_rate: float = 1200
+    junior_rate: float = 800
+    load_flow_factor: float = 1.0
+    short_circuit_factor: float = 1.0
+    pdc_factor: float = 1.0
+    arc_flash_factor: float = 1.0
+    harmonics_factor: float = 1.2
+    transient_factor: float = 1.3
+    urgency_multiplier: float = 1.3
+    meeting_cost: float = 8000
+
+    # Report costs
+    load_flow_report_cost: float = 8000
+    short_circuit_report_cost: float = 10000
+    pdc_report_cost: float = 15000
+    arc_flash_report_cost: float = 12000
+    harmonics_report_cost: float = 11000
+    transient_report_cost: float = 13000
+
+    # Additional services
+    site_visit_enabled: bool = True
+    site_visits: int = 2
+    site_visit_cost: float = 12000
+    af_labels_enabled: bool = False
+    num_labels: int = 0
+    cost_per_label: float = 0
+    stickering_enabled: bool = False
+    stickering_cost: float = 0
+    custom_charges_desc: str = "Additional Services"
+    custom_charges_cost: float = 0
+
+    # Custom cost sections
+    custom_cost_1_desc: str = "Custom Engineering Services"
+    custom_cost_1_amount: float = 0
+    custom_cost_2_desc: str = "Specialized Testing & Validation"
+    custom_cost_2_amount: float = 0
+
+    scope_description: str = ""
+
+    def study_factor(self, study_key):
+        """Complexity factor slider value for one study."""
+        return getattr(self, f"{study_key}_factor")
+
+    def report_cost(self, study_key):
+        """Report cost input for one study."""
+        return getattr(self, f"{study_key}_report_cost")
+
+
+# Free-text fields that never change the price
+NON_PRICING_FIELDS = ('project_name', 'scope_description', 'custom_charges_desc',
+                      'custom_cost_1_desc', 'custom_cost_2_desc')
+
+
+def _canonical(value):
+    """Normalise values so equal quotes hash equally (e.g. 10 and 10.0)."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    return float(value)
+
+
+def quote_input_hash(inputs, exclude=NON_PRICING_FIELDS):
+    """Stable SHA-256 of the quote inputs, ignoring the excluded fields."""
+    values = dataclasses.asdict(inputs)
+    for name in exclude:
+        values.pop(name, None)
+    canonical = json.dumps(_canonical(values), sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def rate_card_version(rate_card=DEFAULT_RATE_CARD):
+    """Content hash of every factor table; changes whenever any table changes."""
+    tables = _canonical(dataclasses.asdict(rate_card))
+    tables['mech_redundancy_factors'] = _canonical(MECH_REDUNDANCY_FACTORS)
+    canonical = json.dumps(tables, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+def rate_card_to_json(rate_card=DEFAULT_RATE_CARD):
+    """Every factor table as JSON, with the card's version for reference."""
+    tables = _canonical(dataclasses.asdict(rate_card))
+    tables['version'] = rate_card_version(rate_card)
+    return json.dumps(tables, indent=2, sort_keys=True)
+
+
+def rate_card_from_json(text):
+    """
+    RateCard from rate_card_to_json output.
+
+    Tables missing from the JSON keep their defaults; a "version" key is
+    ignored (the version is always recomputed from the tables).
+    """
+    tables = json.loads(text)
+    names = {f.name for f in dataclasses.fields(RateCard)}
+    unknown = set(tables) - names - {'version'}
+    if unknown:
+        raise ValueError(f"Unknown rate card tables: {', '.join(sorted(unknown))}")
+    return RateCard(**{name: value for name, value in tables.items() if name in names})
+
+
+@dataclass
+class QuoteResult:
+    """Full cost breakdown for one quote."""
+
+    estimated_buses: int
+    it_buses_est: int
+    mech_buses_est: int
+    house_buses_est: int
+    tier_complexity: float
+
+    study_manhours: dict
+    total_manhours: float
+    hours_reduced: float
+
+    senior_hours: float
+    mid_hours: float
+    junior_hours: float
+    senior_cost: float
+    mid_cost: float
+    junior_cost: float
+    total_labor_cost: float
+
+    report_costs: dict
+    complexity_multiplier: float
+    total_report_cost: float
+    study_labor_costs: dict
+    study_report_costs: dict
+
+    total_site_visit_cost: float
+    total_label_cost: float
+    total_stickering_cost: float
+    total_meeting_cost: float
+    total_custom_cost: float
+
+    subtotal_before_adjustments: float
+    urgency_cost: float
+    subtotal_after_urgency: float
+    discount_amount: float
+    subtotal_after_discount: float
+    margin_amount: float
+    final_total_cost: float
+
+    # Buses per BUS_TYPES entry (topology and imported bus list methods)
+    bus_type_counts: dict = field(default_factory=dict)
+    # Selected study -> bus type -> hours, when bus_type_counts is set
+    study_type_hours: dict = field(default_factory=dict)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ACCURATE BUS COUNT CALCULATION FUNCTION (FROM DC_BUS_QUANTITY_ESTIMATER)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def calculate_bus_count_accurate(
+    it_capacity,
+    mechanical_load,
+    house_load,
+    tier_level,
+    pue=1.56,
+    mech_fraction=0.70,
+    ups_lineup=1.5,
+    transformer_mva=3.0,
+    lv_bus_mw=3.0,
+    pdu_mva=0.3,
+    mv_base=2,
+    utility_incomers=1,
+    power_factor=0.95,
+    voltage_levels=2,
+    backup_gens=0,
+    expansion_factor=1.0,
+    bus_calibration=1.0
+):
+    """
+    Calculate bus count using component-by-component engineering method.
+    Integrated from DC_Bus_Quantity_Estimater with calibration factor.
+
+    Returns:
+        int: Estimated bus count (rounded up)
+    """
+
+    # ─────────────────────────────────────────────────────────────────────
+    # PHASE 1: LOAD DERIVATION (CORRECT METHOD)
+    # ─────────────────────────────────────────────────────────────────────
+    calc_total_mw = pue * it_capacity
+    calc_it_mw = it_capacity
+    non_it_mw = calc_total_mw - calc_it_mw
+
+    mech_mw = mech_fraction * non_it_mw
+    house_mw = non_it_mw - mech_mw
+
+    # ─────────────────────────────────────────────────────────────────────
+    # PHASE 2: COMPONENT COUNTING (EQUIPMENT-BASED)
+    # ─────────────────────────────────────────────────────────────────────
+
+    lv_it_pcc = math.ceil(calc_it_mw / lv_bus_mw)
+    lv_mech_mcc = math.ceil(mech_mw / lv_bus_mw)
+    lv_house_pcc = math.ceil(house_mw / lv_bus_mw)
+    lv_total = lv_it_pcc + lv_mech_mcc + lv_house_pcc
+
+    ups_lineups = math.ceil(calc_it_mw / ups_lineup)
+    ups_output_buses = ups_lineups
+
+    pdus_total = math.ceil(calc_it_mw / pdu_mva)
+
+    tx_count_n = math.ceil(calc_total_mw / (transformer_mva * power_factor))
+
+    mv_buses = mv_base + (utility_incomers - 1)
+
+    voltage_additions = 0
+    if voltage_levels > 2:
+        voltage_additions = (voltage_levels - 2) * (tx_count_n + 1)
+
+    generator_additions = backup_gens * 2 if backup_gens > 0 else 0
+
+    # ─────────────────────────────────────────────────────────────────────
+    # PHASE 3: REDUNDANCY MODELING (TIER-BASED)
+    # ─────────────────────────────────────────────────────────────────────
+
+    buses_core_n = (mv_buses + tx_count_n + lv_total +
+                   ups_output_buses + pdus_total +
+                   voltage_additions + generator_additions)
+
+    if tier_level == "Tier I":
+        total_buses = buses_core_n * expansion_factor
+
+    elif tier_level == "Tier II":
+        tx_count_adj = tx_count_n + 1
+        buses_adj = (mv_buses + tx_count_adj + lv_total +
+                    ups_output_buses + pdus_total +
+                    voltage_additions + generator_additions)
+        total_buses = buses_adj * expansion_factor * 1.10
+
+    elif tier_level == "Tier III":
+        tx_count_adj = tx_count_n + 1
+        buses_adj = (mv_buses + tx_count_adj + lv_total +
+                    ups_output_buses + pdus_total +
+                    voltage_additions + generator_additions)
+        total_buses = buses_adj * expansion_factor * 1.15
+
+    elif tier_level == "Tier IV":
+        mv_2n = mv_buses * 2
+        tx_2n = tx_count_n * 2
+        lv_2n = lv_total * 2
+        ups_2n = ups_output_buses * 2
+        pdus_2n = int(pdus_total * 1.5)
+        extras_2n = (voltage_additions + generator_additions) * 2
+
+        buses_2n = mv_2n + tx_2n + lv_2n + ups_2n + pdus_2n + extras_2n
+        total_buses = buses_2n * expansion_factor
+
+    else:
+        tx_count_adj = tx_count_n + 1
+        buses_adj = (mv_buses + tx_count_adj + lv_total +
+                    ups_output_buses + pdus_total +
+                    voltage_additions + generator_additions)
+        total_buses = buses_adj * expansion_factor * 1.15
+
+    # Apply calibration factor
+    total_buses = total_buses * bus_calibration
+
+    return max(1, math.ceil(total_buses))
+
+def tier_codes(tier_levels):
+    """Map tier labels (e.g. "Tier III") to integer codes for batch functions."""
+    tier_levels = np.asarray(tier_levels)
+    codes = [TIER_CODES.get(t, 0) for t in tier_levels.ravel().tolist()]
+    return np.array(codes, dtype=np.int64).reshape(tier_levels.shape)
+
+
+def calculate_bus_count_batch(
+    it_capacity,
+    tier_code,
+    pue=1.56,
+    mech_fraction=0.70,
+    ups_lineup=1.5,
+    transformer_mva=3.0,
+    lv_bus_mw=3.0,
+    pdu_mva=0.3,
+    mv_base=2,
+    utility_incomers=1,
+    power_factor=0.95,
+    voltage_levels=2,
+    backup_gens=0,
+    expansion_factor=1.0,
+    bus_calibration=1.0
+):
+    """
+    Vectorized calculate_bus_count_accurate over NumPy arrays.
+
+    Every argument may be a scalar or an array; they are broadcast together.
+    tier_code uses TIER_CODES (1-4); any other code follows the fallback
+    branch of the scalar function. The float operations are performed in the
+    same order as the scalar version so results are identical bit for bit.
+
+    Returns:
+        np.ndarray: Estimated bus counts (int64)
+    """
+    it_capacity = np.asarray(it_capacity, dtype=np.float64)
+    tier_code = np.asarray(tier_code)
+    if tier_code.dtype.kind in 'USO':
+        tier_code = tier_codes(tier_code)
+
+    # PHASE 1: LOAD DERIVATION
+    calc_total_mw = np.multiply(pue, it_capacity)
+    calc_it_mw = it_capacity
+    non_it_mw = calc_total_mw - calc_it_mw
+
+    mech_mw = np.multiply(mech_fraction, non_it_mw)
+    house_mw = non_it_mw - mech_mw
+
+    # PHASE 2: COMPONENT COUNTING
+    lv_total = (np.ceil(calc_it_mw / lv_bus_mw).astype(np.int64) +
+                np.ceil(mech_mw / lv_bus_mw).astype(np.int64) +
+                np.ceil(house_mw / lv_bus_mw).astype(np.int64))
+
+    ups_output_buses = np.ceil(calc_it_mw / ups_lineup).astype(np.int64)
+
+    pdus_total = np.ceil(calc_it_mw / pdu_mva).astype(np.int64)
+
+    tx_count_n = np.ceil(calc_total_mw / np.multiply(transformer_mva, power_factor)).astype(np.int64)
+
+    mv_buses = np.asarray(mv_base) + (np.asarray(utility_incomers) - 1)
+
+    voltage_levels = np.asarray(voltage_levels)
+    voltage_additions = np.where(voltage_levels > 2, (voltage_levels - 2) * (tx_count_n + 1), 0)
+
+    backup_gens = np.asarray(backup_gens)
+    generator_additions = np.where(backup_gens > 0, backup_gens * 2, 0)
+
+    # PHASE 3: REDUNDANCY MODELING
+    extras = voltage_additions + generator_additions
+    common = lv_total + ups_output_buses + pdus_total + extras
+
+    buses_core_n = mv_buses + tx_count_n + common
+    buses_adj = mv_buses + (tx_count_n + 1) + common
+    buses_2n = (mv_buses * 2 + tx_count_n * 2 + lv_total * 2 + ups_output_buses * 2 +
+                np.trunc(pdus_total * 1.5).astype(np.int64) + extras * 2)
+
+    total_buses = np.select(
+        [tier_code == 1, tier_code == 2, tier_code == 4],
+        [buses_core_n * expansion_factor,
+         buses_adj * expansion_factor * 1.10,
+         buses_2n * expansion_factor],
+        default=buses_adj * expansion_factor * 1.15
+    )
+
+    # Apply calibration factor
+    total_buses = total_buses * bus_calibration
+
+    return np.maximum(1, np.ceil(total_buses)).astype(np.int64)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COMPETITIVE PRICING: CATEGORY-WISE BUS SPLIT
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def split_category_buses(estimated_buses, it_mw, mech_mw, house_mw, mech_redundancy):
+    """
+    Split the total bus count into IT, mechanical and house categories.
+
+    Returns:
+        tuple: (it_buses_est, mech_buses_est, house_buses_est)
+    """
+    total_mw = it_mw + mech_mw + house_mw
+
+    if total_mw > 0:
+        # Proportional base split
+        base_it_buses = estimated_buses * (it_mw / total_mw)
+        base_mech_buses = estimated_buses * (mech_mw / total_mw)
+        base_house_buses = estimated_buses * (house_mw / total_mw)
+
+        # Mechanical redundancy multiplier
+        mech_factor = MECH_REDUNDANCY_FACTORS.get(mech_redundancy, 1.25)
+        mech_buses_est = base_mech_buses * mech_factor
+
+        # House load formula: 50 buses per MW + 35% increase
+        if house_mw > 0:
+            base_house_buses_rule = 50 * house_mw * 1.35
+            house_buses_est = max(base_house_buses, base_house_buses_rule)
+        else:
+            house_buses_est = 0
+
+        # IT buses
+        it_buses_est = max(1, round(base_it_buses))
+        mech_buses_est = max(0, round(mech_buses_est))
+        house_buses_est = max(0, round(house_buses_est))
+
+        # Scale to match total
+        category_total = it_buses_est + mech_buses_est + house_buses_est
+        if category_total > 0:
+            scale = estimated_buses / category_total
+            it_buses_est = max(1, round(it_buses_est * scale))
+            mech_buses_est = max(0, round(mech_buses_est * scale))
+            house_buses_est = max(0, round(house_buses_est * scale))
+
+            # Final correction
+            delta = estimated_buses - (it_buses_est + mech_buses_est + house_buses_est)
+            house_buses_est += delta
+    else:
+        it_buses_est = estimated_buses
+        mech_buses_est = 0
+        house_buses_est = 0
+
+    return it_buses_est, mech_buses_est, house_buses_est
+
+def split_category_buses_batch(estimated_buses, it_mw, mech_mw, house_mw, mech_factor):
+    """
+    Vectorized split_category_buses; mech_factor is the numeric redundancy
+    multiplier (see MECH_REDUNDANCY_FACTORS) rather than its label.
+
+    Returns:
+        tuple: (it_buses_est, mech_buses_est, house_buses_est) as int64 arrays
+    """
+    estimated_buses, it_mw, mech_mw, house_mw, mech_factor = np.broadcast_arrays(
+        np.asarray(estimated_buses, dtype=np.int64),
+        np.asarray(it_mw, dtype=np.float64),
+        np.asarray(mech_mw, dtype=np.float64),
+        np.asarray(house_mw, dtype=np.float64),
+        np.asarray(mech_factor, dtype=np.float64)
+    )
+    total_mw = it_mw + mech_mw + house_mw
+    positive = total_mw > 0
+    safe_total = np.where(positive, total_mw, 1.0)
+
+    # Proportional base split
+    base_it_buses = estimated_buses * (it_mw / safe_total)
+    base_mech_buses = estimated_buses * (mech_mw / safe_total)
+    base_house_buses = estimated_buses * (house_mw / safe_total)
+
+    mech_buses_est = base_mech_buses * mech_factor
+    house_buses_est = np.where(house_mw > 0, np.maximum(base_house_buses, 50 * house_mw * 1.35), 0.0)
+
+    # np.round is round-half-to-even, the same as Python's round()
+    it_buses_est = np.maximum(1, np.round(base_it_buses))
+    mech_buses_est = np.maximum(0, np.round(mech_buses_est))
+    house_buses_est = np.maximum(0, np.round(house_buses_est))
+
+    # Scale to match total
+    category_total = it_buses_est + mech_buses_est + house_buses_est
+    scalable = category_total > 0
+    scale = estimated_buses / np.where(scalable, category_total, 1.0)
+    it_scaled = np.maximum(1, np.round(it_buses_est * scale))
+    mech_scaled = np.maximum(0, np.round(mech_buses_est * scale))
+    house_scaled = np.maximum(0, np.round(house_buses_est * scale))
+    house_scaled = house_scaled + (estimated_buses - (it_scaled + mech_scaled + house_scaled))
+
+    it_buses_est = np.where(scalable, it_scaled, it_buses_est)
+    mech_buses_est = np.where(scalable, mech_scaled, mech_buses_est)
+    house_buses_est = np.where(scalable, house_scaled, house_buses_est)
+
+    return (np.where(positive, it_buses_est, estimated_buses).astype(np.int64),
+            np.where(positive, mech_buses_est, 0).astype(np.int64),
+            np.where(positive, house_buses_est, 0).astype(np.int64))
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TOPOLOGY-BASED BUS ENUMERATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+BUS_METHODS = ("Component Estimate", "Topology")
+
+# Bus counts taken from an imported ETAP / SKM bus list (see pss_buslist)
+IMPORTED_BUS_METHOD = "Imported Bus List"
+
+BUS_TYPES = ('mv_switchgear', 'generator', 'intermediate', 'transformer',
+             'lv_it_pcc', 'lv_mech_mcc', 'lv_house_pcc', 'ups_output', 'pdu')
+
+BUS_TYPE_NAMES = {
+    'mv_switchgear': 'MV Switchgear',
+    'generator': 'Generator',
+    'intermediate': 'Intermediate Voltage',
+    'transformer': 'Transformer Secondary',
+    'lv_it_pcc': 'LV IT PCC',
+    'lv_mech_mcc': 'LV Mechanical MCC',
+    'lv_house_pcc': 'LV House PCC',
+    'ups_output': 'UPS Output',
+    'pdu': 'PDU',
+}
+
+# Competitive-pricing category for each bus type; site-wide distribution
+# (MV, generation, transformation) is priced at house rates
+BUS_TYPE_CATEGORY = {
+    'mv_switchgear': 'house',
+    'generator': 'house',
+    'intermediate': 'house',
+    'transformer': 'house',
+    'lv_it_pcc': 'it',
+    'lv_mech_mcc': 'mech',
+    'lv_house_pcc': 'house',
+    'ups_output': 'it',
+    'pdu': 'it',
+}
+
+
+@dataclass(frozen=True)
+class RedundancyScheme:
+    """How a tier duplicates the single-line diagram."""
+
+    paths: int                # full A/B distribution paths (transformers, IT PCCs, UPS)
+    mv_paths: int             # MV switchgear line-ups
+    spare_transformers: int   # N+1 transformers
+    spare_ups: int            # N+1 UPS line-ups
+    pdu_factor: float         # PDUs per IT-load PDU (dual-corded distribution)
+
+
+TIER_SCHEMES = {
+    "Tier I": RedundancyScheme(paths=1, mv_paths=1, spare_transformers=0, spare_ups=0, pdu_factor=1.0),
+    "Tier II": RedundancyScheme(paths=1, mv_paths=1, spare_transformers=1, spare_ups=1, pdu_factor=1.0),
+    "Tier III": RedundancyScheme(paths=1, mv_paths=2, spare_transformers=1, spare_ups=1, pdu_factor=1.0),
+    "Tier IV": RedundancyScheme(paths=2, mv_paths=2, spare_transformers=0, spare_ups=0, pdu_factor=1.5),
+}
+
+
+def _scheme_values(attr, tier_code):
+    # Unrecognised tiers follow Tier III, like calculate_bus_count_accurate
+    table = [getattr(TIER_SCHEMES["Tier III"], attr)]
+    table += [getattr(TIER_SCHEMES[label], attr) for label in TIER_LEVELS]
+    return np.asarray(table)[tier_code]
+
+
+def topology_bus_counts(
+    it_capacity,
+    mechanical_load,
+    house_load,
+    tier_code,
+    pue=1.56,
+    mech_fraction=0.70,
+    mech_factor=1.25,
+    ups_lineup=1.5,
+    transformer_mva=3.0,
+    lv_bus_mw=3.0,
+    pdu_mva=0.3,
+    mv_base=2,
+    utility_incomers=1,
+    power_factor=0.95,
+    voltage_levels=2,
+    backup_gens=0,
+    expansion_factor=1.0
+):
+    """
+    Bus counts by type of the single-line diagram build_topology generates.
+
+    Unlike calculate_bus_count_accurate this uses the entered mechanical and
+    house loads (falling back to the PUE split when both are zero), the tier's
+    RedundancyScheme, and every line-up parameter. expansion_factor scales
+    the loads the topology is sized for. Arguments may be scalars or arrays
+    and are broadcast together; tier_code uses TIER_CODES or labels.
+
+    Returns:
+        dict: BUS_TYPES -> int64 arrays (0-d for scalar inputs)
+    """
+    tier_code = np.asarray(tier_code)
+    if tier_code.dtype.kind in 'USO':
+        tier_code = tier_codes(tier_code)
+
+    it_mw = np.multiply(it_capacity, expansion_factor, dtype=np.float64)
+    mech_mw = np.multiply(mechanical_load, expansion_factor, dtype=np.float64)
+    house_mw = np.multiply(house_load, expansion_factor, dtype=np.float64)
+
+    # No non-IT loads entered: derive them from PUE as the component method does
+    non_it_mw = np.multiply(np.subtract(pue, 1.0), it_mw)
+    derived = (mech_mw + house_mw) <= 0
+    mech_mw = np.where(derived, np.multiply(mech_fraction, non_it_mw), mech_mw)
+    house_mw = np.where(derived, non_it_mw - np.multiply(mech_fraction, non_it_mw), house_mw)
+
+    paths = _scheme_values('paths', tier_code)
+    mv_paths = _scheme_values('mv_paths', tier_code)
+
+    def ceil_div(numerator, denominator):
+        return np.ceil(np.divide(numerator, denominator)).astype(np.int64)
+
+    transformers_n = ceil_div(it_mw + mech_mw + house_mw, np.multiply(transformer_mva, power_factor))
+
+    return {
+        'mv_switchgear': (np.asarray(mv_base) + (np.asarray(utility_incomers) - 1)) * mv_paths,
+        'generator': np.maximum(np.asarray(backup_gens), 0) * 2,
+        'intermediate': np.maximum(np.asarray(voltage_levels) - 2, 0) * mv_paths,
+        'transformer': transformers_n * paths + _scheme_values('spare_transformers', tier_code),
+        'lv_it_pcc': ceil_div(it_mw, lv_bus_mw) * paths,
+        'lv_mech_mcc': ceil_div(np.multiply(mech_mw, mech_factor), lv_bus_mw),
+        'lv_house_pcc': ceil_div(house_mw, lv_bus_mw),
+        'ups_output': ceil_div(it_mw, ups_lineup) * paths + _scheme_values('spare_ups', tier_code),
+        'pdu': np.trunc(ceil_div(it_mw, pdu_mva) * _scheme_values('pdu_factor', tier_code)).astype(np.int64),
+    }
+
+
+def bus_category_counts(type_counts):
+    """Collapse per-type bus counts into competitive-pricing categories (it, mech, house)."""
+    totals = {'it': 0, 'mech': 0, 'house': 0}
+    for bus_type, count in type_counts.items():
+        totals[BUS_TYPE_CATEGORY[bus_type]] = totals[BUS_TYPE_CATEGORY[bus_type]] + count
+    return totals
+
+
+def study_type_matrix(buses, rate_card=None, study_keys=STUDY_KEYS, study_factors=None, tier_complexity=1.0):
+    """
+    Study x bus-type hour matrix.
+
+    Per-bus type codes are grouped with a single bincount, then the counts
+    are broadcast against the rate card's type_hours table, so the cost is
+    linear in buses with no Python-level loop over them. Dict counts,
+    factors and tier complexity may also be arrays over a batch of quotes,
+    which adds the batch as the leading axis.
+
+    Args:
+        buses: Per-bus int codes into BUS_TYPES, or a {bus_type: count} dict
+        rate_card (RateCard): Factor tables (DEFAULT_RATE_CARD if None)
+        study_keys (tuple): Rows of the matrix
+        study_factors (sequence): Per-study hour factor (1.0 if None)
+        tier_complexity (float): Tier complexity factor
+
+    Returns:
+        np.ndarray: Hours, shape (len(study_keys), len(BUS_TYPES))
+    """
+    rate_card = rate_card or DEFAULT_RATE_CARD
+    if isinstance(buses, dict):
+        counts = np.stack(np.broadcast_arrays(
+            *[np.asarray(buses.get(bus_type, 0), dtype=np.float64) for bus_type in BUS_TYPES]), axis=-1)
+    else:
+        counts = np.bincount(np.asarray(buses, dtype=np.intp), minlength=len(BUS_TYPES)).astype(np.float64)
+    table = np.array([[rate_card.type_hours[study_key][bus_type] for bus_type in BUS_TYPES]
+                      for study_key in study_keys], dtype=np.float64).reshape(len(study_keys), len(BUS_TYPES))
+    if study_factors is None or not len(study_keys):
+        factors = np.ones(len(study_keys))
+    else:
+        factors = np.stack(np.broadcast_arrays(
+            *[np.asarray(factor, dtype=np.float64) for factor in study_factors]), axis=-1)
+    tier_complexity = np.asarray(tier_complexity, dtype=np.float64)
+    return counts[..., None, :] * table * factors[..., None] * tier_complexity[..., None, None]
+
+
+@dataclass(frozen=True)
+class BusTopology:
+    """
+    Array-backed single-line diagram: one entry per bus.
+
+    The diagram is radial, so each bus's single upstream bus (feeder, -1 for
+    roots) is the whole edge list.
+    """
+
+    bus_type: np.ndarray   # int8 index into BUS_TYPES
+    path: np.ndarray       # int8 distribution path (0 = A, 1 = B)
+    feeder: np.ndarray     # int32 index of the upstream bus, -1 for roots
+
+    def __len__(self):
+        return len(self.bus_type)
+
+    def counts(self):
+        """Buses per type (BUS_TYPES order)."""
+        totals = np.bincount(self.bus_type, minlength=len(BUS_TYPES))
+        return {bus_type: int(total) for bus_type, total in zip(BUS_TYPES, totals)}
+
+    def edges(self):
+        """(upstream, downstream) index arrays for every connection."""
+        fed = np.flatnonzero(self.feeder >= 0)
+        return self.feeder[fed], fed
+
+    def children(self):
+        """
+        CSR adjacency: buses fed from bus i are indices[indptr[i]:indptr[i + 1]].
+
+        Returns:
+            tuple: (indptr, indices) int arrays
+        """
+        upstream, downstream = self.edges()
+        order = np.argsort(upstream, kind='stable')
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(upstream, minlength=len(self)), out=indptr[1:])
+        return indptr, downstream[order]
+
+    def bus_names(self):
+        """Readable labels such as 'TX-A3' or 'PDU-B0012', numbered per type and path."""
+        prefixes = {'mv_switchgear': 'MV', 'generator': 'GEN', 'intermediate': 'IV', 'transformer': 'TX',
+                    'lv_it_pcc': 'PCC-IT', 'lv_mech_mcc': 'MCC', 'lv_house_pcc': 'PCC-H',
+                    'ups_output': 'UPS', 'pdu': 'PDU'}
+        names = []
+        seen = {}
+        for bus_type, path in zip(self.bus_type.tolist(), self.path.tolist()):
+            key = (bus_type, path)
+            seen[key] = seen.get(key, 0) + 1
+            names.append(f"{prefixes[BUS_TYPES[bus_type]]}-{'AB'[path]}{seen[key]}")
+        return names
+
+    def to_frame(self):
+        """One row per bus: name, type, path and the bus it is fed from."""
+        import pandas as pd
+
+        names = self.bus_names()
+        return pd.DataFrame({
+            'Bus': names,
+            'Type': [BUS_TYPE_NAMES[BUS_TYPES[t]] for t in self.bus_type.tolist()],
+            'Path': [('A', 'B')[p] for p in self.path.tolist()],
+            'Fed From': [names[f] if f >= 0 else '' for f in self.feeder.tolist()],
+        })
+
+
+def build_topology(it_capacity, mechanical_load, house_load, tier_level, **params):
+    """
+    Generate the single-line topology for one project.
+
+    Line-ups are connected radially: MV incomer sections and generators feed
+    each path's main MV bus, extra voltage levels chain below it, transformers
+    hang off the last level, and LV PCC/MCCs, UPS outputs and PDUs are spread
+    round-robin over the buses one level up in the same path. Takes the same
+    keyword parameters as topology_bus_counts. Construction is vectorized per
+    line-up, so a 200 MW Tier IV campus (~2,000 buses) builds in under a
+    millisecond.
+
+    Returns:
+        BusTopology: counts() matches topology_bus_counts exactly
+    """
+    tier_code = TIER_CODES.get(tier_level, 0)
+    counts = {name: int(count) for name, count in
+              topology_bus_counts(it_capacity, mechanical_load, house_load, tier_code, **params).items()}
+    scheme = TIER_SCHEMES.get(tier_level, TIER_SCHEMES["Tier III"])
+
+    types, paths, feeders = [], [], []
+    size = 0
+
+    def add(bus_type, path, feeder):
+        nonlocal size
+        path = np.asarray(path, dtype=np.int8)
+        types.append(np.full(len(path), BUS_TYPES.index(bus_type), dtype=np.int8))
+        paths.append(path)
+        feeders.append(np.asarray(feeder, dtype=np.int32))
+        ids = np.arange(size, size + len(path), dtype=np.int32)
+        size += len(path)
+        return ids
+
+    def spread(n, upstream):
+        # Round-robin n buses over the upstream buses
+        if n == 0 or len(upstream) == 0:
+            return np.full(n, -1, dtype=np.int32)
+        return upstream[np.arange(n) % len(upstream)]
+
+    def split_paths(total, n_paths):
+        # Per-path counts: an even share each, any spares on path A
+        share = total // n_paths
+        return [share + (total - share * n_paths if p == 0 else 0) for p in range(n_paths)]
+
+    # MV: each line-up is a main bus plus incomer sections tied to it
+    mv_per_path = counts['mv_switchgear'] // scheme.mv_paths
+    mv_main = []
+    for p in range(scheme.mv_paths):
+        main = add('mv_switchgear', [p], [-1])
+        add('mv_switchgear', np.full(mv_per_path - 1, p), np.full(mv_per_path - 1, main[0]))
+        mv_main.append(main[0])
+    mv_main = np.asarray(mv_main, dtype=np.int32)
+
+    # Generators: terminal bus -> paralleling section -> MV main
+    n_gens = counts['generator'] // 2
+    gen_path = np.arange(n_gens) % scheme.mv_paths
+    paralleling = add('generator', gen_path, mv_main[gen_path])
+    add('generator', gen_path, paralleling)
+
+    # Intermediate voltage levels chained below each MV main
+    levels = counts['intermediate'] // scheme.mv_paths
+    source = mv_main.copy()
+    for _ in range(levels):
+        source = add('intermediate', np.arange(scheme.mv_paths), source)
+
+    # Transformers per distribution path, fed from that path's MV line-up(s)
+    transformers = []
+    for p, n in enumerate(split_paths(counts['transformer'], scheme.paths)):
+        upstream = source[p::scheme.paths]
+        transformers.append(add('transformer', np.full(n, p), spread(n, upstream)))
+
+    # LV switchboards: IT per path, mechanical and house across all paths
+    it_pccs = []
+    for p, n in enumerate(split_paths(counts['lv_it_pcc'], scheme.paths)):
+        it_pccs.append(add('lv_it_pcc', np.full(n, p), spread(n, transformers[p])))
+    all_transformers = np.concatenate(transformers)
+    all_paths = np.concatenate([np.full(len(t), p) for p, t in enumerate(transformers)])
+    for bus_type in ('lv_mech_mcc', 'lv_house_pcc'):
+        n = counts[bus_type]
+        add(bus_type, spread(n, all_paths), spread(n, all_transformers))
+
+    # UPS outputs fed from their path's IT PCCs; PDUs spread over every UPS output
+    ups = []
+    for p, n in enumerate(split_paths(counts['ups_output'], scheme.paths)):
+        ups.append(add('ups_output', np.full(n, p), spread(n, it_pccs[p])))
+    all_ups = np.concatenate(ups)
+    ups_paths = np.concatenate([np.full(len(u), p) for p, u in enumerate(ups)])
+    n = counts['pdu']
+    add('pdu', spread(n, ups_paths), spread(n, all_ups))
+
+    return BusTopology(
+        bus_type=np.concatenate(types),
+        path=np.concatenate(paths).astype(np.int8),
+        feeder=np.concatenate(feeders),
+    )
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COST ROLL-UP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def estimate_buses(inputs):
+    """Bus count for a quote using the accurate component method."""
+    return calculate_bus_count_accurate(
+        it_capacity=inputs.it_capacity,
+        mechanical_load=inputs.mechanical_load,
+        house_load=inputs.house_load,
+        tier_level=inputs.tier_level,
+        pue=inputs.pue_value,
+        ups_lineup=inputs.ups_lineup,
+        transformer_mva=inputs.transformer_mva,
+        lv_bus_mw=inputs.lv_bus_mw,
+        pdu_mva=inputs.pdu_mva,
+        power_factor=inputs.power_factor,
+        utility_incomers=inputs.utility_incomers,
+        voltage_levels=inputs.voltage_levels,
+        backup_gens=inputs.backup_gens,
+        expansion_factor=inputs.expansion_factor,
+        bus_calibration=inputs.bus_calibration
+    )
+
+
+def topology_params(inputs):
+    """Keyword arguments for topology_bus_counts / build_topology from a quote."""
+    return dict(
+        pue=inputs.pue_value,
+        mech_factor=MECH_REDUNDANCY_FACTORS.get(inputs.mech_redundancy, 1.25),
+        ups_lineup=inputs.ups_lineup,
+        transformer_mva=inputs.transformer_mva,
+        lv_bus_mw=inputs.lv_bus_mw,
+        pdu_mva=inputs.pdu_mva,
+        power_factor=inputs.power_factor,
+        utility_incomers=inputs.utility_incomers,
+        voltage_levels=inputs.voltage_levels,
+        backup_gens=inputs.backup_gens,
+        expansion_factor=inputs.expansion_factor
+    )
+
+
+def quote_topology(inputs):
+    """Single-line topology for a quote (see build_topology)."""
+    return build_topology(inputs.it_capacity, inputs.mechanical_load, inputs.house_load,
+                          inputs.tier_level, **topology_params(inputs))
+
+
+def topology_counts(inputs):
+    """Buses per type for a quote's topology, without building the graph."""
+    counts = topology_bus_counts(inputs.it_capacity, inputs.mechanical_load, inputs.house_load,
+                                 TIER_CODES.get(inputs.tier_level, 0), **topology_params(inputs))
+    return {bus_type: int(count) for bus_type, count in counts.items()}
+
+
+def _no_span(name):
+    return contextlib.nullcontext()
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PRICING STAGES (DEPENDENCY GRAPH)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Each stage reads some QuoteInputs fields plus the outputs of its upstream
+# stages and returns a dict of QuoteResult fields. price_quote runs them all
+# in order; IncrementalPricer reruns only stages downstream of a change.
+
+
+def _bus_count_stage(inputs, rate_card, values):
+    if inputs.bus_method == IMPORTED_BUS_METHOD and inputs.imported_bus_counts:
+        type_counts = {bus_type: int(inputs.imported_bus_counts.get(bus_type, 0)) for bus_type in BUS_TYPES}
+        return {'estimated_buses': max(1, sum(type_counts.values())), 'bus_type_counts': type_counts}
+    if inputs.bus_method == "Topology":
+        type_counts = topology_counts(inputs)
+        return {'estimated_buses': max(1, sum(type_counts.values())), 'bus_type_counts': type_counts}
+    return {'estimated_buses': estimate_buses(inputs), 'bus_type_counts': {}}
+
+
+def _category_split_stage(inputs, rate_card, values):
+    estimated_buses = values['estimated_buses']
+    if inputs.competitive_pricing and values['bus_type_counts']:
+        # Topology: categories come from the bus types, not a proportional split
+        categories = bus_category_counts(values['bus_type_counts'])
+        it_buses_est, mech_buses_est, house_buses_est = categories['it'], categories['mech'], categories['house']
+    elif inputs.competitive_pricing:
+        it_buses_est, mech_buses_est, house_buses_est = split_category_buses(
+            estimated_buses,
+            inputs.it_capacity,
+            inputs.mechanical_load,
+            inputs.house_load,
+            inputs.mech_redundancy
+        )
+    else:
+        it_buses_est = estimated_buses
+        mech_buses_est = 0
+        house_buses_est = 0
+    return {'it_buses_est': it_buses_est, 'mech_buses_est': mech_buses_est, 'house_buses_est': house_buses_est}
+
+
+def _study_hours_stage(inputs, rate_card, values):
+    estimated_buses = values['estimated_buses']
+    it_buses_est = values['it_buses_est']
+    mech_buses_est = values['mech_buses_est']
+    house_buses_est = values['house_buses_est']
+    type_counts = values['bus_type_counts']
+
+    tier_complexity = rate_card.tier_complexity_factors[inputs.tier_level]
+
+    study_manhours = {}
+    study_type_hours = {}
+    total_manhours = 0
+
+    if inputs.competitive_pricing and type_counts:
+        # Buses counted by type: one study x type matrix for every selected study
+        selected = tuple(study_key for study_key in STUDY_KEYS if inputs.studies_selected.get(study_key, False))
+        type_matrix = study_type_matrix(
+            type_counts, rate_card, study_keys=selected,
+            study_factors=[inputs.study_factor(study_key) for study_key in selected],
+            tier_complexity=tier_complexity)
+        study_type_hours = {study_key: dict(zip(BUS_TYPES, row.tolist()))
+                            for study_key, row in zip(selected, type_matrix)}
+        type_study_hours = dict(zip(selected, type_matrix.sum(axis=-1).tolist()))
+
+    for study_key in STUDY_KEYS:
+        if inputs.studies_selected.get(study_key, False):
+
+            if inputs.competitive_pricing and type_counts:
+                # Hours per bus from the type table
+                base_study_hours = type_study_hours[study_key]
+            elif inputs.competitive_pricing and study_key in rate_card.category_hours:
+                # Competitive pricing: category-wise hours
+                it_base = rate_card.category_hours[study_key]['it']
+                mech_base = rate_card.category_hours[study_key]['mech']
+                house_base = rate_card.category_hours[study_key]['house']
+
+                base_study_hours = (
+                    it_buses_est * it_base +
+                    mech_buses_est * mech_base +
+                    house_buses_est * house_base
+                ) * inputs.study_factor(study_key) * tier_complexity
+            else:
+                # Standard pricing: unified hours
+                base_study_hours = (
+                    estimated_buses *
+                    rate_card.base_hours_per_bus[study_key] *
+                    inputs.study_factor(study_key) *
+                    tier_complexity
+                )
+
+            study_manhours[study_key] = base_study_hours
+            total_manhours += base_study_hours
+        else:
+            study_manhours[study_key] = 0
+
+    if inputs.hour_reduction > 0:
+        original_manhours = total_manhours
+        total_manhours = total_manhours * (1 - inputs.hour_reduction / 100)
+        hours_reduced = original_manhours - total_manhours
+    else:
+        hours_reduced = 0
+
+    return {
+        'tier_complexity': tier_complexity,
+        'study_manhours': study_manhours,
+        'study_type_hours': study_type_hours,
+        'total_manhours': total_manhours,
+        'hours_reduced': hours_reduced,
+    }
+
+
+def _labor_stage(inputs, rate_card, values):
+    total_manhours = values['total_manhours']
+    study_manhours = values['study_manhours']
+
+    # Work allocation percentages
+    senior_allocation = inputs.work_allocation['senior'] / 100
+    mid_allocation = inputs.work_allocation['mid'] / 100
+    junior_allocation = inputs.work_allocation['junior'] / 100
+
+    senior_hours = total_manhours * senior_allocation
+    mid_hours = total_manhours * mid_allocation
+    junior_hours = total_manhours * junior_allocation
+
+    senior_cost = senior_hours * inputs.senior_rate
+    mid_cost = mid_hours * inputs.mid_rate
+    junior_cost = junior_hours * inputs.junior_rate
+
+    total_labor_cost = senior_cost + mid_cost + junior_cost
+
+    # Study-wise breakdown (before hour reduction, as shown on the study cards)
+    study_labor_costs = {}
+    for study_key in STUDY_KEYS:
+        if inputs.studies_selected.get(study_key, False):
+            hours = study_manhours[study_key]
+            study_labor_costs[study_key] = (hours * senior_allocation * inputs.senior_rate +
+                                            hours * mid_allocation * inputs.mid_rate +
+                                            hours * junior_allocation * inputs.junior_rate)
+
+    return {
+        'senior_hours': senior_hours,
+        'mid_hours': mid_hours,
+        'junior_hours': junior_hours,
+        'senior_cost': senior_cost,
+        'mid_cost': mid_cost,
+        'junior_cost': junior_cost,
+        'total_labor_cost': total_labor_cost,
+        'study_labor_costs': study_labor_costs,
+    }
+
+
+def _reports_stage(inputs, rate_card, values):
+    report_costs = {}
+    total_report_cost = 0
+
+    for study_key in STUDY_KEYS:
+        if inputs.studies_selected.get(study_key, False):
+            report_costs[study_key] = inputs.report_cost(study_key)
+            total_report_cost += inputs.report_cost(study_key)
+
+    complexity_multiplier = rate_card.complexity_multipliers[inputs.report_complexity]
+    total_report_cost = total_report_cost * complexity_multiplier
+
+    study_report_costs = {study_key: cost * complexity_multiplier for study_key, cost in report_costs.items()}
+
+    return {
+        'report_costs': report_costs,
+        'complexity_multiplier': complexity_multiplier,
+        'total_report_cost': total_report_cost,
+        'study_report_costs': study_report_costs,
+    }
+
+
+def _services_stage(inputs, rate_card, values):
+    return {
+        'total_site_visit_cost': inputs.site_visits * inputs.site_visit_cost if inputs.site_visit_enabled else 0,
+        'total_label_cost': inputs.num_labels * inputs.cost_per_label if inputs.af_labels_enabled else 0,
+        'total_stickering_cost': inputs.stickering_cost if inputs.stickering_enabled else 0,
+        'total_meeting_cost': inputs.client_meetings * inputs.meeting_cost,
+        'total_custom_cost': inputs.custom_charges_cost + inputs.custom_cost_1_amount + inputs.custom_cost_2_amount,
+    }
+
+
+def _subtotal_stage(inputs, rate_card, values):
+    return {
+        'subtotal_before_adjustments': (values['total_labor_cost'] + values['total_report_cost'] +
+                                        values['total_site_visit_cost'] + values['total_label_cost'] +
+                                        values['total_stickering_cost'] + inputs.custom_charges_cost +
+                                        values['total_meeting_cost'] + inputs.custom_cost_1_amount +
+                                        inputs.custom_cost_2_amount)
+    }
+
+
+def _urgency_stage(inputs, rate_card, values):
+    subtotal_before_adjustments = values['subtotal_before_adjustments']
+    if inputs.delivery_type == "Urgent":
+        urgency_cost = subtotal_before_adjustments * (inputs.urgency_multiplier - 1)
+    else:
+        urgency_cost = 0
+    return {'urgency_cost': urgency_cost, 'subtotal_after_urgency': subtotal_before_adjustments + urgency_cost}
+
+
+def _discount_stage(inputs, rate_card, values):
+    subtotal_after_urgency = values['subtotal_after_urgency']
+    if inputs.customer_type == "Repeat Customer" and inputs.repeat_discount > 0:
+        discount_amount = subtotal_after_urgency * (inputs.repeat_discount / 100)
+    else:
+        discount_amount = 0
+    return {'discount_amount': discount_amount, 'subtotal_after_discount': subtotal_after_urgency - discount_amount}
+
+
+def _margin_stage(inputs, rate_card, values):
+    subtotal_after_discount = values['subtotal_after_discount']
+    margin_amount = subtotal_after_discount * (inputs.custom_margin / 100)
+    return {'margin_amount': margin_amount, 'final_total_cost': subtotal_after_discount + margin_amount}
+
+
+@dataclass(frozen=True)
+class PricingStage:
+    """One node of the pricing graph."""
+
+    name: str
+    fields: tuple          # QuoteInputs fields read
+    upstream: tuple        # stages whose outputs are read
+    compute: object        # (inputs, rate_card, values) -> dict of QuoteResult fields
+    uses_rate_card: bool = False
+
+
+# Topological order: bus count -> category split -> study hours -> labor ->
+# subtotal (+ reports, services) -> urgency -> discount -> margin
+PRICING_STAGES = (
+    PricingStage('bus_count', ('it_capacity', 'mechanical_load', 'house_load', 'tier_level', 'pue_value',
+                               'ups_lineup', 'transformer_mva', 'lv_bus_mw', 'pdu_mva', 'power_factor',
+                               'bus_calibration', 'bus_method', 'utility_incomers', 'voltage_levels',
+                               'backup_gens', 'expansion_factor', 'mech_redundancy', 'imported_bus_counts'),
+                 (), _bus_count_stage),
+    PricingStage('category_split', ('competitive_pricing', 'it_capacity', 'mechanical_load', 'house_load',
+                                    'mech_redundancy'), ('bus_count',), _category_split_stage),
+    PricingStage('study_hours', ('tier_level', 'studies_selected', 'competitive_pricing', 'hour_reduction') +
+                 tuple(f"{key}_factor" for key in STUDY_KEYS),
+                 ('bus_count', 'category_split'), _study_hours_stage, uses_rate_card=True),
+    PricingStage('labor', ('work_allocation', 'senior_rate', 'mid_rate', 'junior_rate', 'studies_selected'),
+                 ('study_hours',), _labor_stage),
+    PricingStage('reports', ('studies_selected', 'report_complexity') +
+                 tuple(f"{key}_report_cost" for key in STUDY_KEYS),
+                 (), _reports_stage, uses_rate_card=True),
+    PricingStage('services', ('site_visit_enabled', 'site_visits', 'site_visit_cost', 'af_labels_enabled',
+                              'num_labels', 'cost_per_label', 'stickering_enabled', 'stickering_cost',
+                              'client_meetings', 'meeting_cost', 'custom_charges_cost',
+                              'custom_cost_1_amount', 'custom_cost_2_amount'), (), _services_stage),
+    PricingStage('subtotal', ('custom_charges_cost', 'custom_cost_1_amount', 'custom_cost_2_amount'),
+                 ('labor', 'reports', 'services'), _subtotal_stage),
+    PricingStage('urgency', ('delivery_type', 'urgency_multiplier'), ('subtotal',), _urgency_stage),
+    PricingStage('discount', ('customer_type', 'repeat_discount'), ('urgency',), _discount_stage),
+    PricingStage('margin', ('custom_margin',), ('discount',), _margin_stage),
+)
+
+
+def price_quote(inputs, rate_card=DEFAULT_RATE_CARD, span=None):
+    """
+    Price one quote end to end.
+
+    Args:
+        inputs (QuoteInputs): Project, rate and study configuration
+        rate_card (RateCard): Factor tables to price against
+        span (callable): Optional name -> context manager used to time each
+            pricing stage (bus_count, category_split, study_hours, ...)
+
+    Returns:
+        QuoteResult: Bus counts, manhours and the full cost roll-up
+    """
+    span = span or _no_span
+    values = {}
+    for stage in PRICING_STAGES:
+        with span(stage.name):
+            values.update(stage.compute(inputs, rate_card, values))
+    return QuoteResult(**values)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted(value.items()))
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, dict):
+        return {key: _thaw(item) for key, item in value.items()}
+    return value
+
+
+class IncrementalPricer:
+    """
+    Memoized price_quote over PRICING_STAGES.
+
+    Each stage is recomputed only when one of its input fields, the rate card
+    (for stages that use it) or an upstream stage's outputs changed since the
+    last call. A recomputed stage whose outputs come out identical does not
+    invalidate its downstream stages. Results are identical to price_quote.
+    """
+
+    def __init__(self):
+        self._memo = {}          # stage name -> (key, outputs, version)
+        self.recomputed = ()     # stage names recomputed by the last call
+
+    def price(self, inputs, rate_card=DEFAULT_RATE_CARD, span=None):
+        span = span or _no_span
+        card_version = rate_card_version(rate_card)
+        values = {}
+        versions = {}
+        recomputed = []
+
+        for stage in PRICING_STAGES:
+            key = (tuple(_freeze(getattr(inputs, name)) for name in stage.fields),
+                   tuple(versions[name] for name in stage.upstream),
+                   card_version if stage.uses_rate_card else None)
+            memo = self._memo.get(stage.name)
+
+            if memo is not None and memo[0] == key:
+                outputs, version = memo[1], memo[2]
+            else:
+                with span(stage.name):
+                    outputs = stage.compute(inputs, rate_card, values)
+                recomputed.append(stage.name)
+                if memo is not None and memo[1] == outputs:
+                    version = memo[2]
+                else:
+                    version = memo[2] + 1 if memo is not None else 0
+                self._memo[stage.name] = (key, outputs, version)
+
+            values.update(outputs)
+            versions[stage.name] = version
+
+        self.recomputed = tuple(recomputed)
+        # Fresh dicts so callers cannot mutate memoized values
+        return QuoteResult(**{name: _thaw(value) for name, value in values.items()})
+
+
+def _lookup(labels, table, default=np.nan):
+    """Map an array of labels through a dict, returning a float array."""
+    labels = np.asarray(labels)
+    values = [table.get(label, default) for label in labels.ravel().tolist()]
+    return np.array(values, dtype=np.float64).reshape(labels.shape)
+
+
+def price_quote_batch(inputs, rate_card=DEFAULT_RATE_CARD, **overrides):
+    """
+    Vectorized price_quote over many variants of one quote.
+
+    Any QuoteInputs field can be overridden with a scalar or a NumPy array;
+    fields not overridden are taken from inputs. All arrays are broadcast
+    together. tier_level accepts labels or TIER_CODES; studies_selected and
+    work_allocation take dicts whose values may be arrays. The roll-up follows
+    price_quote step for step, so every element matches the scalar result.
+
+    Returns:
+        dict: QuoteResult field names -> arrays; study_manhours,
+        study_labor_costs, study_report_costs and bus_type_counts (empty
+        unless some element uses the topology method) are dicts of arrays
+    """
+    def value(name):
+        return np.asarray(overrides.get(name, getattr(inputs, name)))
+
+    studies = dict(inputs.studies_selected)
+    studies.update(overrides.get('studies_selected', {}))
+    allocation = dict(inputs.work_allocation)
+    allocation.update(overrides.get('work_allocation', {}))
+
+    tier_code = value('tier_level')
+    if tier_code.dtype.kind in 'USO':
+        tier_code = tier_codes(tier_code)
+
+    competitive = value('competitive_pricing').astype(bool)
+    it_capacity = value('it_capacity')
+    mechanical_load = value('mechanical_load')
+    house_load = value('house_load')
+
+    mech_factor = _lookup(value('mech_redundancy'), MECH_REDUNDANCY_FACTORS, 1.25)
+
+    estimated_buses = calculate_bus_count_batch(
+        it_capacity,
+        tier_code,
+        pue=value('pue_value'),
+        ups_lineup=value('ups_lineup'),
+        transformer_mva=value('transformer_mva'),
+        lv_bus_mw=value('lv_bus_mw'),
+        pdu_mva=value('pdu_mva'),
+        power_factor=value('power_factor'),
+        utility_incomers=value('utility_incomers'),
+        voltage_levels=value('voltage_levels'),
+        backup_gens=value('backup_gens'),
+        expansion_factor=value('expansion_factor'),
+        bus_calibration=value('bus_calibration')
+    )
+
+    bus_method = value('bus_method')
+    imported_counts = overrides.get('imported_bus_counts', inputs.imported_bus_counts)
+    imported = (bus_method == IMPORTED_BUS_METHOD) & bool(imported_counts)
+    # Without imported counts the imported method falls back to the component estimate
+    topology = bus_method == "Topology"
+    bus_type_counts = {}
+    if imported.any():
+        bus_type_counts = {bus_type: np.where(imported, int(imported_counts.get(bus_type, 0)), 0)
+                           for bus_type in BUS_TYPES}
+    if topology.any():
+        type_counts = topology_bus_counts(
+            it_capacity, mechanical_load, house_load, tier_code,
+            pue=value('pue_value'),
+            mech_factor=mech_factor,
+            ups_lineup=value('ups_lineup'),
+            transformer_mva=value('transformer_mva'),
+            lv_bus_mw=value('lv_bus_mw'),
+            pdu_mva=value('pdu_mva'),
+            power_factor=value('power_factor'),
+            utility_incomers=value('utility_incomers'),
+            voltage_levels=value('voltage_levels'),
+            backup_gens=value('backup_gens'),
+            expansion_factor=value('expansion_factor')
+        )
+        bus_type_counts = {bus_type: np.where(topology, count, bus_type_counts.get(bus_type, 0))
+                           for bus_type, count in type_counts.items()}
+    by_type = False
+    if bus_type_counts:
+        by_type = topology | imported
+        estimated_buses = np.where(by_type, np.maximum(1, sum(bus_type_counts.values())), estimated_buses)
+
+    if competitive.any():
+        split = split_category_buses_batch(
+            estimated_buses, it_capacity, mechanical_load, house_load, mech_factor
+        )
+        if bus_type_counts:
+            categories = bus_category_counts(bus_type_counts)
+            split = tuple(np.where(by_type, categories[name], split_counts)
+                          for name, split_counts in zip(('it', 'mech', 'house'), split))
+        it_buses_est = np.where(competitive, split[0], estimated_buses)
+        mech_buses_est = np.where(competitive, split[1], 0)
+        house_buses_est = np.where(competitive, split[2], 0)
+    else:
+        it_buses_est = estimated_buses
+        mech_buses_est = np.zeros_like(estimated_buses)
+        house_buses_est = np.zeros_like(estimated_buses)
+
+    tier_table = {TIER_CODES[label]: factor for label, factor in rate_card.tier_complexity_factors.items()}
+    tier_complexity = _lookup(tier_code, tier_table)
+
+    # Work allocation percentages
+    senior_allocation = np.asarray(allocation['senior']) / 100
+    mid_allocation = np.asarray(allocation['mid']) / 100
+    junior_allocation = np.asarray(allocation['junior']) / 100
+
+    if bus_type_counts:
+        # Type-counted rows: one (quotes x studies x types) matrix, summed over types
+        type_study_hours = study_type_matrix(
+            bus_type_counts, rate_card,
+            study_factors=[value(f"{study_key}_factor") for study_key in STUDY_KEYS],
+            tier_complexity=tier_complexity).sum(axis=-1)
+
+    study_manhours = {}
+    total_manhours = 0
+
+    for row, study_key in enumerate(STUDY_KEYS):
+        selected = np.asarray(studies.get(study_key, False), dtype=bool)
+        factor = value(f"{study_key}_factor")
+
+        standard_hours = (estimated_buses *
+                          rate_card.base_hours_per_bus[study_key] *
+                          factor *
+                          tier_complexity)
+        if study_key in rate_card.category_hours:
+            category = rate_card.category_hours[study_key]
+            competitive_hours = (
+                it_buses_est * category['it'] +
+                mech_buses_est * category['mech'] +
+                house_buses_est * category['house']
+            ) * factor * tier_complexity
+            base_study_hours = np.where(competitive, competitive_hours, standard_hours)
+        else:
+            base_study_hours = standard_hours
+        if bus_type_counts:
+            base_study_hours = np.where(competitive & by_type, type_study_hours[..., row],
+                                        base_study_hours)
+
+        study_manhours[study_key] = np.where(selected, base_study_hours, 0.0)
+        total_manhours = total_manhours + study_manhours[study_key]
+
+    hour_reduction = value('hour_reduction')
+    reduced_manhours = total_manhours * (1 - hour_reduction / 100)
+    hours_reduced = np.where(hour_reduction > 0, total_manhours - reduced_manhours, 0.0)
+    total_manhours = np.where(hour_reduction > 0, reduced_manhours, total_manhours)
+
+    senior_rate = value('senior_rate')
+    mid_rate = value('mid_rate')
+    junior_rate = value('junior_rate')
+
+    senior_hours = total_manhours * senior_allocation
+    mid_hours = total_manhours * mid_allocation
+    junior_hours = total_manhours * junior_allocation
+
+    senior_cost = senior_hours * senior_rate
+    mid_cost = mid_hours * mid_rate
+    junior_cost = junior_hours * junior_rate
+
+    total_labor_cost = senior_cost + mid_cost + junior_cost
+
+    complexity_multiplier = _lookup(value('report_complexity'), rate_card.complexity_multipliers)
+
+    total_report_cost = 0
+    study_labor_costs = {}
+    study_report_costs = {}
+    for study_key in STUDY_KEYS:
+        selected = np.asarray(studies.get(study_key, False), dtype=bool)
+        report_cost = value(f"{study_key}_report_cost")
+        total_report_cost = total_report_cost + np.where(selected, report_cost, 0)
+
+        hours = study_manhours[study_key]
+        study_labor_costs[study_key] = np.where(selected,
+                                                hours * senior_allocation * senior_rate +
+                                                hours * mid_allocation * mid_rate +
+                                                hours * junior_allocation * junior_rate, 0.0)
+        study_report_costs[study_key] = np.where(selected, report_cost * complexity_multiplier, 0.0)
+
+    total_report_cost = total_report_cost * complexity_multiplier
+
+    total_site_visit_cost = np.where(value('site_visit_enabled').astype(bool),
+                                     value('site_visits') * value('site_visit_cost'), 0)
+    total_label_cost = np.where(value('af_labels_enabled').astype(bool),
+                                value('num_labels') * value('cost_per_label'), 0)
+    total_stickering_cost = np.where(value('stickering_enabled').astype(bool), value('stickering_cost'), 0)
+    total_meeting_cost = value('client_meetings') * value('meeting_cost')
+    custom_charges_cost = value('custom_charges_cost')
+    custom_cost_1_amount = value('custom_cost_1_amount')
+    custom_cost_2_amount = value('custom_cost_2_amount')
+    total_custom_cost = custom_charges_cost + custom_cost_1_amount + custom_cost_2_amount
+
+    subtotal_before_adjustments = (total_labor_cost + total_report_cost +
+                                   total_site_visit_cost + total_label_cost +
+                                   total_stickering_cost + custom_charges_cost +
+                                   total_meeting_cost + custom_cost_1_amount +
+                                   custom_cost_2_amount)
+
+    urgent = value('delivery_type') == "Urgent"
+    urgency_cost = np.where(urgent, subtotal_before_adjustments * (value('urgency_multiplier') - 1), 0.0)
+
+    subtotal_after_urgency = subtotal_before_adjustments + urgency_cost
+
+    repeat_discount = value('repeat_discount')
+    discounted = (value('customer_type') == "Repeat Customer") & (repeat_discount > 0)
+    discount_amount = np.where(discounted, subtotal_after_urgency * (repeat_discount / 100), 0.0)
+
+    subtotal_after_discount = subtotal_after_urgency - discount_amount
+
+    margin_amount = subtotal_after_discount * (value('custom_margin') / 100)
+    final_total_cost = subtotal_after_discount + margin_amount
+
+    result = {
+        'estimated_buses': estimated_buses,
+        'it_buses_est': it_buses_est,
+        'mech_buses_est': mech_buses_est,
+        'house_buses_est': house_buses_est,
+        'tier_complexity': tier_complexity,
+        'total_manhours': total_manhours,
+        'hours_reduced': hours_reduced,
+        'senior_hours': senior_hours,
+        'mid_hours': mid_hours,
+        'junior_hours': junior_hours,
+        'senior_cost': senior_cost,
+        'mid_cost': mid_cost,
+        'junior_cost': junior_cost,
+        'total_labor_cost': total_labor_cost,
+        'complexity_multiplier': complexity_multiplier,
+        'total_report_cost': total_report_cost,
+        'total_site_visit_cost': total_site_visit_cost,
+        'total_label_cost': total_label_cost,
+        'total_stickering_cost': total_stickering_cost,
+        'total_meeting_cost': total_meeting_cost,
+        'total_custom_cost': total_custom_cost,
+        'subtotal_before_adjustments': subtotal_before_adjustments,
+        'urgency_cost': urgency_cost,
+        'subtotal_after_urgency': subtotal_after_urgency,
+        'discount_amount': discount_amount,
+        'subtotal_after_discount': subtotal_after_discount,
+        'margin_amount': margin_amount,
+        'final_total_cost': final_total_cost,
+    }
+
+    # Broadcast everything to one common shape
+    shape = np.broadcast_shapes(*(np.shape(v) for v in result.values()),
+                                *(np.shape(v) for v in study_manhours.values()),
+                                *(np.shape(v) for v in study_labor_costs.values()),
+                                *(np.shape(v) for v in study_report_costs.values()))
+    result = {name: np.broadcast_to(v, shape) for name, v in result.items()}
+    result['study_manhours'] = {k: np.broadcast_to(v, shape) for k, v in study_manhours.items()}
+    result['study_labor_costs'] = {k: np.broadcast_to(v, shape) for k, v in study_labor_costs.items()}
+    result['study_report_costs'] = {k: np.broadcast_to(v, shape) for k, v in study_report_costs.items()}
+    result['bus_type_counts'] = {k: np.broadcast_to(v, shape) for k, v in bus_type_counts.items()}
+    return result
+
+
+BUS_COUNT_FIELDS = ('estimated_buses', 'it_buses_est', 'mech_buses_est', 'house_buses_est')
+
+
+def result_row(result):
+    """
+    Flatten a QuoteResult into a single row (per-study values as
+    <study>_<field>, topology bus counts as <bus type>_buses).
+    """
+    row = {}
+    for name, value in vars(result).items():
+        if isinstance(value, dict):
+            continue
+        # Bus counts stay integers; every hour/cost column is a float so the
+        # column types are stable across rows
+        row[name] = value if name in BUS_COUNT_FIELDS else float(value)
+    for study_key in STUDY_KEYS:
+        row[f"{study_key}_manhours"] = float(result.study_manhours.get(study_key, 0))
+        row[f"{study_key}_labor_cost"] = float(result.study_labor_costs.get(study_key, 0))
+        row[f"{study_key}_report_charge"] = float(result.study_report_costs.get(study_key, 0))
+    for bus_type in BUS_TYPES:
+        row[f"{bus_type}_buses"] = int(result.bus_type_counts.get(bus_type, 0))
+    return row
@@ -0,0 +1,166 @@
+"""
+Quote export builders.
+
+Pure functions that turn (QuoteInputs, QuoteResult) into downloadable
+tables and files (CSV, XLSX, Parquet), shared by the Streamlit page and the
+benchmarks.
+"""
+
+import csv
+import dataclasses
+import importlib.util
+import io
+import re
+import tempfile
+import zipfile
+
+import pandas as pd
+
+from pss_engine import STUDY_KEYS, result_row
+
+SUMMARY_PARAMETERS = [
+    'Project Name', 'Tier Level', 'IT Capacity (MW)', 'Mechanical Load (MW)',
+    'House Load (MW)', 'Bus Count Method', 'Estimated Buses', 'Competitive Pricing', 'IT Buses', 'Mech Buses', 'House Buses',
+    'Total Manhours', 'Delivery Type', 'Customer Type', 'Report Complexity', '',
+    'Labor Cost', 'Report Cost', 'Site Visit Cost', 'Meeting Cost',
+    'Label & Stickering Cost', 'Custom Services Cost', '',
+    'Subtotal', 'Urgency Charge', 'Discount', 'Subtotal After Discount',
+    'Project Margins', 'FINAL TOTAL COST', '', 'Prepared By'
+]
+
+
+def summary_table(quote_inputs, quote, prepared_by=''):
+    """Two-column Parameter/Value project summary, formatted as on the page."""
+    values = [
+        quote_inputs.project_name, quote_inputs.tier_level, quote_inputs.it_capacity, quote_inputs.mechanical_load,
+        quote_inputs.house_load, quote_inputs.bus_method, quote.estimated_buses, 'Yes' if quote_inputs.competitive_pricing else 'No', quote.it_buses_est, quote.mech_buses_est, quote.house_buses_est,
+        f"{quote.total_manhours:.1f}", quote_inputs.delivery_type, quote_inputs.customer_type, quote_inputs.report_complexity, '',
+        f"₹{quote.total_labor_cost:,.0f}", f"₹{quote.total_report_cost:,.0f}",
+        f"₹{quote.total_site_visit_cost:,.0f}", f"₹{quote.total_meeting_cost:,.0f}",
+        f"₹{quote.total_label_cost + quote.total_stickering_cost:,.0f}",
+        f"₹{quote.total_custom_cost:,.0f}", '',
+        f"₹{quote.subtotal_before_adjustments:,.0f}", f"₹{quote.urgency_cost:,.0f}",
+        f"-₹{quote.discount_amount:,.0f}", f"₹{quote.subtotal_after_discount:,.0f}",
+        f"₹{quote.margin_amount:,.0f} ({quote_inputs.custom_margin}%)", f"₹{quote.final_total_cost:,.0f}", '',
+        prepared_by
+    ]
+    return pd.DataFrame({'Parameter': SUMMARY_PARAMETERS, 'Value': values})
+
+
+def summary_csv(quote_inputs, quote, prepared_by=''):
+    """Project summary as CSV text."""
+    return summary_table(quote_inputs, quote, prepared_by).to_csv(index=False)
+
+
+def quote_record(quote_inputs, quote):
+    """
+    One flat, typed row for a quote: every input (studies as study_<key>,
+    allocation as <level>_allocation) followed by result_row(quote).
+    Imported bus counts are left out; result_row already has them as
+    <bus_type>_buses columns.
+    """
+    record = {}
+    for name, value in dataclasses.asdict(quote_inputs).items():
+        if name == 'imported_bus_counts':
+            continue
+        elif name == 'studies_selected':
+            record.update({f"study_{key}": bool(value.get(key, False)) for key in STUDY_KEYS})
+        elif name == 'work_allocation':
+            record.update({f"{level}_allocation": float(share) for level, share in value.items()})
+        else:
+            record[name] = value
+    record.update(result_row(quote))
+    return record
+
+
+def summary_xlsx(quote_inputs, quote, prepared_by=''):
+    """Workbook with the formatted Summary sheet and a typed Quote Data sheet."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        summary_table(quote_inputs, quote, prepared_by).to_excel(writer, sheet_name='Summary', index=False)
+        record = quote_record(quote_inputs, quote)
+        pd.DataFrame({'Field': list(record), 'Value': list(record.values())}).to_excel(
+            writer, sheet_name='Quote Data', index=False)
+    return buffer.getvalue()
+
+
+def quote_parquet(quote_inputs, quote):
+    """Single-row Parquet file of quote_record (typed columns, for analysis)."""
+    buffer = io.BytesIO()
+    pd.DataFrame([quote_record(quote_inputs, quote)]).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+# format -> (label, extension, MIME type, optional dependency)
+EXPORT_FORMATS = {
+    'csv': ("CSV", "csv", "text/csv", None),
+    'xlsx': ("Excel", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "openpyxl"),
+    'parquet': ("Parquet", "parquet", "application/vnd.apache.parquet", "pyarrow"),
+}
+
+
+def export_available(fmt):
+    """True if the optional dependency for fmt is installed."""
+    dependency = EXPORT_FORMATS[fmt][3]
+    return dependency is None or importlib.util.find_spec(dependency) is not None
+
+
+def export_bytes(fmt, quote_inputs, quote, prepared_by=''):
+    """Build one export file as bytes."""
+    if fmt == 'csv':
+        return summary_csv(quote_inputs, quote, prepared_by).encode('utf-8')
+    if fmt == 'xlsx':
+        return summary_xlsx(quote_inputs, quote, prepared_by)
+    if fmt == 'parquet':
+        return quote_parquet(quote_inputs, quote)
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def _safe_name(text):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(text)).strip('_') or 'quote'
+
+
+def write_quotes_zip(fileobj, quotes, prepared_by=''):
+    """
+    Stream many quotes into a zip archive written to fileobj.
+
+    quotes is any iterable of (label, QuoteInputs, QuoteResult); it is
+    consumed one quote at a time, so a generator over the quote store or a
+    batch run keeps memory flat. Each quote becomes summaries/<n>_<label>.csv
+    and a row of comparison.csv (quote_record columns), which is spooled to
+    a temporary file and added last.
+
+    Returns:
+        int: Number of quotes written
+    """
+    count = 0
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024, mode='w+', newline='',
+                                       encoding='utf-8') as comparison, \
+            zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        writer = None
+        for label, quote_inputs, quote in quotes:
+            count += 1
+            name = f"summaries/{count:04d}_{_safe_name(label)}.csv"
+            with archive.open(name, 'w') as member, io.TextIOWrapper(member, encoding='utf-8', newline='') as text:
+                summary_table(quote_inputs, quote, prepared_by).to_csv(text, index=False)
+
+            record = {'quote': label, **quote_record(quote_inputs, quote)}
+            if writer is None:
+                writer = csv.DictWriter(comparison, fieldnames=list(record))
+                writer.writeheader()
+            writer.writerow(record)
+
+        comparison.seek(0)
+        with archive.open("comparison.csv", 'w') as member, \
+                io.TextIOWrapper(member, encoding='utf-8', newline='') as text:
+            for chunk in iter(lambda: comparison.read(64 * 1024), ''):
+                text.write(chunk)
+    return count
+
+
+def quotes_zip_bytes(quotes, prepared_by=''):
+    """write_quotes_zip into a spooled temporary file, returned as bytes."""
+    with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as buffer:
+        write_quotes_zip(buffer, quotes, prepared_by)
+        buffer.seek(0)
+        return buffer.read()
@@ -0,0 +1,356 @@
+"""
+Persistent quote history in SQLite.
+
+Every saved quote is stored with its full inputs and breakdown (as JSON),
+the user, a timestamp and the rate-card version. Published rate cards are
+kept alongside, one of them marked active. The columns used for
+listing and filtering are duplicated out of the JSON and indexed, so history
+queries stay fast with tens of thousands of quotes. The database runs in WAL
+mode so one session writing never blocks others reading.
+"""
+
+import dataclasses
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+
+import pandas as pd
+
+from pss_engine import QuoteInputs, QuoteResult, rate_card_from_json, rate_card_to_json, rate_card_version
+
+DEFAULT_DB_PATH = os.environ.get(
+    'PSS_QUOTE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quotes.db')
+)
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    username TEXT,
+    project_name TEXT NOT NULL,
+    tier_level TEXT NOT NULL,
+    it_capacity REAL NOT NULL,
+    mechanical_load REAL NOT NULL,
+    house_load REAL NOT NULL,
+    customer_type TEXT,
+    competitive_pricing INTEGER NOT NULL,
+    estimated_buses INTEGER NOT NULL,
+    total_manhours REAL NOT NULL,
+    final_total_cost REAL NOT NULL,
+    rate_card_version TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    inputs_json TEXT NOT NULL,
+    result_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quotes_project ON quotes (project_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_quotes_username ON quotes (username);
+CREATE INDEX IF NOT EXISTS idx_quotes_tier ON quotes (tier_level);
+CREATE INDEX IF NOT EXISTS idx_quotes_created ON quotes (created_at);
+CREATE INDEX IF NOT EXISTS idx_quotes_cost ON quotes (final_total_cost);
+"""
+
+# Contentless full-text index (rowid = quotes.id); the text itself lives in
+# inputs_json. Prefix indexes keep search-as-you-type queries cheap.
+TEXT_FIELDS = ('project_name', 'scope_description', 'custom_charges_desc',
+               'custom_cost_1_desc', 'custom_cost_2_desc')
+
+FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(
+    {', '.join(TEXT_FIELDS)},
+    content='',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+"""
+
+# bm25 column weights: a hit in the project name outranks one in the scope
+FTS_WEIGHTS = (10.0, 1.0, 2.0, 2.0, 2.0)
+
+# Published rate cards; at most one row is active (none = built-in default)
+RATE_CARD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_cards (
+    version TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    username TEXT,
+    note TEXT,
+    tables_json TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rate_cards_active ON rate_cards (active) WHERE active = 1;
+"""
+
+RATE_CARD_COLUMNS = ('version', 'created_at', 'username', 'note', 'active')
+
+LIST_COLUMNS = ('id', 'created_at', 'username', 'project_name', 'tier_level', 'it_capacity',
+                'mechanical_load', 'house_load', 'customer_type', 'competitive_pricing',
+                'estimated_buses', 'total_manhours', 'final_total_cost', 'rate_card_version')
+
+
+def _json_default(value):
+    # NumPy scalars from the engine
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def _dumps(obj):
+    return json.dumps(dataclasses.asdict(obj), default=_json_default, separators=(',', ':'))
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word required, the last word
+    matched as a prefix. Words are quoted so punctuation cannot break the
+    query syntax.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class QuoteStore:
+    """SQLite-backed quote history; safe to share between Streamlit sessions."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._active_card = (None, None)    # (version, RateCard) last loaded
+        self._migrate()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self._connect()
+        with conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.executescript(SCHEMA)
+            conn.executescript(FTS_SCHEMA)
+            conn.executescript(RATE_CARD_SCHEMA)
+            if version < 2:
+                # Index quotes saved before full-text search existed
+                extracts = ', '.join(f"json_extract(inputs_json, '$.{name}')" for name in TEXT_FIELDS)
+                conn.execute(
+                    f"INSERT INTO quotes_fts (rowid, {', '.join(TEXT_FIELDS)}) "
+                    f"SELECT id, {extracts} FROM quotes"
+                )
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def save(self, inputs, result, username, rate_card_version, input_hash, created_at=None):
+        """Store one priced quote; returns its id."""
+        created_at = created_at or datetime.datetime.now()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO quotes (
+                    created_at, username, project_name, tier_level, it_capacity,
+                    mechanical_load, house_load, customer_type, competitive_pricing,
+                    estimated_buses, total_manhours, final_total_cost,
+                    rate_card_version, input_hash, inputs_json, result_json
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    created_at.isoformat(timespec='seconds'), username, inputs.project_name,
+                    inputs.tier_level, float(inputs.it_capacity), float(inputs.mechanical_load),
+                    float(inputs.house_load), inputs.customer_type, int(bool(inputs.competitive_pricing)),
+                    int(result.estimated_buses), float(result.total_manhours), float(result.final_total_cost),
+                    rate_card_version, input_hash, _dumps(inputs), _dumps(result),
+                ),
+            )
+            conn.execute(
+                f"INSERT INTO quotes_fts (rowid, {', '.join(TEXT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                (cursor.lastrowid, *(getattr(inputs, name) or '' for name in TEXT_FIELDS)),
+            )
+        return cursor.lastrowid
+
+    @staticmethod
+    def _filter_clauses(project=None, username=None, tier=None, date_from=None, date_to=None,
+                        cost_min=None, cost_max=None, it_min=None, it_max=None, table='quotes'):
+        clauses, params = [], []
+        if project:
+            clauses.append(f"{table}.project_name LIKE ?")
+            params.append(project + '%')
+        if username:
+            clauses.append(f"{table}.username = ?")
+            params.append(username)
+        if tier:
+            clauses.append(f"{table}.tier_level = ?")
+            params.append(tier)
+        if date_from:
+            clauses.append(f"{table}.created_at >= ?")
+            params.append(date_from.isoformat())
+        if date_to:
+            clauses.append(f"{table}.created_at < ?")
+            params.append((date_to + datetime.timedelta(days=1)).isoformat())
+        if cost_min is not None:
+            clauses.append(f"{table}.final_total_cost >= ?")
+            params.append(cost_min)
+        if cost_max is not None:
+            clauses.append(f"{table}.final_total_cost <= ?")
+            params.append(cost_max)
+        if it_min is not None:
+            clauses.append(f"{table}.it_capacity >= ?")
+            params.append(it_min)
+        if it_max is not None:
+            clauses.append(f"{table}.it_capacity <= ?")
+            params.append(it_max)
+        return clauses, params
+
+    def list_quotes(self, limit=200, offset=0, **filters):
+        """
+        Newest-first quote summaries matching every given filter.
+
+        Filters: project (case-insensitive prefix), username, tier,
+        date_from / date_to (datetime.date, inclusive), cost_min / cost_max
+        (final total cost) and it_min / it_max (IT MW).
+
+        Returns:
+            pd.DataFrame: One row per quote with LIST_COLUMNS
+        """
+        clauses, params = self._filter_clauses(**filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT {', '.join(LIST_COLUMNS)} FROM quotes {where} "
+               "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?")
+        rows = self._connect().execute(sql, params + [limit, offset]).fetchall()
+        return pd.DataFrame([tuple(row) for row in rows], columns=LIST_COLUMNS)
+
+    def search(self, text, limit=50, **filters):
+        """
+        Rank quotes by full-text relevance over the project name, scope and
+        custom cost descriptions, within the same filters as list_quotes.
+
+        Every word must match (the last one as a prefix, for search-as-you-type).
+        An empty query falls back to list_quotes.
+
+        Returns:
+            pd.DataFrame: LIST_COLUMNS plus 'relevance' (higher is better)
+        """
+        query = fts_query(text)
+        if not query:
+            return self.list_quotes(limit=limit, **filters).assign(relevance=float('nan'))
+
+        clauses, params = self._filter_clauses(table='q', **filters)
+        where = ''.join(f" AND {clause}" for clause in clauses)
+        sql = (
+            f"SELECT {', '.join(f'q.{name}' for name in LIST_COLUMNS)}, "
+            f"-bm25(quotes_fts, {', '.join(str(w) for w in FTS_WEIGHTS)}) AS relevance "
+            "FROM quotes_fts JOIN quotes q ON q.id = quotes_fts.rowid "
+            f"WHERE quotes_fts MATCH ?{where} "
+            "ORDER BY relevance DESC, q.id DESC LIMIT ?"
+        )
+        rows = self._connect().execute(sql, [query] + params + [limit]).fetchall()
+        return pd.DataFrame([tuple(row) for row in rows], columns=LIST_COLUMNS + ('relevance',))
+
+    def usernames(self):
+        rows = self._connect().execute(
+            "SELECT DISTINCT username FROM quotes WHERE username IS NOT NULL ORDER BY username"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
+
+    def iter_quotes(self, quote_ids):
+        """Yield (QuoteInputs, QuoteResult, metadata) for each id in order, one at a time."""
+        for quote_id in quote_ids:
+            saved = self.load(quote_id)
+            if saved is not None:
+                yield saved
+
+    def load(self, quote_id):
+        """
+        Reopen a stored quote.
+
+        Returns:
+            tuple: (QuoteInputs, QuoteResult, metadata dict), or None if not found
+        """
+        row = self._connect().execute("SELECT * FROM quotes WHERE id = ?", (quote_id,)).fetchone()
+        if row is None:
+            return None
+        inputs = QuoteInputs(**json.loads(row['inputs_json']))
+        result = QuoteResult(**json.loads(row['result_json']))
+        meta = {name: row[name] for name in ('id', 'created_at', 'username', 'rate_card_version', 'input_hash')}
+        return inputs, result, meta
+
+    def publish_rate_card(self, rate_card, username, note='', activate=True, created_at=None):
+        """
+        Store a rate card under its content version (publishing the same
+        tables twice keeps the first record) and optionally make it active.
+
+        Returns:
+            str: The card's version
+        """
+        version = rate_card_version(rate_card)
+        created_at = created_at or datetime.datetime.now()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO rate_cards (version, created_at, username, note, tables_json) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (version, created_at.isoformat(timespec='seconds'), username, note, rate_card_to_json(rate_card)),
+            )
+        if activate:
+            self.activate_rate_card(version)
+        return version
+
+    def activate_rate_card(self, version):
+        """Make a published card active; None reverts to the built-in default."""
+        conn = self._connect()
+        with conn:
+            if version is not None and conn.execute(
+                    "SELECT 1 FROM rate_cards WHERE version = ?", (version,)).fetchone() is None:
+                raise KeyError(f"No published rate card {version}")
+            conn.execute("UPDATE rate_cards SET active = 0 WHERE active = 1")
+            if version is not None:
+                conn.execute("UPDATE rate_cards SET active = 1 WHERE version = ?", (version,))
+
+    def active_rate_card(self):
+        """
+        The active published rate card, or None when the built-in default is
+        in use. The tables are only parsed again when the active version changes.
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT version FROM rate_cards WHERE active = 1").fetchone()
+        if row is None:
+            return None
+        version, card = self._active_card
+        if version != row['version']:
+            tables = conn.execute("SELECT tables_json FROM rate_cards WHERE version = ?",
+                                  (row['version'],)).fetchone()['tables_json']
+            card = rate_card_from_json(tables)
+            self._active_card = (row['version'], card)
+        return card
+
+    def load_rate_card(self, version):
+        """A published rate card by version, or None if not found."""
+        row = self._connect().execute(
+            "SELECT tables_json FROM rate_cards WHERE version = ?", (version,)).fetchone()
+        return None if row is None else rate_card_from_json(row['tables_json'])
+
+    def list_rate_cards(self):
+        """
+        Published rate cards, newest first.
+
+        Returns:
+            pd.DataFrame: One row per card with RATE_CARD_COLUMNS
+        """
+        rows = self._connect().execute(
+            f"SELECT {', '.join(RATE_CARD_COLUMNS)} FROM rate_cards ORDER BY created_at DESC, version"
+        ).fetchall()
+        return pd.DataFrame([tuple(row) for row in rows], columns=RATE_CARD_COLUMNS).astype({'active': bool})
@@ -0,0 +1,102 @@
+"""
+Lightweight rerun timing for the Streamlit page.
+
+A RerunTimer marks consecutive sections of one script run (each section()
+call closes the previous span) and also offers nested span() context
+managers, e.g. for the engine stages. Samples go into a TimingStore that is
+shared by every session, so timings can be summarised per session or
+globally.
+"""
+
+import contextlib
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_COLUMNS = ['timestamp', 'session', 'section', 'ms']
+
+
+class TimingStore:
+    """Thread-safe ring buffer of (timestamp, session, section, ms) samples."""
+
+    def __init__(self, max_samples=50000):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, session, section, seconds):
+        with self._lock:
+            self._samples.append((time.time(), session, section, seconds * 1000.0))
+
+    def samples(self, session=None):
+        """Raw samples as a DataFrame, optionally for one session only."""
+        with self._lock:
+            rows = list(self._samples)
+        df = pd.DataFrame(rows, columns=SAMPLE_COLUMNS)
+        if session is not None:
+            df = df[df['session'] == session]
+        return df
+
+    def summary(self, session=None):
+        """Per-section count, p50, p95, max and total milliseconds (first-seen order)."""
+        df = self.samples(session)
+        rows = []
+        for section, group in df.groupby('section', sort=False):
+            ms = group['ms'].to_numpy()
+            p50, p95 = np.percentile(ms, [50, 95])
+            rows.append({
+                'Section': section,
+                'Samples': len(ms),
+                'p50 (ms)': p50,
+                'p95 (ms)': p95,
+                'Max (ms)': ms.max(),
+                'Total (ms)': ms.sum(),
+            })
+        return pd.DataFrame(rows, columns=['Section', 'Samples', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Total (ms)'])
+
+    def samples_csv(self, session=None):
+        df = self.samples(session)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        return df.to_csv(index=False)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class RerunTimer:
+    """Consecutive section spans (plus nested spans) for one script run."""
+
+    def __init__(self, store, session):
+        self.store = store
+        self.session = session
+        self._run_start = time.perf_counter()
+        self._section = None
+        self._section_start = None
+
+    def section(self, name):
+        """Close the current section (if any) and start timing name."""
+        now = time.perf_counter()
+        if self._section is not None:
+            self.store.record(self.session, self._section, now - self._section_start)
+        self._section = name
+        self._section_start = now
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Time a nested block without affecting the current section."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.store.record(self.session, name, time.perf_counter() - start)
+
+    def finish(self):
+        """Close the last section and record the whole run as 'total_rerun'."""
+        self.section(None)
+        self.store.record(self.session, 'total_rerun', time.perf_counter() - self._run_start)